@@ -0,0 +1,90 @@
+import time
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+# press_msb .. hum_lsb: all three ADC results, latched together by the sensor.
+DATA_REGISTER = 0xF7
+DATA_LENGTH = 8
+STATUS_REGISTER = 0xF3
+STATUS_MEASURING = 0x08
+MODE_FORCE = 0x01
+MODE_NORMAL = 0x03
+CONVERSION_POLL_SECONDS = 0.002
+
+
+@dataclass(frozen=True)
+class ClimateReading:
+    """Temperature, humidity and pressure from one and the same conversion."""
+    temperature: float
+    humidity: float
+    pressure: float
+    timestamp: float
+
+
+def unpack_raw(data: Sequence[int]) -> Tuple[int, int, int]:
+    """(adc_T, adc_P, adc_H) from the 8-byte data block."""
+    adc_p = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
+    adc_t = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
+    adc_h = (data[6] << 8) | data[7]
+    return adc_t, adc_p, adc_h
+
+
+def compensate(adc_t: int, adc_p: int, adc_h: int, temp_calib: Sequence[float],
+               pressure_calib: Sequence[float], humidity_calib: Sequence[float]) -> Tuple[float, float, float]:
+    """Bosch's floating-point compensation: (°C, %RH, hPa).
+
+    t_fine is computed once and shared by all three formulas, which is what
+    the driver's properties each redo from a fresh register read.
+    """
+    t1, t2, t3 = temp_calib
+    var1 = (adc_t / 16384.0 - t1 / 1024.0) * t2
+    var2 = (adc_t / 131072.0 - t1 / 8192.0) ** 2 * t3
+    t_fine = int(var1 + var2)
+    temperature = t_fine / 5120.0
+
+    p1, p2, p3, p4, p5, p6, p7, p8, p9 = pressure_calib
+    var1 = t_fine / 2.0 - 64000.0
+    var2 = var1 * var1 * p6 / 32768.0
+    var2 += var1 * p5 * 2.0
+    var2 = var2 / 4.0 + p4 * 65536.0
+    var1 = (p3 * var1 * var1 / 524288.0 + p2 * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * p1
+    if not var1:
+        raise ArithmeticError("Invalid BME280 pressure calibration")
+    pressure = 1048576.0 - adc_p
+    pressure = ((pressure - var2 / 4096.0) * 6250.0) / var1
+    var1 = p9 * pressure * pressure / 2147483648.0
+    var2 = pressure * p8 / 32768.0
+    pressure += (var1 + var2 + p7) / 16.0
+
+    h1, h2, h3, h4, h5, h6 = humidity_calib
+    var1 = t_fine - 76800.0
+    var2 = h4 * 64.0 + (h5 / 16384.0) * var1
+    var5 = 1.0 + (h3 / 67108864.0) * var1
+    var6 = 1.0 + (h6 / 67108864.0) * var1 * var5
+    var6 = (adc_h - var2) * (h2 / 65536.0) * (var5 * var6)
+    humidity = min(max(var6 * (1.0 - h1 * var6 / 524288.0), 0.0), 100.0)
+
+    return temperature, humidity, pressure / 100
+
+
+def burst_read(sensor) -> ClimateReading:
+    """One conversion (forced mode only), one 8-byte read, one compensation pass.
+
+    Uses the adafruit driver's register access and the calibration it read
+    at init. Drivers with their own `read_burst` (the simulation) are used
+    as they are. Blocking; run it on the bus thread.
+    """
+    native = getattr(sensor, "read_burst", None)
+    if native is not None:
+        return native()
+    if sensor.mode != MODE_NORMAL:
+        sensor.mode = MODE_FORCE
+        while sensor._read_register(STATUS_REGISTER, 1)[0] & STATUS_MEASURING:
+            time.sleep(CONVERSION_POLL_SECONDS)
+    data = sensor._read_register(DATA_REGISTER, DATA_LENGTH)
+    timestamp = time.time()
+    temperature, humidity, pressure = compensate(
+        *unpack_raw(data), sensor._temp_calib, sensor._pressure_calib, sensor._humidity_calib,
+    )
+    return ClimateReading(temperature, humidity, pressure, timestamp)
@@ -0,0 +1,85 @@
+import uuid
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from api.encoding import dumps
+
+# Part of every ETag, so a version number reused after a restart never
+# matches an ETag a client kept from the previous process.
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def make_etag(key: str, version: Any, persistent: bool = False) -> str:
+    """`persistent` versions survive restarts and are shared by workers, so they need no boot id."""
+    return f'"{key}-{version}"' if persistent else f'"{BOOT_ID}-{key}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 9110 weak comparison against an If-None-Match header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def merge_volatile(body: bytes, volatile: Mapping[str, Any]) -> bytes:
+    """Append per-request fields (such as an age) to a cached JSON object."""
+    if not volatile:
+        return body
+    extra = dumps(dict(volatile))
+    return body[:-1] + (b"," if body != b"{}" else b"") + extra[1:]
+
+
+class ResponseCache:
+    """Serialized JSON bodies of state endpoints, keyed by resource and version.
+
+    State the server holds carries a version number that changes whenever
+    the state does. The pair becomes the ETag: a poll whose If-None-Match
+    still matches gets an empty 304, and any other poll of an unchanged
+    state reuses the bytes rendered the first time, with no model
+    validation and no JSON encoding.
+    """
+
+    def __init__(self):
+        self._bodies: Dict[str, Tuple[str, bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def body(self, key: str, etag: str, build: Callable[[], Any]) -> bytes:
+        cached = self._bodies.get(key)
+        if cached is not None and cached[0] == etag:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        body = dumps(build())
+        self._bodies[key] = (etag, body)
+        return body
+
+    def respond(self, request: Request, key: str, version: Any, build: Callable[[], Any],
+                volatile: Optional[Mapping[str, Any]] = None, persistent: bool = False) -> Response:
+        """200 with the (cached) body, or 304 if the client already has this version.
+
+        `build` is only called when the version has not been rendered yet;
+        `volatile` fields change on every request and are never cached.
+        """
+        etag = make_etag(key, version, persistent)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        body = merge_volatile(self.body(key, etag, build), volatile or {})
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def forget(self, key: str):
+        self._bodies.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+response_cache = ResponseCache()
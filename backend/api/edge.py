@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+import httpx
+
+from api.rooms import EDGE_MIN_PUSH_INTERVAL, NODE_ROOM
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EDGE_CENTRAL_URL = os.getenv("EDGE_CENTRAL_URL")
+EDGE_NODE_ID = os.getenv("EDGE_NODE_ID", socket.gethostname())
+EDGE_TOKEN = os.getenv("EDGE_TOKEN")
+EDGE_PUSH_INTERVAL = float(os.getenv("EDGE_PUSH_INTERVAL", "10"))
+EDGE_BATCH_ROWS = int(os.getenv("EDGE_BATCH_ROWS", "200"))
+# Rows kept while the central node is unreachable; the oldest go first.
+EDGE_BUFFER_ROWS = int(os.getenv("EDGE_BUFFER_ROWS", "5000"))
+EDGE_REQUEST_TIMEOUT = 10.0
+EDGE_BACKOFF_INITIAL = 1.0
+EDGE_BACKOFF_MAX = 120.0
+
+EDGE_FIELDS = ("t", "temperature", "humidity", "pressure", "light", "motion_detected", "source")
+
+
+class EdgeAgent:
+    """Buffers this node's readings and pushes them to the central node in batches.
+
+    Flow control is end to end: there is at most one push in flight, a
+    batch leaves the buffer only once the central node acknowledged it,
+    and the agent waits out any Retry-After the central node sends. A
+    backlog is drained no faster than the central node's minimum push
+    interval, so catching up does not run into its rate limit. When
+    the central node stays away the buffer is capped and the oldest rows
+    are dropped, so the agent's memory does not grow without bound.
+
+    With a sample ring, rows take their sequence numbers from the ring and
+    the "edge" cursor follows the acknowledgements, so rows that were not
+    yet acknowledged when the agent died are replayed on the next start.
+    """
+
+    CURSOR = "edge"
+
+    def __init__(self, central_url: str, room: str = NODE_ROOM, node_id: str = EDGE_NODE_ID,
+                 token: Optional[str] = EDGE_TOKEN, push_interval: float = EDGE_PUSH_INTERVAL,
+                 batch_rows: int = EDGE_BATCH_ROWS, buffer_rows: int = EDGE_BUFFER_ROWS,
+                 min_push_interval: float = EDGE_MIN_PUSH_INTERVAL,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, log=None):
+        self.central_url = central_url.rstrip("/")
+        self.room = room
+        self.node_id = node_id
+        self.token = token
+        self.push_interval = push_interval
+        self.batch_rows = batch_rows
+        self.buffer_rows = buffer_rows
+        self.min_push_interval = min_push_interval
+        self.transport = transport
+        self.log = log
+        # Changes on every start, so the central node knows sequences restarted.
+        self.boot = uuid.uuid4().hex
+        self.buffer: Deque[Tuple[int, List[Any]]] = deque()
+        self.next_sequence = 0
+        self.latest: Dict[str, Any] = {}
+        self.pushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+        self.retry_at = 0.0
+        self._pushed_at = float("-inf")
+        self._backoff = EDGE_BACKOFF_INITIAL
+        self._wake: Optional[asyncio.Event] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, timestamp: float, readings: Mapping[str, Any], sequence: Optional[int] = None):
+        if sequence is None and self.log is not None:
+            sequence = self.log.append(timestamp, readings)
+        if sequence is None:
+            sequence = self.next_sequence
+        self.latest = dict(readings)
+        row = [timestamp] + [readings.get(field) for field in EDGE_FIELDS[1:]]
+        self.buffer.append((sequence, row))
+        self.next_sequence = sequence + 1
+        while len(self.buffer) > self.buffer_rows:
+            self.buffer.popleft()
+            self.dropped += 1
+
+    async def on_snapshot(self, snapshot):
+        self.add(snapshot.timestamp, snapshot.readings)
+
+    def on_motion(self, event: Mapping[str, Any]):
+        # Motion is time-critical: record it and push without waiting for the interval.
+        self.add(time.time(), {**self.latest, "motion_detected": event["type"] == "motion_start"})
+        if self._wake is not None:
+            self._wake.set()
+
+    def _payload(self) -> Tuple[Dict[str, Any], int]:
+        batch = [self.buffer[i] for i in range(min(self.batch_rows, len(self.buffer)))]
+        return {
+            "node": self.node_id,
+            "room": self.room,
+            "boot": self.boot,
+            "first_sequence": batch[0][0],
+            "fields": list(EDGE_FIELDS),
+            "rows": [row for _, row in batch],
+        }, len(batch)
+
+    async def push_once(self) -> bool:
+        """Send one batch from the head of the buffer. True if it was acknowledged."""
+        if not self.buffer:
+            return True
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=self.transport, timeout=EDGE_REQUEST_TIMEOUT)
+        payload, count = self._payload()
+        headers = {"X-Edge-Token": self.token} if self.token else {}
+        try:
+            response = await self._client.post(f"{self.central_url}/api/rooms/ingest", json=payload, headers=headers)
+        except httpx.HTTPError as e:
+            return self._failed(f"{type(e).__name__}: {e}")
+
+        if response.status_code == 413 and self.batch_rows > 1:
+            self.batch_rows = max(self.batch_rows // 2, 1)
+            return self._failed("batch too large", retry_after=0.0)
+        if response.status_code in (429, 503):
+            retry_after = float(response.headers.get("Retry-After", self._backoff))
+            return self._failed(f"central node busy ({response.status_code})", retry_after=retry_after)
+        if response.status_code >= 400:
+            return self._failed(f"central node answered {response.status_code}: {response.text[:200]}")
+
+        last_sequence = payload["first_sequence"] + count - 1
+        while self.buffer and self.buffer[0][0] <= last_sequence:
+            self.buffer.popleft()
+        self.pushed += count
+        if self.log is not None:
+            self.log.commit(self.CURSOR, last_sequence)
+            await asyncio.to_thread(self.log.sync)
+        self.batches += 1
+        self._pushed_at = time.monotonic()
+        self.last_error = None
+        self._backoff = EDGE_BACKOFF_INITIAL
+        self.retry_at = 0.0
+        return True
+
+    def _failed(self, error: str, retry_after: Optional[float] = None) -> bool:
+        self.failures += 1
+        self.last_error = error
+        if retry_after is None:
+            retry_after = self._backoff
+            self._backoff = min(self._backoff * 2, EDGE_BACKOFF_MAX)
+        self.retry_at = time.monotonic() + retry_after
+        logger.warning(f"Edge push to {self.central_url} failed: {error}; retrying in {retry_after:.1f}s")
+        return False
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.push_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            # Drain the backlog one batch at a time, spaced by the central
+            # node's minimum push interval and honouring any retry delay.
+            while self.buffer:
+                delay = max(self.retry_at, self._pushed_at + self.min_push_interval) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not await self.push_once() or len(self.buffer) < self.batch_rows:
+                    break
+
+    def replay(self) -> int:
+        """Queue the logged rows the central node has not acknowledged yet."""
+        if self.log is None:
+            return 0
+        cursor = self.log.cursor(self.CURSOR)
+        replayed = 0
+        while True:
+            records, last = self.log.read_since(cursor)
+            if last == cursor:
+                break
+            cursor = last
+            for sequence, timestamp, readings in records:
+                self.add(timestamp, readings, sequence)
+            replayed += len(records)
+        return replayed
+
+    def start(self):
+        replayed = self.replay()
+        if replayed:
+            logger.info(f"Replaying {replayed} unacknowledged rows from the sample log.")
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Edge agent '{self.node_id}' pushing room '{self.room}' to {self.central_url}")
+
+    async def stop(self, flush_timeout: float = 5.0):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.buffer and self.retry_at <= time.monotonic():
+            try:
+                await asyncio.wait_for(self.push_once(), flush_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "node": self.node_id,
+            "room": self.room,
+            "central_url": self.central_url,
+            "buffered": len(self.buffer),
+            "pushed": self.pushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "batch_rows": self.batch_rows,
+            "last_error": self.last_error,
+            "retry_in": round(max(self.retry_at - time.monotonic(), 0.0), 1),
+        }
+
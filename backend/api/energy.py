@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime, time as day_start, timedelta
+from typing import Any, Dict, List, Optional
+
+from api.outlet_registry import gather_limited
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ENERGY_DIR = os.getenv(
+    "ENERGY_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "energy"),
+)
+ENERGY_SAMPLE_INTERVAL_SECONDS = float(os.getenv("ENERGY_SAMPLE_INTERVAL", "30"))
+# Plugs read at once; leaves registry capacity for user commands.
+ENERGY_SAMPLE_CONCURRENCY = int(os.getenv("ENERGY_SAMPLE_CONCURRENCY", "4"))
+ENERGY_RAW_RETENTION_SECONDS = int(os.getenv("ENERGY_RAW_RETENTION", str(24 * 3600)))
+HOURLY_RETENTION = 7 * 24
+DAILY_RETENTION = 366
+# Gaps longer than this are not integrated; the plug was unreachable.
+MAX_INTEGRATION_GAP_SECONDS = 300.0
+
+# On-disk sample: epoch seconds (float64) + watts (float32), little endian.
+SAMPLE_RECORD = struct.Struct("<df")
+
+ENERGY_MODELS = {"p110", "p115"}
+
+
+class EnergySeries:
+    """Power samples and running kWh totals for one outlet.
+
+    Samples live in two parallel fixed-width arrays (timestamps and watts)
+    and are appended to a binary file of fixed-size records. Every new
+    sample adds the trapezoid between it and the previous sample to the
+    hourly and daily totals, so the totals never need a rescan. An
+    interval that crosses an hour or a (local) midnight is split there,
+    with the power interpolated, so each bucket gets only its own share.
+    """
+
+    def __init__(self, outlet_id: str, directory: str = ENERGY_DIR):
+        self.outlet_id = outlet_id
+        self.directory = directory
+        self.timestamps = array("d")
+        self.watts = array("f")
+        self.hourly: Dict[int, float] = {}
+        self.daily: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def samples_path(self) -> str:
+        return os.path.join(self.directory, f"{self.outlet_id}.bin")
+
+    @property
+    def totals_path(self) -> str:
+        return os.path.join(self.directory, f"{self.outlet_id}.json")
+
+    def load(self, now: Optional[float] = None):
+        """Restore totals and the recent samples, dropping samples past retention."""
+        now = time.time() if now is None else now
+        try:
+            with open(self.totals_path) as f:
+                totals = json.load(f)
+            self.hourly = {int(bucket): wh for bucket, wh in totals.get("hourly", {}).items()}
+            self.daily = dict(totals.get("daily", {}))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable energy totals for {self.outlet_id}: {e}")
+
+        try:
+            with open(self.samples_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        usable = len(data) - len(data) % SAMPLE_RECORD.size
+        cutoff = now - ENERGY_RAW_RETENTION_SECONDS
+        for timestamp, watts in SAMPLE_RECORD.iter_unpack(data[:usable]):
+            if timestamp >= cutoff:
+                self.timestamps.append(timestamp)
+                self.watts.append(watts)
+        self._rewrite_samples()
+
+    def _rewrite_samples(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.samples_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for timestamp, watts in zip(self.timestamps, self.watts):
+                f.write(SAMPLE_RECORD.pack(timestamp, watts))
+        os.replace(tmp_path, self.samples_path)
+
+    def _save_totals(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.totals_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"hourly": self.hourly, "daily": self.daily}, f)
+        os.replace(tmp_path, self.totals_path)
+
+    def add(self, timestamp: float, watts: float):
+        with self._lock:
+            if self.timestamps:
+                previous_ts, previous_w = self.timestamps[-1], self.watts[-1]
+                gap = timestamp - previous_ts
+                if 0 < gap <= MAX_INTEGRATION_GAP_SECONDS and self._integrate(previous_ts, previous_w, timestamp, watts):
+                    self._trim_totals()
+                    self._save_totals()
+
+            self.timestamps.append(timestamp)
+            self.watts.append(watts)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.samples_path, "ab") as f:
+                f.write(SAMPLE_RECORD.pack(timestamp, watts))
+
+            cutoff = timestamp - ENERGY_RAW_RETENTION_SECONDS
+            if self.timestamps[0] < cutoff - ENERGY_RAW_RETENTION_SECONDS / 10:
+                # Compact in chunks, not on every sample.
+                keep = next(i for i, ts in enumerate(self.timestamps) if ts >= cutoff)
+                del self.timestamps[:keep]
+                del self.watts[:keep]
+                self._rewrite_samples()
+
+    def _integrate(self, start: float, start_w: float, end: float, end_w: float) -> bool:
+        """Credit the energy between two samples to its buckets. True if a new hour was started."""
+        new_hour = False
+        t, w = start, start_w
+        while t < end:
+            hour = int(t // 3600) * 3600
+            date = datetime.fromtimestamp(t).date()
+            midnight = datetime.combine(date + timedelta(days=1), day_start()).timestamp()
+            piece_end = min(end, hour + 3600, midnight)
+            piece_w = start_w + (end_w - start_w) * (piece_end - start) / (end - start)
+            wh = (w + piece_w) / 2 * (piece_end - t) / 3600
+            day = date.strftime("%Y-%m-%d")
+            new_hour = new_hour or hour not in self.hourly
+            self.hourly[hour] = self.hourly.get(hour, 0.0) + wh
+            self.daily[day] = self.daily.get(day, 0.0) + wh
+            t, w = piece_end, piece_w
+        return new_hour
+
+    def _trim_totals(self):
+        for bucket in sorted(self.hourly)[:-HOURLY_RETENTION]:
+            del self.hourly[bucket]
+        for day in sorted(self.daily)[:-DAILY_RETENTION]:
+            del self.daily[day]
+
+    def flush(self):
+        with self._lock:
+            self._save_totals()
+
+    def summary(self, since: Optional[float] = None) -> Dict[str, Any]:
+        with self._lock:
+            current = self.watts[-1] if self.watts else None
+            last_at = self.timestamps[-1] if self.timestamps else None
+            samples: List[Dict[str, float]] = []
+            if since is not None:
+                samples = [
+                    {"t": ts, "watts": round(w, 1)}
+                    for ts, w in zip(self.timestamps, self.watts) if ts >= since
+                ]
+            today = datetime.now().strftime("%Y-%m-%d")
+            return {
+                "current_power_w": current,
+                "sampled_at": last_at,
+                "today_kwh": round(self.daily.get(today, 0.0) / 1000, 4),
+                "hourly_kwh": [{"t": bucket, "kwh": round(wh / 1000, 4)} for bucket, wh in sorted(self.hourly.items())],
+                "daily_kwh": [{"date": day, "kwh": round(wh / 1000, 4)} for day, wh in sorted(self.daily.items())],
+                "samples": samples,
+            }
+
+
+class EnergyCollector:
+    """Samples current_power from every energy-monitoring plug on a schedule."""
+
+    def __init__(self, registry, interval: float = ENERGY_SAMPLE_INTERVAL_SECONDS, directory: str = ENERGY_DIR,
+                 concurrency: int = ENERGY_SAMPLE_CONCURRENCY):
+        self.registry = registry
+        self.interval = interval
+        self.concurrency = concurrency
+        self.directory = directory
+        self.series: Dict[str, EnergySeries] = {}
+        # get_series runs on worker threads (sampling and the energy route);
+        # a series must be loaded once, or two loads race on its files.
+        self._series_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def outlet_ids(self) -> List[str]:
+        return [outlet_id for outlet_id, config in self.registry.configs.items() if config.model in ENERGY_MODELS]
+
+    def get_series(self, outlet_id: str) -> EnergySeries:
+        """The outlet's series, loaded from disk on first use. Blocking; call it off the event loop."""
+        with self._series_lock:
+            if outlet_id not in self.series:
+                series = EnergySeries(outlet_id, self.directory)
+                series.load()
+                self.series[outlet_id] = series
+            return self.series[outlet_id]
+
+    def _add(self, outlet_id: str, timestamp: float, watts: float):
+        self.get_series(outlet_id).add(timestamp, watts)
+
+    async def sample_once(self):
+        outlet_ids = [outlet_id for outlet_id in self.outlet_ids() if outlet_id in self.registry.handlers]
+        results = await gather_limited(
+            (self.registry.call(outlet_id, lambda device: device.get_current_power()) for outlet_id in outlet_ids),
+            self.concurrency,
+        )
+        now = time.time()
+        for outlet_id, result in zip(outlet_ids, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Could not read power from {outlet_id}: {result}")
+                continue
+            await asyncio.to_thread(self._add, outlet_id, now, float(result.current_power))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample_once()
+            except Exception as e:
+                logger.error(f"Energy sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if not self.outlet_ids():
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Energy collector started for {len(self.outlet_ids())} outlets.")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for series in self.series.values():
+            series.flush()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from api.metrics import LatencyHistogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HARDWARE_TIMEOUT_SECONDS = float(os.getenv("HARDWARE_TIMEOUT", "1.0"))
+# "auto": real drivers when they are installed, mock data otherwise.
+# "real": real drivers only. "simulated": the devices in api/simulation.py.
+HARDWARE_BACKEND = os.getenv("HARDWARE_BACKEND", "auto").lower()
+
+
+class HardwareTimeoutError(Exception):
+    """A bus operation did not finish within its timeout."""
+
+
+class BusExecutor:
+    """All I/O for one bus runs on a single dedicated thread.
+
+    Submitting every operation for a bus to the same one-thread executor
+    serializes access to it without locks, and keeps blocking drivers off
+    the event loop.
+    """
+
+    def __init__(self, name: str, timeout: float = HARDWARE_TIMEOUT_SECONDS):
+        self.name = name
+        self.timeout = timeout
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"hw-{name}")
+
+    def _timed(self, device: str, fn: Callable, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            self.errors[device] = self.errors.get(device, 0) + 1
+            raise
+        finally:
+            self.latency.setdefault(device, LatencyHistogram()).observe(time.perf_counter() - start)
+
+    async def run(self, device: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._timed, device, fn, args, kwargs)
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # The worker thread cannot be interrupted; the operation keeps the
+            # bus until it returns, but the caller is released right away.
+            self.timeouts[device] = self.timeouts.get(device, 0) + 1
+            raise HardwareTimeoutError(f"{device} on {self.name} timed out after {timeout or self.timeout}s")
+
+    def stats(self) -> Dict[str, Any]:
+        devices = set(self.latency) | set(self.errors) | set(self.timeouts)
+        return {
+            device: {
+                "latency": self.latency[device].to_dict() if device in self.latency else None,
+                "errors": self.errors.get(device, 0),
+                "timeouts": self.timeouts.get(device, 0),
+            }
+            for device in sorted(devices)
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class HardwareLayer:
+    """Async entry point for every blocking hardware call, one executor per bus."""
+
+    def __init__(self):
+        self.buses: Dict[str, BusExecutor] = {}
+
+    def bus(self, name: str) -> BusExecutor:
+        if name not in self.buses:
+            self.buses[name] = BusExecutor(name)
+        return self.buses[name]
+
+    async def run(self, bus: str, device: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        return await self.bus(bus).run(device, fn, *args, timeout=timeout, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: bus.stats() for name, bus in self.buses.items()}
+
+    def shutdown(self):
+        for bus in self.buses.values():
+            bus.shutdown()
+        self.buses.clear()
+
+
+hardware = HardwareLayer()
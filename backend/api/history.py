@@ -0,0 +1,175 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = os.getenv(
+    "SENSOR_HISTORY_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sensor_history.db"),
+)
+
+# Resolution name -> bucket width in seconds. "raw" keeps every sample.
+RESOLUTIONS = {
+    "raw": 0,
+    "1m": 60,
+    "15m": 15 * 60,
+    "1h": 60 * 60,
+}
+
+# How long each resolution is kept, in seconds.
+RETENTION = {
+    "raw": int(os.getenv("HISTORY_RETENTION_RAW", str(24 * 3600))),
+    "1m": int(os.getenv("HISTORY_RETENTION_1M", str(7 * 24 * 3600))),
+    "15m": int(os.getenv("HISTORY_RETENTION_15M", str(90 * 24 * 3600))),
+    "1h": int(os.getenv("HISTORY_RETENTION_1H", str(2 * 365 * 24 * 3600))),
+}
+
+PRUNE_INTERVAL_SECONDS = 300
+DEFAULT_MAX_POINTS = 500
+
+# Sensor readings stored as history. Booleans are stored as 0/1 so that the
+# rollup mean of "motion_detected" is the fraction of samples with motion.
+METRICS = ("temperature", "humidity", "pressure", "light", "motion_detected")
+
+
+def _rollup_table(resolution: str) -> str:
+    return f"rollup_{resolution}"
+
+
+class HistoryStore:
+    """Embedded SQLite (WAL) store for sensor samples and their rollups.
+
+    Every append writes the raw values and folds them into the 1-minute,
+    15-minute and 1-hour buckets in the same transaction, so rollups are
+    always up to date and a long-range query never touches the raw table.
+    Batches go in with `append_many`, one transaction for all of them.
+    """
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL is durable across application crashes in WAL mode and
+            # avoids an fsync per commit on the SD card.
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS samples_raw ("
+                "metric TEXT NOT NULL, ts REAL NOT NULL, value REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_raw ON samples_raw (metric, ts)")
+            for resolution in RESOLUTIONS:
+                if resolution == "raw":
+                    continue
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_rollup_table(resolution)} ("
+                    "metric TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL, "
+                    "sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL, "
+                    "PRIMARY KEY (metric, bucket)) WITHOUT ROWID"
+                )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def append(self, timestamp: float, readings: Mapping[str, object]):
+        """Store one sample and update every rollup incrementally."""
+        self.append_many([(timestamp, readings)])
+
+    def append_many(self, samples: Iterable[Tuple[float, Mapping[str, object]]]):
+        """Store a batch of samples and their rollups in a single transaction."""
+        rows = [
+            (metric, timestamp, float(readings[metric]))
+            for timestamp, readings in samples
+            for metric in METRICS
+            if isinstance(readings.get(metric), (int, float))
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT INTO samples_raw (metric, ts, value) VALUES (?, ?, ?)", rows)
+                for resolution, width in RESOLUTIONS.items():
+                    if resolution == "raw":
+                        continue
+                    conn.executemany(
+                        f"INSERT INTO {_rollup_table(resolution)} (metric, bucket, count, sum, min, max) "
+                        "VALUES (?, ?, 1, ?, ?, ?) "
+                        "ON CONFLICT (metric, bucket) DO UPDATE SET "
+                        "count = count + 1, sum = sum + excluded.sum, "
+                        "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                        [(metric, int(timestamp // width) * width, value, value, value)
+                         for metric, timestamp, value in rows],
+                    )
+            latest = max(timestamp for _, timestamp, _ in rows)
+            if latest - self._last_prune >= PRUNE_INTERVAL_SECONDS:
+                self._prune(conn, latest)
+                self._last_prune = latest
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        with conn:
+            conn.execute("DELETE FROM samples_raw WHERE ts < ?", (now - RETENTION["raw"],))
+            for resolution in RESOLUTIONS:
+                if resolution == "raw":
+                    continue
+                conn.execute(
+                    f"DELETE FROM {_rollup_table(resolution)} WHERE bucket < ?",
+                    (now - RETENTION[resolution],),
+                )
+
+    def pick_resolution(self, start: float, end: float, max_points: int = DEFAULT_MAX_POINTS,
+                        sample_interval: float = 2.0, now: Optional[float] = None) -> str:
+        """Finest resolution that still covers `start` and fits in `max_points`."""
+        now = time.time() if now is None else now
+        span = max(end - start, 0.0)
+        for resolution, width in RESOLUTIONS.items():
+            if now - start > RETENTION[resolution]:
+                continue
+            if span / (width or sample_interval) <= max_points:
+                return resolution
+        return "1h"
+
+    def query(self, start: float, end: float, resolution: str,
+              metrics: Iterable[str] = METRICS) -> Dict[str, List[dict]]:
+        """Return `{metric: [{"t", "min", "mean", "max"}, ...]}` for the range."""
+        result: Dict[str, List[dict]] = {}
+        with self._lock:
+            conn = self._connect()
+            for metric in metrics:
+                if resolution == "raw":
+                    rows = conn.execute(
+                        "SELECT ts, value, value, value FROM samples_raw "
+                        "WHERE metric = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                        (metric, start, end),
+                    ).fetchall()
+                else:
+                    width = RESOLUTIONS[resolution]
+                    rows = conn.execute(
+                        f"SELECT bucket, min, sum / count, max FROM {_rollup_table(resolution)} "
+                        "WHERE metric = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+                        (metric, int(start // width) * width, end),
+                    ).fetchall()
+                result[metric] = [
+                    {"t": t, "min": round(lo, 2), "mean": round(mean, 2), "max": round(hi, 2)}
+                    for t, lo, mean, hi in rows
+                ]
+        return result
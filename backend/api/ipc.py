@@ -0,0 +1,465 @@
+import asyncio
+import fcntl
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import struct
+import typing
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from api import encoding
+from api.conditional import BOOT_ID
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "single": every process owns the hardware (one uvicorn worker).
+# "shared": one process, elected with a file lock, owns the hardware and the
+# other workers reach it over a Unix socket (`uvicorn main:app --workers N`).
+WORKER_MODE = os.getenv("WORKER_MODE", "single").lower()
+OWNER_SOCKET_PATH = os.getenv(
+    "OWNER_SOCKET",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "owner.sock"),
+)
+OWNER_LOCK_PATH = f"{OWNER_SOCKET_PATH}.lock"
+IPC_CALL_TIMEOUT = float(os.getenv("IPC_CALL_TIMEOUT", "5.0"))
+IPC_CONNECT_TIMEOUT = 10.0
+IPC_RECONNECT_INITIAL = 0.2
+IPC_RECONNECT_MAX = 5.0
+# A worker that stops reading is disconnected rather than buffered for.
+IPC_WRITE_BUFFER_LIMIT = 1 << 20
+MAX_FRAME_BYTES = 16 << 20
+
+# Big-endian length prefix, then one JSON message.
+FRAME = struct.Struct(">I")
+
+
+class RemoteCallError(Exception):
+    """A call into the hardware owner failed; carries the HTTP error it should become."""
+
+    def __init__(self, status_code: int, detail: Any, headers: Optional[Dict[str, str]] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+class OwnerUnavailableError(RemoteCallError):
+    """No hardware owner is connected, or it did not answer in time."""
+
+    def __init__(self, detail: str = "Hardware owner process is not available"):
+        super().__init__(503, detail)
+
+
+def pack(message: Any) -> bytes:
+    body = encoding.dumps(message)
+    return FRAME.pack(len(body)) + body
+
+
+def loads(body: bytes) -> Any:
+    return encoding.orjson.loads(body) if encoding.FAST_JSON else json.loads(body)
+
+
+async def read_message(reader: asyncio.StreamReader) -> Any:
+    (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"IPC frame of {length} bytes is too large")
+    return loads(await reader.readexactly(length))
+
+
+# Operations the hardware owner runs on behalf of the workers, by name.
+handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+
+
+def handler(name: str):
+    """Register a coroutine function the workers can call as `deployment.call(name, ...)`."""
+    def register(fn):
+        handlers[name] = fn
+        return fn
+    return register
+
+
+class OwnerServer:
+    """The hardware owner's end of the socket.
+
+    Every connected worker first gets a hello with the current shared
+    state, then every published event, and can call the registered
+    handlers. Calls run concurrently; results go back tagged with the
+    call id.
+    """
+
+    def __init__(self, path: str, hello: Callable[[], Dict[str, Any]]):
+        self.path = path
+        self.hello = hello
+        self.connections: Set[asyncio.StreamWriter] = set()
+        self.calls = 0
+        self.errors = 0
+        self.dropped = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Only the lock holder gets here, so a socket file left behind is stale.
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        os.chmod(self.path, 0o660)
+
+    def broadcast(self, message: Any):
+        if not self.connections:
+            return
+        frame = pack(message)
+        for writer in list(self.connections):
+            if writer.transport.get_write_buffer_size() > IPC_WRITE_BUFFER_LIMIT:
+                logger.warning("Disconnecting a worker that stopped reading owner events.")
+                self.dropped += 1
+                self.connections.discard(writer)
+                writer.close()
+            else:
+                writer.write(frame)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(pack({"type": "hello", **self.hello()}))
+        self.connections.add(writer)
+        try:
+            while True:
+                message = await read_message(reader)
+                if message.get("type") == "call":
+                    task = asyncio.create_task(self._call(writer, message))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def _call(self, writer: asyncio.StreamWriter, message: Dict[str, Any]):
+        self.calls += 1
+        reply: Dict[str, Any] = {"type": "result", "id": message["id"], "ok": False}
+        fn = handlers.get(message.get("method"))
+        try:
+            if fn is None:
+                raise HTTPException(status_code=501, detail=f"Unknown owner operation '{message.get('method')}'")
+            reply.update(ok=True, result=jsonable_encoder(await fn(**message.get("params", {}))))
+        except HTTPException as e:
+            reply.update(status=e.status_code, detail=e.detail, headers=getattr(e, "headers", None))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Owner operation {message.get('method')} failed: {e}")
+            reply.update(status=500, detail=str(e) or type(e).__name__)
+        if not writer.is_closing():
+            writer.write(pack(reply))
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self.connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._tasks):
+            task.cancel()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def status(self) -> Dict[str, Any]:
+        return {"workers": len(self.connections), "calls": self.calls, "errors": self.errors, "dropped": self.dropped}
+
+
+class OwnerClient:
+    """A worker's end of the socket: keeps a connection to the owner and reconnects with backoff.
+
+    `on_hello` and `on_event` receive the owner's messages. When the
+    connection drops, `on_lost` is awaited; if it returns True (this process
+    took over as owner) the client stops.
+    """
+
+    def __init__(self, path: str, on_hello: Callable[[Dict[str, Any]], None],
+                 on_event: Callable[[Dict[str, Any]], None],
+                 on_lost: Optional[Callable[[], Awaitable[bool]]] = None, timeout: float = IPC_CALL_TIMEOUT):
+        self.path = path
+        self.on_hello = on_hello
+        self.on_event = on_event
+        self.on_lost = on_lost
+        self.timeout = timeout
+        self.owner: Optional[Dict[str, Any]] = None
+        self.calls = 0
+        self.failures = 0
+        self.reconnects = 0
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def start(self):
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout: float = IPC_CONNECT_TIMEOUT) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        backoff = IPC_RECONNECT_INITIAL
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                if self.on_lost is not None and await self.on_lost():
+                    return
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, IPC_RECONNECT_MAX)
+                continue
+
+            backoff = IPC_RECONNECT_INITIAL
+            try:
+                hello = await read_message(reader)
+                self.owner = {key: hello[key] for key in ("pid", "boot") if key in hello}
+                self.on_hello(hello)
+                self._writer = writer
+                self._connected.set()
+                logger.info(f"Connected to hardware owner (pid {self.owner.get('pid')}).")
+                while True:
+                    message = await read_message(reader)
+                    if message.get("type") == "result":
+                        future = self._pending.pop(message["id"], None)
+                        if future is not None and not future.done():
+                            future.set_result(message)
+                    else:
+                        self.on_event(message)
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+                logger.warning(f"Lost the hardware owner connection: {type(e).__name__}")
+            finally:
+                self._writer = None
+                self._connected.clear()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(OwnerUnavailableError("Hardware owner connection lost"))
+                self._pending.clear()
+                writer.close()
+            self.reconnects += 1
+            if self.on_lost is not None and await self.on_lost():
+                return
+
+    async def call(self, method: str, **params) -> Any:
+        if self._writer is None:
+            raise OwnerUnavailableError()
+        self.calls += 1
+        call_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        self._writer.write(pack({"type": "call", "id": call_id, "method": method, "params": params}))
+        try:
+            reply = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise OwnerUnavailableError(f"Hardware owner did not answer '{method}' within {self.timeout}s")
+        finally:
+            self._pending.pop(call_id, None)
+        if reply["ok"]:
+            return reply["result"]
+        self.failures += 1
+        raise RemoteCallError(reply["status"], reply["detail"], reply.get("headers"))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"connected": self.connected, "owner": self.owner, "calls": self.calls,
+                "failures": self.failures, "reconnects": self.reconnects}
+
+
+class Deployment:
+    """Decides whether this process owns the hardware, and links workers to the owner.
+
+    In "shared" mode the first process to take the lock file owns the
+    devices: it runs the hardware startup and serves the socket. Every
+    other process becomes a worker that mirrors the owner's shared state
+    and forwards device commands to it. If the owner dies its lock is
+    released, and the first worker to notice takes over.
+
+    State is shared under named kinds: `share(kind, current, apply)` makes
+    the owner include `current()` in every hello, and workers pass both
+    the hello value and every `publish(kind, data)` to `apply`.
+    """
+
+    def __init__(self, mode: str = WORKER_MODE, socket_path: str = OWNER_SOCKET_PATH,
+                 lock_path: str = OWNER_LOCK_PATH):
+        self.mode = mode
+        self.socket_path = socket_path
+        self.lock_path = lock_path
+        self.role = "single"
+        self.server: Optional[OwnerServer] = None
+        self.client: Optional[OwnerClient] = None
+        self.shared: Dict[str, Any] = {}
+        self._lock_file = None
+        self._start_hardware: Optional[Callable[[], Awaitable[None]]] = None
+
+    @property
+    def is_worker(self) -> bool:
+        return self.role == "worker"
+
+    @property
+    def owns_hardware(self) -> bool:
+        """This process holds the lock file; devices only one process may drive need it."""
+        return self._lock_file is not None
+
+    def share(self, kind: str, current: Callable[[], Any], apply: Callable[[Any], None]):
+        self.shared[kind] = (current, apply)
+
+    def _try_lock(self) -> bool:
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def start(self, start_hardware: Callable[[], Awaitable[None]]):
+        self._start_hardware = start_hardware
+        if self.mode != "shared":
+            # Several single-mode workers all start the hardware; the lock
+            # only marks the one that may drive exclusive devices (GPIO).
+            if not self._try_lock():
+                logger.warning(f"Process {os.getpid()} runs alongside another without WORKER_MODE=shared; "
+                               "GPIO devices are left to the process holding the lock.")
+            await start_hardware()
+            return
+        if self._try_lock():
+            await self._become_owner()
+            return
+        self.role = "worker"
+        self.client = OwnerClient(self.socket_path, self._on_hello, self._on_event, self._owner_lost)
+        # Not waited for: until the link is up, device requests answer 503
+        # and /api/health/ready reports the worker as not ready.
+        self.client.start()
+
+    async def _become_owner(self):
+        self.role = "owner"
+        # Serve the socket first: workers connect while the devices open and
+        # receive the first readings as events.
+        self.server = OwnerServer(self.socket_path, self._hello)
+        await self.server.start()
+        await self._start_hardware()
+        logger.info(f"Process {os.getpid()} owns the hardware; workers connect on {self.socket_path}.")
+
+    async def _owner_lost(self) -> bool:
+        """Take over when the owner is gone for good (its lock was released)."""
+        if not self._try_lock():
+            return False
+        logger.warning(f"Hardware owner is gone; process {os.getpid()} takes over.")
+        self.client = None
+        await self._become_owner()
+        return True
+
+    def _hello(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "boot": BOOT_ID,
+                "state": {kind: current() for kind, (current, _) in self.shared.items()}}
+
+    def _on_hello(self, hello: Dict[str, Any]):
+        for kind, data in hello.get("state", {}).items():
+            self._apply(kind, data)
+
+    def _on_event(self, message: Dict[str, Any]):
+        if message.get("type") == "event":
+            self._apply(message["kind"], message["data"])
+
+    def _apply(self, kind: str, data: Any):
+        if kind in self.shared and data is not None:
+            try:
+                self.shared[kind][1](data)
+            except Exception as e:
+                logger.error(f"Applying shared '{kind}' state from the owner failed: {e}")
+
+    def publish(self, kind: str, data: Any):
+        """Owner side: send a shared-state update to every worker."""
+        if self.server is not None:
+            self.server.broadcast({"type": "event", "kind": kind, "data": data})
+
+    async def call(self, method: str, **params) -> Any:
+        if self.client is None:
+            raise OwnerUnavailableError()
+        return await self.client.call(method, **params)
+
+    async def stop(self, stop_hardware: Callable[[], Awaitable[None]]):
+        if self.client is not None:
+            await self.client.stop()
+        if self.role in ("single", "owner"):
+            if self.server is not None:
+                await self.server.stop()
+            await stop_hardware()
+        # Released last, so a successor never opens the buses while they are still in use.
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"mode": self.mode, "role": self.role, "pid": os.getpid()}
+        if self.server is not None:
+            status["owner"] = self.server.status()
+        if self.client is not None:
+            status["link"] = self.client.status()
+        return status
+
+
+deployment = Deployment()
+
+
+def owner_route(name: str):
+    """Run a stateful route in the hardware owner; workers forward the call over the socket.
+
+    The route's arguments must be JSON-serializable or pydantic models
+    (they are rebuilt from their annotations in the owner). In "single"
+    mode the route is returned unchanged.
+    """
+    def decorate(fn):
+        hints = typing.get_type_hints(fn)
+        models = {param: hint for param, hint in hints.items()
+                  if inspect.isclass(hint) and issubclass(hint, BaseModel)}
+        is_async = asyncio.iscoroutinefunction(fn)
+
+        async def run(**kwargs):
+            for param, model in models.items():
+                if isinstance(kwargs.get(param), dict):
+                    kwargs[param] = model(**kwargs[param])
+            if is_async:
+                return await fn(**kwargs)
+            return await asyncio.to_thread(fn, **kwargs)
+
+        handlers[name] = run
+        if WORKER_MODE != "shared":
+            return fn
+
+        @functools.wraps(fn)
+        async def route(**kwargs):
+            if deployment.is_worker:
+                return await deployment.call(name, **jsonable_encoder(kwargs))
+            return await run(**kwargs)
+        return route
+    return decorate
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from api.hardware import hardware
+from api.outlet_registry import OutletConfig, OutletRegistry
+from api.simulation import SIM_TAPO_LATENCY_MS, draw_latency, make_rng
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LIGHTS_CONFIG_FILE = os.getenv(
+    "LIGHTS_CONFIG_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lights.json"),
+)
+# Rooms served when there is no config file, each with a simulated light.
+DEFAULT_ROOMS = ("living_room", "bedroom", "kitchen", "bathroom")
+DRIVERS = ("simulated", "gpio", "tapo")
+BULB_MODELS = {"l510", "l520", "l530", "l535", "l610", "l630", "l900"}
+PWM_FREQUENCY_HZ = 800
+# Same bus name as the PIR in api/routers/sensors.py: one thread per GPIO chip.
+GPIO_CHIP = "gpiochip0"
+
+
+class LightDriverError(Exception):
+    """The light could not be switched; its stored state is left unchanged."""
+
+
+@dataclass(frozen=True)
+class LightConfig:
+    room: str
+    driver: str = "simulated"
+    # gpio: BCM pin number and PWM frequency.
+    pin: Optional[int] = None
+    frequency: int = PWM_FREQUENCY_HZ
+    # tapo: bulb address and model.
+    ip: Optional[str] = None
+    model: str = "l530"
+
+
+def load_light_configs(path: str = LIGHTS_CONFIG_FILE) -> Dict[str, LightConfig]:
+    """Read the light list from a JSON file.
+
+        {"lights": [
+            {"room": "living_room", "driver": "gpio", "pin": 18},
+            {"room": "bedroom", "driver": "tapo", "ip": "192.168.0.50", "model": "l530"},
+            {"room": "kitchen"}
+        ]}
+
+    Rooms without a driver get a simulated light. Without a file, the
+    default rooms are served by simulated lights.
+    """
+    if not os.path.exists(path):
+        return {room: LightConfig(room) for room in DEFAULT_ROOMS}
+
+    with open(path) as f:
+        entries = json.load(f).get("lights", [])
+
+    configs: Dict[str, LightConfig] = {}
+    for entry in entries:
+        driver = entry.get("driver", "simulated").lower()
+        model = entry.get("model", "l530").lower()
+        if driver not in DRIVERS:
+            logger.error(f"Unsupported light driver '{driver}' for {entry.get('room')}, skipping.")
+        elif driver == "gpio" and entry.get("pin") is None:
+            logger.error(f"GPIO light {entry.get('room')} has no pin, skipping.")
+        elif driver == "tapo" and (not entry.get("ip") or model not in BULB_MODELS):
+            logger.error(f"Tapo light {entry.get('room')} needs an ip and a bulb model, skipping.")
+        else:
+            configs[entry["room"]] = LightConfig(
+                entry["room"], driver, entry.get("pin"), int(entry.get("frequency", PWM_FREQUENCY_HZ)),
+                entry.get("ip"), model,
+            )
+    return configs
+
+
+class SimulatedLightDriver:
+    """A light that only exists in memory, answering after a network-like delay."""
+
+    kind = "simulated"
+
+    def __init__(self, room: str, latency_ms: float = SIM_TAPO_LATENCY_MS / 4):
+        self.room = room
+        self.latency_ms = latency_ms
+        self.rng = make_rng(f"light:{room}")
+        self.state: Dict[str, Any] = {"on": False, "brightness": None}
+
+    async def apply(self, state: Dict[str, Any]):
+        await asyncio.sleep(draw_latency(self.rng, self.latency_ms))
+        self.state = dict(state)
+
+
+class GPIOPWMDriver:
+    """Dims a LED strip (through a MOSFET) on one GPIO pin with lgpio's PWM.
+
+    `gpio` is the lgpio module or a `SimulatedGPIO`. All calls run on the
+    GPIO chip's bus thread.
+    """
+
+    kind = "gpio"
+
+    def __init__(self, room: str, gpio, pin: int, frequency: int = PWM_FREQUENCY_HZ):
+        self.room = room
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self._handle: Optional[int] = None
+
+    def _write(self, duty: float):
+        if self._handle is None:
+            handle = self.gpio.gpiochip_open(0)
+            self.gpio.gpio_claim_output(handle, self.pin, 0)
+            self._handle = handle
+        self.gpio.tx_pwm(self._handle, self.pin, self.frequency, duty)
+
+    async def apply(self, state: Dict[str, Any]):
+        brightness = state["brightness"] if state["brightness"] is not None else 100
+        duty = float(brightness) if state["on"] else 0.0
+        try:
+            await hardware.run(GPIO_CHIP, f"light:{self.room}", self._write, duty)
+        except Exception as e:
+            raise LightDriverError(f"GPIO {self.pin}: {e}") from e
+
+
+class TapoBulbDriver:
+    """A Tapo bulb, reached through an `OutletRegistry` keyed by room."""
+
+    kind = "tapo"
+
+    def __init__(self, room: str, registry: OutletRegistry):
+        self.room = room
+        self.registry = registry
+
+    async def apply(self, state: Dict[str, Any]):
+        async def switch(bulb):
+            if not state["on"]:
+                await bulb.off()
+                return
+            if state["brightness"] is not None:
+                await bulb.set_brightness(max(int(state["brightness"]), 1))
+            await bulb.on()
+
+        try:
+            await self.registry.call(self.room, switch)
+        except Exception as e:
+            raise LightDriverError(str(e) or type(e).__name__) from e
+
+
+def bulb_configs(configs: Dict[str, LightConfig]) -> Dict[str, OutletConfig]:
+    return {
+        room: OutletConfig(room, config.ip, config.model)
+        for room, config in configs.items() if config.driver == "tapo"
+    }
+
+
+def build_drivers(configs: Dict[str, LightConfig], gpio, bulbs: OutletRegistry) -> Dict[str, Any]:
+    """One driver per room. GPIO lights need `gpio` (lgpio or SimulatedGPIO); without it they are skipped."""
+    drivers: Dict[str, Any] = {}
+    for room, config in configs.items():
+        if config.driver == "gpio":
+            if gpio is None:
+                logger.error(f"Light '{room}' uses GPIO but lgpio is not available.")
+                continue
+            drivers[room] = GPIOPWMDriver(room, gpio, config.pin, config.frequency)
+        elif config.driver == "tapo":
+            drivers[room] = TapoBulbDriver(room, bulbs)
+        else:
+            drivers[room] = SimulatedLightDriver(room)
+    return drivers
@@ -0,0 +1,164 @@
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LIGHTS_DB_PATH = os.getenv(
+    "LIGHTS_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lights.db"),
+)
+BUSY_TIMEOUT_MS = 5000
+
+LightState = Dict[str, Any]
+
+
+class LightStore:
+    """Light state per room in SQLite (WAL), shared by every worker process.
+
+    Each update is one `BEGIN IMMEDIATE` transaction that rewrites a single
+    room and bumps a global version, so concurrent updates from several
+    workers serialize on the database lock and never interleave. With
+    synchronous=NORMAL a commit costs no fsync; the WAL is synced in
+    batches at checkpoints, and a crash of the process loses nothing.
+
+    Reads are served from an in-process copy that is reloaded only when
+    `PRAGMA data_version` shows another connection has committed since.
+
+    Switching a light and storing its state are two steps; the command
+    lock (`try_lock_commands`) keeps them together across processes, so
+    two workers can never drive the device in one order and commit in
+    the other.
+    """
+
+    def __init__(self, path: str = LIGHTS_DB_PATH, rooms: Iterable[str] = ()):
+        self.path = path
+        self.rooms = list(rooms)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._states: Dict[str, LightState] = {}
+        self._version = 0
+        self._data_version: Optional[int] = None
+        self.reloads = 0
+
+    def try_lock_commands(self):
+        """Take the cross-process command lock without blocking; an open file to close, or None.
+
+        A flock on `<db>.lock`, opened afresh each time, so it also
+        serializes commands within one process.
+        """
+        if self.path == ":memory:":
+            return open(os.devnull)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Autocommit mode: transactions are opened explicitly below.
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lights ("
+                "room TEXT PRIMARY KEY, is_on INTEGER NOT NULL, brightness INTEGER, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+            self._conn = conn
+            self._add_rooms(conn, self.rooms)
+        return self._conn
+
+    def _reload(self, conn: sqlite3.Connection):
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute("SELECT room, is_on, brightness FROM lights ORDER BY room").fetchall()
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        finally:
+            conn.execute("COMMIT")
+        self._states = {room: {"on": bool(is_on), "brightness": brightness} for room, is_on, brightness in rows}
+        self._version = version
+        self._data_version = data_version
+        self.reloads += 1
+
+    def _add_rooms(self, conn: sqlite3.Connection, rooms: Iterable[str]):
+        """Store rooms that are not stored yet, switched off."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = 0
+            for room in rooms:
+                added += conn.execute(
+                    "INSERT OR IGNORE INTO lights (room, is_on, brightness, updated) VALUES (?, 0, NULL, ?)",
+                    (room, time.time()),
+                ).rowcount
+            if added:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._data_version = None
+
+    def snapshot(self) -> Tuple[int, Dict[str, LightState]]:
+        """(version, room -> state). The version changes with every stored change, in any worker."""
+        with self._lock:
+            self._reload(self._connect())
+            return self._version, {room: dict(state) for room, state in self._states.items()}
+
+    def get(self, room: str) -> Optional[LightState]:
+        with self._lock:
+            self._reload(self._connect())
+            state = self._states.get(room)
+            return dict(state) if state is not None else None
+
+    def update(self, room: str, on: Optional[bool] = None,
+               brightness: Optional[int] = None) -> Tuple[bool, LightState, int]:
+        """Atomically change one room. Returns (changed, new state, version); KeyError for unknown rooms."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT is_on, brightness FROM lights WHERE room = ?", (room,)).fetchone()
+                if row is None:
+                    raise KeyError(room)
+                current = {"on": bool(row[0]), "brightness": row[1]}
+                state = {
+                    "on": current["on"] if on is None else bool(on),
+                    "brightness": current["brightness"] if brightness is None else int(brightness),
+                }
+                changed = state != current
+                if changed:
+                    conn.execute("UPDATE lights SET is_on = ?, brightness = ?, updated = ? WHERE room = ?",
+                                 (int(state["on"]), state["brightness"], time.time(), room))
+                    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            # Own commits do not move data_version, so reload explicitly.
+            self._data_version = None
+            self._reload(conn)
+            return changed, dict(state), self._version
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._data_version = None
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds. The last bucket catches everything slower.
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+EVENT_LOOP_PROBE_INTERVAL = 0.5
+
+# Requests are labelled by router (/api/<router>/...), so the label set stays
+# small no matter how many outlet ids or sensor names show up in paths.
+ROUTER_LABELS = {"sensors", "lights", "outlets", "thermostat", "stream", "rules", "rooms", "health"}
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, safe to update from worker threads.
+
+    An observation is one bisect and a few integer increments, cheap
+    enough to leave on for every request and every bus transaction.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        index = bisect_left(self.buckets, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+                "max_ms": round(self.max_ms, 3),
+                "buckets": {
+                    ("+Inf" if bound == float("inf") else str(bound)): count
+                    for bound, count in zip(self.buckets, self.counts)
+                },
+            }
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class RequestMetrics:
+    """Per-router request latency and status counts, fed by the HTTP middleware."""
+
+    def __init__(self):
+        self.latency: Dict[Labels, LatencyHistogram] = {}
+        self.responses: Dict[Labels, int] = {}
+
+    def observe(self, router: str, method: str, status: int, seconds: float):
+        key = (("router", router), ("method", method))
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = LatencyHistogram()
+        histogram.observe(seconds)
+        status_key = key + (("status", f"{status // 100}xx"),)
+        self.responses[status_key] = self.responses.get(status_key, 0) + 1
+
+
+def router_label(path: str) -> str:
+    parts = path.strip("/").split("/")
+    if parts[0] == "api" and len(parts) > 1 and parts[1] in ROUTER_LABELS:
+        return parts[1]
+    if parts[0] == "":
+        return "root"
+    if parts[0] == "metrics":
+        return "metrics"
+    return "other"
+
+
+class RequestMetricsMiddleware:
+    """Plain ASGI middleware timing each HTTP request until its response starts.
+
+    Streaming responses (the SSE endpoint) are measured to their first
+    byte, not for as long as the client stays connected.
+    """
+
+    def __init__(self, app, metrics: Optional[RequestMetrics] = None):
+        self.app = app
+        self.metrics = metrics or request_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status: int):
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                self.metrics.observe(router_label(scope["path"]), scope["method"], status,
+                                     time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record(500)
+
+
+class EventLoopMonitor:
+    """Measures event-loop lag: how late a sleep wakes up compared to what it asked for."""
+
+    def __init__(self, interval: float = EVENT_LOOP_PROBE_INTERVAL):
+        self.interval = interval
+        self.lag = LatencyHistogram()
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(time.perf_counter() - start - self.interval, 0.0)
+            self.lag.observe(self.last_lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _format_labels(labels: Mapping[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class PrometheusWriter:
+    """Builds the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self._declared = set()
+
+    def _declare(self, name: str, kind: str, help_text: str):
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, kind: str, help_text: str, value: Any, labels: Optional[Mapping[str, Any]] = None):
+        if value is None:
+            return
+        self._declare(name, kind, help_text)
+        self.lines.append(f"{name}{_format_labels(labels or {})} {_format_value(value)}")
+
+    def histogram(self, name: str, help_text: str, histogram: LatencyHistogram,
+                  labels: Optional[Mapping[str, Any]] = None):
+        """Render a millisecond LatencyHistogram as a cumulative histogram in seconds."""
+        self._declare(name, "histogram", help_text)
+        labels = dict(labels or {})
+        with histogram._lock:
+            counts = list(histogram.counts)
+            total_ms, count = histogram.total_ms, histogram.count
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else f"{bound / 1000:g}"
+            self.lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+        self.lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total_ms / 1000)}")
+        self.lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+event_loop_monitor = EventLoopMonitor()
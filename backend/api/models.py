@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 
 class SensorData(BaseModel):
     temperature: float
@@ -10,19 +10,23 @@ class SensorData(BaseModel):
 
 class LightStatus(BaseModel):
     on: bool
+    brightness: Optional[int] = None
 
 class ThermostatStatus(BaseModel):
-    temperature: float
-    target_temperature: float
+    # None without a fresh reading, or in "off" mode for the target.
+    temperature: Optional[float] = None
+    target_temperature: Optional[float] = None
     mode: str
     status: str
 
 class LightControl(BaseModel):
     room: str
     status: bool
+    # Percent; lights that cannot dim ignore it.
+    brightness: Optional[int] = Field(None, ge=1, le=100)
 
 class ThermostatControl(BaseModel):
-    temperature: float
+    temperature: Optional[float] = None
     mode: str
 
 
@@ -31,4 +35,18 @@ class OutletStatus(BaseModel):
 
 class OutletControl(BaseModel):
     outlet_id: str
-    status: bool
\ No newline at end of file
+    status: bool
+
+class OutletBatchControl(BaseModel):
+    commands: List[OutletControl]
+
+class OutletScene(BaseModel):
+    outlets: Dict[str, bool]
+
+class EdgeBatch(BaseModel):
+    node: str
+    room: str
+    boot: str
+    first_sequence: int
+    fields: List[str]
+    rows: List[List[Any]]
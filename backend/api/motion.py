@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MOTION_DEBOUNCE_MS = int(os.getenv("MOTION_DEBOUNCE_MS", "5"))
+MOTION_HOLDOFF_SECONDS = float(os.getenv("MOTION_HOLDOFF", "2.0"))
+MOTION_EVENT_HISTORY = int(os.getenv("MOTION_EVENT_HISTORY", "200"))
+
+
+class MotionDetector:
+    """Edge-triggered PIR motion detection.
+
+    lgpio delivers level changes on its own alert thread as soon as the kernel
+    reports them. Edges shorter than the debounce window are discarded by the
+    GPIO chip itself, and a new motion start within the holdoff period after
+    the previous one is counted as a retrigger instead of a new event; the
+    end of a retrigger is not recorded either, so every recorded
+    `motion_end` closes a recorded `motion_start`.
+    """
+
+    def __init__(self, debounce_ms: int = MOTION_DEBOUNCE_MS, holdoff: float = MOTION_HOLDOFF_SECONDS,
+                 history_size: int = MOTION_EVENT_HISTORY):
+        self.debounce_ms = debounce_ms
+        self.holdoff = holdoff
+        self.events: Deque[Dict] = deque(maxlen=history_size)
+        self.motion_active = False
+        self.last_motion_at: Optional[float] = None
+        self.last_clear_at: Optional[float] = None
+        self.event_count = 0
+        self.retrigger_count = 0
+        self._last_start_tick: Optional[int] = None
+        self._suppressed = False
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._callback = None
+        self._handle = None
+        self._pin = None
+
+    @property
+    def running(self) -> bool:
+        return self._callback is not None
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """Register a function called on the event loop for every motion event."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Dict], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def start(self, lgpio, handle, pin: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Claim `pin` for edge alerts and start receiving callbacks."""
+        self._loop = loop
+        lgpio.gpio_claim_alert(handle, pin, lgpio.BOTH_EDGES, lgpio.SET_PULL_DOWN)
+        lgpio.gpio_set_debounce_micros(handle, pin, self.debounce_ms * 1000)
+        with self._lock:
+            self.motion_active = bool(lgpio.gpio_read(handle, pin))
+        self._callback = lgpio.callback(handle, pin, lgpio.BOTH_EDGES, self._on_edge)
+        self._handle, self._pin = handle, pin
+        logger.info(f"✅ Motion detection armed on GPIO {pin} (debounce {self.debounce_ms} ms).")
+
+    def stop(self):
+        if self._callback is not None:
+            self._callback.cancel()
+            self._callback = None
+
+    def _on_edge(self, chip, gpio, level, tick):
+        # Runs on lgpio's alert thread. Level 2 is a watchdog timeout, not an edge.
+        if level not in (0, 1):
+            return
+        self.record(bool(level), tick)
+
+    def record(self, active: bool, tick: Optional[int] = None) -> Optional[Dict]:
+        """Apply one debounced level change. Returns the recorded event, if any."""
+        now = time.time()
+        tick = time.monotonic_ns() if tick is None else tick
+        with self._lock:
+            if active == self.motion_active:
+                return None
+            self.motion_active = active
+
+            if active:
+                if self._last_start_tick is not None and tick - self._last_start_tick < self.holdoff * 1e9:
+                    self.retrigger_count += 1
+                    self._suppressed = True
+                    return None
+                self._last_start_tick = tick
+                self.last_motion_at = now
+                self.event_count += 1
+                event = {"type": "motion_start", "timestamp": now}
+            else:
+                self.last_clear_at = now
+                if self._suppressed:
+                    self._suppressed = False
+                    return None
+                event = {"type": "motion_end", "timestamp": now}
+            self.events.append(event)
+
+        if self._loop is not None and self._listeners:
+            for callback in list(self._listeners):
+                self._loop.call_soon_threadsafe(callback, event)
+        return event
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "motion_detected": self.motion_active,
+                "last_motion_at": self.last_motion_at,
+                "last_clear_at": self.last_clear_at,
+                "event_count": self.event_count,
+                "retrigger_count": self.retrigger_count,
+            }
+
+    def recent_events(self, limit: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            events = list(self.events)
+        return events[-limit:] if limit else events
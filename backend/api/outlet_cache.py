@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTLET_CACHE_TTL_SECONDS = float(os.getenv("OUTLET_CACHE_TTL", "2.0"))
+
+
+class OutletStateCache:
+    """Short-lived per-outlet state cache with single-flight fetches.
+
+    Readers within the TTL get the cached state. When it has expired, the
+    first reader starts one device query and every concurrent reader awaits
+    that same query instead of opening its own session to the plug. A
+    query that started before the last write is never joined: a read after
+    a command always sees the device after the command.
+    """
+
+    def __init__(self, ttl: float = OUTLET_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._inflight: Dict[str, Tuple[asyncio.Task, int]] = {}
+        # Bumped on every write so a query that started before a command
+        # cannot overwrite the newer, written state when it completes.
+        self._versions: Dict[str, int] = {}
+        # Bumped only when the stored state actually changes; used for ETags.
+        self.revisions: Dict[str, int] = {}
+        self._last_states: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, outlet_id: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        entry = self._entries.get(outlet_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+        return await self.refresh(outlet_id, fetch)
+
+    async def refresh(self, outlet_id: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Query the device, joining an in-flight query for the same outlet if it started after the last write."""
+        version = self._versions.get(outlet_id, 0)
+        inflight = self._inflight.get(outlet_id)
+        if inflight is not None and inflight[1] == version:
+            task = inflight[0]
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(outlet_id, fetch, version))
+            self._inflight[outlet_id] = (task, version)
+        # Shielded so that one cancelled reader does not cancel the query
+        # the other readers are waiting on.
+        return await asyncio.shield(task)
+
+    async def _fetch(self, outlet_id: str, fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                     version: int) -> Dict[str, Any]:
+        try:
+            state = await fetch()
+            if self._versions.get(outlet_id, 0) == version:
+                self._store(outlet_id, state)
+            return state
+        finally:
+            # A newer query may have replaced this one in the meantime.
+            if self._inflight.get(outlet_id, (None, 0))[0] is asyncio.current_task():
+                del self._inflight[outlet_id]
+
+    def set(self, outlet_id: str, state: Dict[str, Any]):
+        """Write-through update after a command."""
+        self._versions[outlet_id] = self._versions.get(outlet_id, 0) + 1
+        self._store(outlet_id, state)
+
+    def _store(self, outlet_id: str, state: Dict[str, Any]):
+        self._entries[outlet_id] = (state, time.monotonic())
+        if self._last_states.get(outlet_id) != state:
+            self._last_states[outlet_id] = state
+            self.revisions[outlet_id] = self.revisions.get(outlet_id, 0) + 1
+
+    def revision(self, outlet_id: str, state: Dict[str, Any]) -> Optional[int]:
+        """Revision of `state` if it is the outlet's current cached state, else None."""
+        entry = self._entries.get(outlet_id)
+        if entry is None or entry[0] is not state:
+            return None
+        return self.revisions[outlet_id]
+
+    def invalidate(self, outlet_id: str):
+        self._versions[outlet_id] = self._versions.get(outlet_id, 0) + 1
+        self._entries.pop(outlet_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from api.metrics import LatencyHistogram
+from api.supervisor import CircuitBreaker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TAPO_DEVICES_FILE = os.getenv(
+    "TAPO_DEVICES_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outlets.json"),
+)
+CONNECT_CONCURRENCY = int(os.getenv("TAPO_CONNECT_CONCURRENCY", "8"))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("TAPO_CONNECT_TIMEOUT", "10"))
+# One device call (on/off, device info) on an existing session.
+CALL_TIMEOUT_SECONDS = float(os.getenv("TAPO_CALL_TIMEOUT", "5"))
+BACKOFF_INITIAL_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 300.0
+
+PLUG_MODELS = {"p100", "p105", "p110", "p115"}
+STRIP_MODELS = {"p300", "p304", "p306", "p316"}
+
+
+async def gather_limited(coroutines: Iterable[Awaitable], limit: int) -> List[Any]:
+    """Like `asyncio.gather(..., return_exceptions=True)` with at most `limit` running at once."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines), return_exceptions=True)
+
+
+class OutletUnavailableError(Exception):
+    """The outlet is configured but currently has no working session."""
+
+
+@dataclass(frozen=True)
+class OutletConfig:
+    outlet_id: str
+    ip: str
+    model: str = "p110"
+    name: Optional[str] = None
+    # Socket position on a power strip (P300 and friends), 1-based.
+    position: Optional[int] = None
+
+
+def load_outlet_configs(path: str = TAPO_DEVICES_FILE) -> Dict[str, OutletConfig]:
+    """Read the outlet list from a JSON file.
+
+    Plugs are listed with an id, IP address and model. A power strip lists
+    its sockets, each becoming an outlet of its own:
+
+        {"outlets": [
+            {"id": "main_outlet", "ip": "192.168.0.40", "model": "p110"},
+            {"ip": "192.168.0.41", "model": "p300",
+             "sockets": {"desk_lamp": 1, "monitor": 2}}
+        ]}
+
+    Without a file, falls back to the single `main_outlet` at `TAPO_IP`.
+    """
+    if not os.path.exists(path):
+        ip_address = os.getenv("TAPO_IP")
+        return {"main_outlet": OutletConfig("main_outlet", ip_address)} if ip_address else {}
+
+    with open(path) as f:
+        entries = json.load(f).get("outlets", [])
+
+    configs: Dict[str, OutletConfig] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            logger.error(f"Outlet entry {entry!r} is not an object, skipping.")
+            continue
+        label = entry.get("id", entry.get("ip"))
+        model = str(entry.get("model", "p110")).lower()
+        if model not in STRIP_MODELS and model not in PLUG_MODELS:
+            logger.error(f"Unsupported Tapo model '{model}' for {label}, skipping.")
+        elif not entry.get("ip"):
+            logger.error(f"Outlet {label} has no ip, skipping.")
+        elif model in STRIP_MODELS:
+            sockets = entry.get("sockets", {})
+            if not isinstance(sockets, dict):
+                logger.error(f"Power strip {label} lists its sockets as {sockets!r}, not id -> position; skipping.")
+                continue
+            for outlet_id, position in sockets.items():
+                try:
+                    configs[outlet_id] = OutletConfig(outlet_id, entry["ip"], model, entry.get("name"), int(position))
+                except (TypeError, ValueError):
+                    logger.error(f"Socket {outlet_id} of {label} has no valid position, skipping.")
+        elif not entry.get("id"):
+            logger.error(f"Tapo plug at {entry['ip']} has no id, skipping.")
+        else:
+            configs[entry["id"]] = OutletConfig(entry["id"], entry["ip"], model, entry.get("name"))
+    return configs
+
+
+class OutletRegistry:
+    """Holds a device handler per configured outlet and keeps it connected.
+
+    Devices are connected concurrently, with a cap on parallel handshakes
+    and a timeout per device, so one unreachable plug does not hold up the
+    others. A failed or expired session is reconnected lazily on next use,
+    with exponential backoff between attempts.
+
+    Every outlet also has a circuit breaker: once a plug keeps failing,
+    calls to it are refused at once instead of each waiting out the
+    network timeout, until a probe (see `probe`) finds it back.
+    """
+
+    def __init__(self, configs: Dict[str, OutletConfig], concurrency: int = CONNECT_CONCURRENCY,
+                 timeout: float = CONNECT_TIMEOUT_SECONDS, sessions=None, call_timeout: float = CALL_TIMEOUT_SECONDS):
+        self.configs = configs
+        self.sessions = sessions
+        if sessions is not None:
+            sessions.on_expired = self.drop_device
+        self.timeout = timeout
+        self.call_timeout = call_timeout
+        self.breakers = {outlet_id: CircuitBreaker(f"outlet {outlet_id}") for outlet_id in configs}
+        self.client = None
+        self.handlers: Dict[str, Any] = {}
+        self.failures: Dict[str, int] = {}
+        self.errors: Dict[str, str] = {}
+        self.retry_at: Dict[str, float] = {}
+        # Round trip of every device call, including a reconnect and retry.
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.call_errors: Dict[str, int] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._connecting: Dict[str, asyncio.Task] = {}
+        self._strips: Dict[str, asyncio.Task] = {}
+
+    def __contains__(self, outlet_id: str) -> bool:
+        return outlet_id in self.configs
+
+    def outlet_ids(self) -> List[str]:
+        return list(self.configs)
+
+    async def connect_all(self, client):
+        self.client = client
+        self._strips.clear()
+        results = await asyncio.gather(*(self._connect(outlet_id) for outlet_id in self.configs),
+                                       return_exceptions=True)
+        for outlet_id, result in zip(self.configs, results):
+            if isinstance(result, Exception):
+                # Unreachable from the start: fail fast until a probe reaches it.
+                self.breakers[outlet_id].trip(result)
+        connected = len(self.handlers)
+        logger.info(f"Connected {connected}/{len(self.configs)} Tapo outlets.")
+
+    async def _open(self, config: OutletConfig):
+        """Connect one outlet. Returns its handler and, for strip sockets, the child device id."""
+        if config.model not in STRIP_MODELS:
+            handler = await getattr(self.client, config.model)(config.ip)
+            if self.sessions is not None:
+                self.sessions.register(config.ip, handler)
+            return handler, None
+
+        # Sockets of one strip share a single strip session.
+        strip_task = self._strips.get(config.ip)
+        if strip_task is None:
+            strip_task = asyncio.ensure_future(self._open_strip(config))
+            self._strips[config.ip] = strip_task
+        try:
+            strip = await asyncio.shield(strip_task)
+        except Exception:
+            if self._strips.get(config.ip) is strip_task:
+                del self._strips[config.ip]
+            raise
+
+        device_id = self.sessions.child_device_id(config.outlet_id, config.ip) if self.sessions else None
+        if device_id:
+            # Known socket: skip listing the strip's children.
+            return await strip.plug_unchecked(device_id), device_id
+        handler = await strip.plug(position=config.position)
+        if self.sessions is None:
+            return handler, None
+        device_info = await handler.get_device_info()
+        return handler, device_info.to_dict().get("device_id")
+
+    async def _open_strip(self, config: OutletConfig):
+        strip = await getattr(self.client, config.model)(config.ip)
+        if self.sessions is not None:
+            self.sessions.register(config.ip, strip)
+        return strip
+
+    async def _connect(self, outlet_id: str):
+        task = self._connecting.get(outlet_id)
+        if task is None:
+            task = asyncio.create_task(self._do_connect(outlet_id))
+            self._connecting[outlet_id] = task
+            task.add_done_callback(lambda _: self._connecting.pop(outlet_id, None))
+        return await asyncio.shield(task)
+
+    async def _do_connect(self, outlet_id: str):
+        config = self.configs[outlet_id]
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                handler, device_id = await asyncio.wait_for(self._open(config), self.timeout)
+            except Exception as e:
+                self.handlers.pop(outlet_id, None)
+                self._mark_failed(outlet_id, e)
+                logger.error(f"❌ FAILED to connect to outlet '{outlet_id}' at {config.ip}: {str(e) or type(e).__name__}")
+                raise OutletUnavailableError(f"Outlet '{outlet_id}' is unreachable") from e
+
+        self.handlers[outlet_id] = handler
+        if self.sessions is not None:
+            self.sessions.record_handshake(outlet_id, config.ip, time.perf_counter() - start, device_id)
+        self.failures.pop(outlet_id, None)
+        self.errors.pop(outlet_id, None)
+        self.retry_at.pop(outlet_id, None)
+        logger.info(f"✅ Successfully connected to outlet '{outlet_id}' at {config.ip}")
+        return handler
+
+    def _mark_failed(self, outlet_id: str, error: Exception):
+        failures = self.failures.get(outlet_id, 0) + 1
+        self.failures[outlet_id] = failures
+        self.errors[outlet_id] = str(error) or type(error).__name__
+        delay = min(BACKOFF_INITIAL_SECONDS * 2 ** (failures - 1), BACKOFF_MAX_SECONDS)
+        self.retry_at[outlet_id] = time.monotonic() + delay
+
+    async def get(self, outlet_id: str):
+        """Return a connected handler, reconnecting if the backoff allows it."""
+        handler = self.handlers.get(outlet_id)
+        if handler is not None:
+            return handler
+        if self.client is None:
+            raise OutletUnavailableError(f"Outlet '{outlet_id}' is not connected")
+        if time.monotonic() < self.retry_at.get(outlet_id, 0):
+            raise OutletUnavailableError(f"Outlet '{outlet_id}' is unreachable, retrying later")
+        return await self._connect(outlet_id)
+
+    async def call(self, outlet_id: str, operation: Callable[[Any], Awaitable]):
+        """Run `operation(handler)`; on failure drop the session and retry once on a fresh one.
+
+        Refused right away while the outlet's breaker is open.
+        """
+        breaker = self.breakers[outlet_id]
+        if not breaker.allow():
+            raise OutletUnavailableError(f"Outlet '{outlet_id}' is down, retrying in {breaker.retry_in:.0f}s")
+        start = time.perf_counter()
+        try:
+            handler = await self.get(outlet_id)
+            try:
+                result = await asyncio.wait_for(operation(handler), self.call_timeout)
+            except Exception as e:
+                logger.warning(f"Call to outlet '{outlet_id}' failed ({str(e) or type(e).__name__}), reconnecting.")
+                if self.handlers.get(outlet_id) is handler:
+                    self.drop_device(self.configs[outlet_id].ip)
+                handler = await self._connect(outlet_id)
+                result = await asyncio.wait_for(operation(handler), self.call_timeout)
+        except Exception as e:
+            self.call_errors[outlet_id] = self.call_errors.get(outlet_id, 0) + 1
+            breaker.record_failure(e)
+            raise
+        finally:
+            self.latency.setdefault(outlet_id, LatencyHistogram()).observe(time.perf_counter() - start)
+        breaker.record_success()
+        return result
+
+    async def probe(self, outlet_id: str):
+        """Reconnect if needed and check the outlet answers, ignoring the reconnect backoff.
+
+        The supervisor's re-probe: it holds the breaker's trial itself.
+        """
+        if self.client is None:
+            raise OutletUnavailableError(f"Outlet '{outlet_id}' is not connected")
+        self.retry_at.pop(outlet_id, None)
+        handler = self.handlers.get(outlet_id) or await self._connect(outlet_id)
+        try:
+            await asyncio.wait_for(handler.get_device_info(), self.call_timeout)
+        except Exception:
+            if self.handlers.get(outlet_id) is handler:
+                self.drop_device(self.configs[outlet_id].ip)
+            raise
+
+    def supervise(self, supervisor, prefix: str = "outlet"):
+        """Let `supervisor` re-probe every outlet whose breaker opens."""
+        for outlet_id, breaker in self.breakers.items():
+            supervisor.watch(f"{prefix}:{outlet_id}", breaker, lambda outlet_id=outlet_id: self.probe(outlet_id))
+
+    def drop_device(self, ip: str):
+        """Forget every handler that uses the session of the device at `ip`."""
+        for outlet_id, config in self.configs.items():
+            if config.ip == ip:
+                self.handlers.pop(outlet_id, None)
+        self._strips.pop(ip, None)
+        if self.sessions is not None:
+            self.sessions.forget(ip)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            outlet_id: {
+                "model": config.model,
+                "connected": outlet_id in self.handlers,
+                "failures": self.failures.get(outlet_id, 0),
+                "error": self.errors.get(outlet_id),
+                "retry_in": round(max(self.retry_at[outlet_id] - now, 0), 1) if outlet_id in self.retry_at else None,
+                "breaker": self.breakers[outlet_id].state,
+            }
+            for outlet_id, config in self.configs.items()
+        }
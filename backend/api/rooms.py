@@ -0,0 +1,159 @@
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Room served by this node's own sensors.
+NODE_ROOM = os.getenv("NODE_ROOM", "main")
+ROOM_STALE_SECONDS = float(os.getenv("ROOM_STALE_SECONDS", "60"))
+ROOM_RECENT_ROWS = int(os.getenv("ROOM_RECENT_ROWS", "300"))
+# Ingest limits the central node enforces; agents back off when they hit them.
+EDGE_MAX_BATCH_ROWS = int(os.getenv("EDGE_MAX_BATCH_ROWS", "500"))
+EDGE_MIN_PUSH_INTERVAL = float(os.getenv("EDGE_MIN_PUSH_INTERVAL", "1.0"))
+
+
+class IngestRejected(Exception):
+    """The batch was refused; `retry_after` tells the agent when to try again."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def row_timestamp(value: Any) -> Optional[float]:
+    """A row's `t` as epoch seconds, or None if it is not a finite number."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return None
+    return float(value)
+
+
+class RoomState:
+    """Latest readings of one room plus a short window of recent rows."""
+
+    def __init__(self, room: str, recent_rows: int = ROOM_RECENT_ROWS):
+        self.room = room
+        self.node: Optional[str] = None
+        self.readings: Dict[str, Any] = {}
+        self.timestamp: Optional[float] = None
+        self.received_at: Optional[float] = None
+        self.samples = 0
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=recent_rows)
+
+    def update(self, node: str, timestamp: float, readings: Mapping[str, Any]):
+        self.recent.append({"t": timestamp, **readings})
+        self.samples += 1
+        if self.timestamp is None or timestamp >= self.timestamp:
+            self.node = node
+            self.timestamp = timestamp
+            self.readings = dict(readings)
+        self.received_at = time.monotonic()
+
+    def status(self, stale_after: float) -> Dict[str, Any]:
+        age = time.monotonic() - self.received_at if self.received_at is not None else None
+        return {
+            **self.readings,
+            "room": self.room,
+            "node": self.node,
+            "timestamp": self.timestamp,
+            "age": round(age, 3) if age is not None else None,
+            "stale": age is None or age > stale_after,
+        }
+
+
+class RoomAggregator:
+    """Per-room view of the house, fed by this node's sampler and by edge agents.
+
+    Agents push column-oriented batches:
+
+        {"node": "pi-bedroom", "room": "bedroom", "boot": "5f3a...", "first_sequence": 120,
+         "fields": ["t", "temperature", "humidity", "source"],
+         "rows": [[1718000000.0, 21.4, 48.2, "real"], ...]}
+
+    Row `i` carries sequence number `first_sequence + i`. Rows at or below
+    the last sequence accepted from that node are skipped, so an agent can
+    resend a batch whose acknowledgement got lost. `boot` changes whenever
+    the agent restarts and its sequence numbers start over.
+    """
+
+    def __init__(self, stale_after: float = ROOM_STALE_SECONDS, max_batch_rows: int = EDGE_MAX_BATCH_ROWS,
+                 min_push_interval: float = EDGE_MIN_PUSH_INTERVAL, recent_rows: int = ROOM_RECENT_ROWS):
+        self.stale_after = stale_after
+        self.max_batch_rows = max_batch_rows
+        self.min_push_interval = min_push_interval
+        self.recent_rows = recent_rows
+        self.rooms: Dict[str, RoomState] = {}
+        self.last_sequence: Dict[str, int] = {}
+        self.boots: Dict[str, str] = {}
+        self.last_push: Dict[str, float] = {}
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.listeners: List[Callable[[str, RoomState], None]] = []
+
+    def room(self, room: str) -> RoomState:
+        if room not in self.rooms:
+            self.rooms[room] = RoomState(room, self.recent_rows)
+        return self.rooms[room]
+
+    def record(self, room: str, node: str, timestamp: float, readings: Mapping[str, Any]):
+        state = self.room(room)
+        state.update(node, timestamp, readings)
+        for listener in self.listeners:
+            listener(room, state)
+
+    def ingest(self, node: str, room: str, boot: str, first_sequence: int, fields: Sequence[str],
+               rows: Sequence[Sequence[Any]]) -> Dict[str, Any]:
+        if len(rows) > self.max_batch_rows:
+            self.rejected += 1
+            raise IngestRejected(413, f"Batch of {len(rows)} rows exceeds the limit of {self.max_batch_rows}")
+        now = time.monotonic()
+        since_last = now - self.last_push.get(node, float("-inf"))
+        if since_last < self.min_push_interval:
+            self.rejected += 1
+            raise IngestRejected(429, f"Node '{node}' is pushing too often",
+                                 retry_after=round(self.min_push_interval - since_last, 3))
+        if "t" not in fields:
+            raise IngestRejected(422, "Batch fields must include 't'")
+        self.last_push[node] = now
+
+        if self.boots.get(node) != boot:
+            # New agent process: its sequence numbers start over.
+            self.boots[node] = boot
+            self.last_sequence.pop(node, None)
+        last = self.last_sequence.get(node, -1)
+        time_index = list(fields).index("t")
+        accepted = 0
+        for offset, row in enumerate(rows):
+            sequence = first_sequence + offset
+            # Malformed rows (wrong length, no usable time) are skipped but
+            # still acknowledged, so the agent does not resend the batch.
+            timestamp = row_timestamp(row[time_index]) if len(row) == len(fields) else None
+            if sequence <= last or timestamp is None:
+                self.duplicates += sequence <= last
+                continue
+            readings = {field: value for field, value in zip(fields, row) if field != "t"}
+            self.record(room, node, timestamp, readings)
+            accepted += 1
+        if rows:
+            self.last_sequence[node] = max(last, first_sequence + len(rows) - 1)
+        self.accepted += accepted
+        return {"accepted": accepted, "last_sequence": self.last_sequence.get(node)}
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {room: state.status(self.stale_after) for room, state in sorted(self.rooms.items())}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rooms": len(self.rooms),
+            "nodes": len(self.last_sequence),
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+        }
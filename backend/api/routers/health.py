@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from api.ipc import deployment, owner_route
+from api.startup import STARTED_AT, startup
+from api.supervisor import supervisor
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/health", tags=["health"])
+
+
+@router.get("/live")
+def get_liveness():
+    """The process is up and its event loop answers; says nothing about the devices."""
+    return {"status": "alive", "pid": os.getpid(), "uptime": round(time.monotonic() - STARTED_AT, 3)}
+
+
+@router.get("/ready")
+def get_readiness():
+    """200 once device initialization has finished (even if some devices failed), 503 before.
+
+    A worker process is ready when its link to the hardware owner is up;
+    the owner's device steps are reported by the owner itself.
+    """
+    body = {"role": deployment.role}
+    if deployment.is_worker:
+        connected = deployment.client is not None and deployment.client.connected
+        body.update(ready=connected, link=deployment.client.status() if deployment.client else None)
+    else:
+        body.update(startup.status())
+        failed = [name for name, step in startup.steps.items() if step.state == "failed"]
+        if failed:
+            body["failed"] = failed
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@router.get("/devices")
+@owner_route("health.devices")
+def get_device_health():
+    """Circuit breaker of every sensor, plug and bulb, and the supervisor's probe counts."""
+    return supervisor.status()
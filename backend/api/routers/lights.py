@@ -1,9 +1,22 @@
 # THESE Light endpoint COULD BE USED IN FUTURE FOR IMPLEMENTATION CHANGE. Now using api/sensors/lights,motion etc.
 # Backend still shows the endpoint be aware.When we comment out this file backend can give errors.
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from api.conditional import response_cache
+from api.hardware import HARDWARE_BACKEND
+from api.ipc import deployment, owner_route
+from api.light_drivers import LightDriverError, build_drivers, bulb_configs, load_light_configs
+from api.light_store import LightStore, LIGHTS_DB_PATH
 from api.models import LightStatus, LightControl
+from api.outlet_registry import OutletRegistry, CONNECT_TIMEOUT_SECONDS
+from api import simulation
+from api.startup import LazyModule, tapo_client
+from api.stream import stream_hub
+from contextlib import asynccontextmanager
 from typing import Dict
+import asyncio
 import logging
+import os
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,37 +24,123 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/lights", tags=["lights"])
 
-# In-memory light state for demonstration purposes
-# TODO: Replace with actual hardware control (GPIO pins, smart bulbs, etc.)
-# This provides functional light control for UI testing and will be replaced
-# with real hardware integration later
-light_states = {
-    "living_room": {"on": False},
-    "bedroom": {"on": False},
-    "kitchen": {"on": False},
-    "bathroom": {"on": False}
-}
+SIMULATED = HARDWARE_BACKEND == "simulated"
+
+# Light state lives in a SQLite store shared by all worker processes and
+# kept across restarts; each room is switched through its own driver.
+light_configs = load_light_configs()
+bulb_registry = OutletRegistry(bulb_configs(light_configs))
+# lgpio is imported by the first PWM write, on the GPIO chip's thread.
+drivers = build_drivers(
+    light_configs, simulation.SimulatedGPIO(name="lights") if SIMULATED else LazyModule("lgpio"), bulb_registry,
+)
+store = LightStore(
+    os.path.join(simulation.SIMULATION_DATA_DIR, "lights.db") if SIMULATED else LIGHTS_DB_PATH,
+    rooms=light_configs,
+)
+COMMAND_LOCK_TIMEOUT = 5.0
+
+
+@asynccontextmanager
+async def command_lock():
+    """Hold the store's cross-process command lock around switching and storing a light."""
+    deadline = time.monotonic() + COMMAND_LOCK_TIMEOUT
+    while (lock_file := store.try_lock_commands()) is None:
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=503, detail="Lights are busy, try again")
+        await asyncio.sleep(0.01)
+    try:
+        yield
+    finally:
+        lock_file.close()
+
+
+def exclusive(driver) -> bool:
+    """GPIO pins can be claimed by one process only: the one holding the deployment lock."""
+    return driver.kind == "gpio"
+
+
+async def initialize_lights():
+    """Connect Tapo bulbs and put every light back into its stored state."""
+    if bulb_registry.configs:
+        if SIMULATED:
+            client = simulation.SimulatedTapoClient()
+        else:
+            client = await asyncio.to_thread(tapo_client, CONNECT_TIMEOUT_SECONDS)
+        if client is None:
+            logger.error("Tapo bulbs are configured but the Tapo username or password is not set.")
+        else:
+            await bulb_registry.connect_all(client)
+
+    _, states = await asyncio.to_thread(store.snapshot)
+    for room, driver in drivers.items():
+        if exclusive(driver) and not deployment.owns_hardware:
+            continue
+        if room in states:
+            try:
+                await driver.apply(states[room])
+            except LightDriverError as e:
+                logger.error(f"Could not restore light '{room}': {e}")
+    logger.info(f"Lights ready: {', '.join(f'{room} ({config.driver})' for room, config in light_configs.items())}")
+
+
+def device_status():
+    """Driver per room and whether it can be used, for the readiness endpoint."""
+    bulbs = bulb_registry.status()
+    return {
+        room: {"driver": config.driver,
+               "ok": room in drivers and (room not in bulbs or bulbs[room]["connected"])}
+        for room, config in light_configs.items()
+    }
+
 
 @router.get("/", response_model=Dict[str, LightStatus])
-def get_lights():
+async def get_lights(request: Request):
     """Get status of all lights"""
-    logger.info(f"Returning light states: {light_states}")
-    return light_states
+    version, states = await asyncio.to_thread(store.snapshot)
+    logger.debug(f"Returning light states: {states}")
+    return response_cache.respond(
+        request, "lights", version,
+        lambda: {room: states[room] for room in light_configs if room in states},
+        persistent=True,
+    )
 
 @router.post("/")
-def control_lights(light_control: LightControl):
+@owner_route("lights.control")
+async def control_lights(light_control: LightControl):
     """Control lights"""
     room = light_control.room
 
-    if room not in light_states:
+    if room not in light_configs:
         raise HTTPException(status_code=404, detail=f"Room '{room}' not found")
+    driver = drivers.get(room)
+    if driver is None:
+        raise HTTPException(status_code=503, detail=f"Light in {room} has no working driver")
+    if exclusive(driver) and not deployment.owns_hardware:
+        raise HTTPException(status_code=503, detail=f"Light in {room} is driven by another process; "
+                                                    "run multiple workers with WORKER_MODE=shared")
 
-    # Update the light state
-    light_states[room]["on"] = light_control.status
+    # One command at a time across all processes, so the drivers and the store agree.
+    async with command_lock():
+        current = await asyncio.to_thread(store.get, room)
+        state = {
+            "on": light_control.status,
+            "brightness": light_control.brightness if light_control.brightness is not None else current["brightness"],
+        }
+        if state != current:
+            try:
+                await driver.apply(state)
+            except LightDriverError as e:
+                logger.error(f"Failed to switch light {room}: {e}")
+                raise HTTPException(status_code=503, detail=f"Light in {room} is unavailable: {e}")
+            _, state, _ = await asyncio.to_thread(
+                store.update, room, light_control.status, light_control.brightness,
+            )
+            stream_hub.publish("lights", {room: state})
 
-    logger.info(f"Updated light {room}: {light_states[room]}")
+    logger.info(f"Updated light {room}: {state}")
 
     return {
         "message": f"Light in {room} {'turned on' if light_control.status else 'turned off'}",
-        "data": light_states[room]
-    }
\ No newline at end of file
+        "data": state
+    }
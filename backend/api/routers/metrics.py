@@ -0,0 +1,184 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from api.conditional import response_cache
+from api.hardware import hardware
+from api.ipc import deployment
+from api.metrics import PrometheusWriter, event_loop_monitor, request_metrics
+from api.stream import stream_hub
+from api.supervisor import supervisor
+from api.routers import sensors, outlets, rules, rooms, thermostat
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def collect_metrics() -> str:
+    """Render every counter and histogram the backend keeps, in Prometheus text format.
+
+    Nothing here touches hardware or the network: it only reads values the
+    request path, the sampler and the pollers already record.
+    """
+    out = PrometheusWriter()
+
+    for labels, histogram in list(request_metrics.latency.items()):
+        out.histogram("smarthome_http_request_duration_seconds",
+                      "HTTP request latency by router.", histogram, dict(labels))
+    for labels, count in list(request_metrics.responses.items()):
+        out.sample("smarthome_http_responses_total", "counter",
+                   "HTTP responses by router and status class.", count, dict(labels))
+
+    buses = list(hardware.buses.items())
+    for bus_name, bus in buses:
+        for device, histogram in list(bus.latency.items()):
+            out.histogram("smarthome_hardware_operation_duration_seconds",
+                          "Duration of blocking bus operations (I2C, GPIO).", histogram,
+                          {"bus": bus_name, "device": device})
+    for bus_name, bus in buses:
+        for device, count in list(bus.errors.items()):
+            out.sample("smarthome_hardware_errors_total", "counter",
+                       "Bus operations that raised.", count, {"bus": bus_name, "device": device})
+    for bus_name, bus in buses:
+        for device, count in list(bus.timeouts.items()):
+            out.sample("smarthome_hardware_timeouts_total", "counter",
+                       "Bus operations that timed out.", count, {"bus": bus_name, "device": device})
+
+    out.sample("smarthome_sensor_backend", "gauge",
+               "Where sensor readings come from (real, simulated or mock).", 1, {"backend": sensors.sensor_backend})
+    sampler = sensors.sampler
+    out.histogram("smarthome_sampler_lag_seconds", "How late each sensor sampling tick started.", sampler.lag)
+    out.sample("smarthome_sampler_skipped_ticks_total", "counter",
+               "Sampling ticks skipped because a read overran the interval.", sampler.skipped_ticks)
+    if sampler.latest is not None:
+        out.sample("smarthome_sensor_snapshot_age_seconds", "gauge",
+                   "Age of the latest sensor snapshot.", sampler.latest.age)
+        out.sample("smarthome_sensor_snapshots_total", "counter",
+                   "Snapshots published since startup.", sampler.latest.sequence)
+    for reason, count in list(sensors.mock_fallbacks.items()):
+        out.sample("smarthome_sensor_mock_fallbacks_total", "counter",
+                   "Sensor reads served from mock data.", count, {"reason": reason})
+
+    ring = sensors.sample_log.stats()
+    out.sample("smarthome_sample_log_samples_total", "counter", "Samples written to the local sample log.",
+               ring["next_sequence"])
+    out.sample("smarthome_sample_log_syncs_total", "counter", "msync calls on the sample log.", ring["syncs"])
+    out.sample("smarthome_sample_log_torn_records_total", "counter",
+               "Sample log records that failed their checksum.", ring["torn_records"])
+    for name, cursor in ring["cursors"].items():
+        out.sample("smarthome_sample_log_backlog", "gauge", "Logged samples a consumer has not processed yet.",
+                   ring["next_sequence"] - 1 - cursor, {"consumer": name})
+    out.sample("smarthome_history_mock_samples_skipped_total", "counter",
+               "Mock samples kept out of the history store.", sensors.history_flusher.skipped_mock)
+
+    for outlet_id, histogram in list(outlets.registry.latency.items()):
+        out.histogram("smarthome_tapo_call_duration_seconds",
+                      "Round trip of Tapo device calls, including reconnects.", histogram,
+                      {"outlet": outlet_id})
+    for outlet_id, count in list(outlets.registry.call_errors.items()):
+        out.sample("smarthome_tapo_call_errors_total", "counter",
+                   "Tapo device calls that failed after a retry.", count, {"outlet": outlet_id})
+    for outlet_id, status in outlets.registry.status().items():
+        out.sample("smarthome_tapo_connected", "gauge",
+                   "Whether the outlet has a live session.", int(status["connected"]), {"outlet": outlet_id})
+
+    cache_stats = outlets.outlet_cache.stats()
+    for kind in ("hits", "misses", "coalesced"):
+        out.sample(f"smarthome_outlet_cache_{kind}_total", "counter",
+                   f"Outlet state cache {kind}.", cache_stats[kind])
+    out.sample("smarthome_outlet_cache_hit_ratio", "gauge",
+               "Share of outlet state reads served from the cache.", cache_stats["hit_ratio"])
+
+    response_stats = response_cache.stats()
+    out.sample("smarthome_response_cache_hits_total", "counter",
+               "State responses served from cached JSON.", response_stats["hits"])
+    out.sample("smarthome_response_cache_misses_total", "counter",
+               "State responses rendered because their version changed.", response_stats["misses"])
+    out.sample("smarthome_http_not_modified_total", "counter",
+               "Conditional GETs answered with 304.", response_stats["not_modified"])
+
+    out.histogram("smarthome_event_loop_lag_seconds",
+                  "How late the event loop woke a periodic probe.", event_loop_monitor.lag)
+
+    for name, rule in list(rules.engine.rules.items()):
+        out.histogram("smarthome_rule_evaluation_duration_seconds",
+                      "Automation rule evaluation time.", rule.latency, {"rule": name})
+    for name, rule in list(rules.engine.rules.items()):
+        out.sample("smarthome_rule_fired_total", "counter", "Times a rule fired.", rule.fired, {"rule": name})
+
+    device = thermostat.thermostat
+    if device is not None:
+        out.histogram("smarthome_thermostat_loop_lag_seconds",
+                      "How late each thermostat control tick started.", device.lag)
+        out.sample("smarthome_thermostat_skipped_ticks_total", "counter",
+                   "Control ticks skipped because a tick overran the interval.", device.skipped_ticks)
+        out.sample("smarthome_thermostat_relay_on", "gauge",
+                   "Whether the heater outlet is switched on.", int(bool(device.relay_on)))
+        out.sample("smarthome_thermostat_duty", "gauge", "Heating duty cycle from the controller.", device.duty)
+        if device.target_temperature is not None:
+            out.sample("smarthome_thermostat_target_celsius", "gauge",
+                       "Current thermostat setpoint.", device.target_temperature)
+        out.sample("smarthome_thermostat_actuations_total", "counter",
+                   "Heater outlet switches.", device.actuations)
+        out.sample("smarthome_thermostat_actuation_failures_total", "counter",
+                   "Heater outlet switches that failed.", device.failures)
+
+    room_stats = rooms.aggregator.stats()
+    out.sample("smarthome_edge_rows_accepted_total", "counter",
+               "Rows accepted from edge agents.", room_stats["accepted"])
+    out.sample("smarthome_edge_rows_duplicate_total", "counter",
+               "Resent rows skipped by sequence number.", room_stats["duplicates"])
+    out.sample("smarthome_edge_batches_rejected_total", "counter",
+               "Edge batches refused for size or push rate.", room_stats["rejected"])
+    for room, status in rooms.aggregator.status().items():
+        out.sample("smarthome_room_age_seconds", "gauge",
+                   "Seconds since a room last reported.", status["age"], {"room": room})
+
+    out.sample("smarthome_stream_subscribers", "gauge",
+               "Connected live stream clients.", stream_hub.subscriber_count)
+    out.sample("smarthome_stream_dropped_subscribers_total", "counter",
+               "Stream clients dropped for falling behind.", stream_hub.dropped_subscribers)
+
+    breakers = list(supervisor.breakers.items())
+    for name, breaker in breakers:
+        out.sample("smarthome_device_up", "gauge",
+                   "Whether the device's circuit breaker is closed.", int(breaker.state == "closed"), {"device": name})
+    for name, breaker in breakers:
+        out.sample("smarthome_device_breaker_trips_total", "counter",
+                   "Times the device's circuit breaker opened.", breaker.trips, {"device": name})
+    for name, breaker in breakers:
+        out.sample("smarthome_device_calls_rejected_total", "counter",
+                   "Calls refused while the device's breaker was open.", breaker.rejected, {"device": name})
+    out.sample("smarthome_supervisor_probes_total", "counter",
+               "Re-initialization probes of failed devices.", supervisor.probes_run)
+    out.sample("smarthome_supervisor_recoveries_total", "counter",
+               "Probes that brought a device back.", supervisor.recoveries)
+
+    out.sample("smarthome_worker_role", "gauge",
+               "Whether this process owns the hardware or forwards to the owner.", 1, {"role": deployment.role})
+    if deployment.server is not None:
+        owner = deployment.server.status()
+        out.sample("smarthome_owner_workers", "gauge", "Worker processes connected to the hardware owner.",
+                   owner["workers"])
+        out.sample("smarthome_owner_calls_total", "counter", "Operations run for worker processes.", owner["calls"])
+        out.sample("smarthome_owner_call_errors_total", "counter",
+                   "Operations for workers that raised.", owner["errors"])
+    if deployment.client is not None:
+        link = deployment.client.status()
+        out.sample("smarthome_owner_link_connected", "gauge",
+                   "Whether this worker is connected to the hardware owner.", int(link["connected"]))
+        out.sample("smarthome_owner_link_failures_total", "counter",
+                   "Forwarded calls that failed or timed out.", link["failures"])
+        out.sample("smarthome_owner_link_reconnects_total", "counter",
+                   "Times this worker lost the hardware owner.", link["reconnects"])
+
+    return out.render()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint (on the event loop, like the code that updates the counters)"""
+    return PlainTextResponse(collect_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
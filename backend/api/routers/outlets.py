@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from api.models import OutletControl
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Request
+from api.conditional import response_cache
+from api.energy import EnergyCollector, ENERGY_DIR, ENERGY_MODELS
+from api.hardware import HARDWARE_BACKEND
+from api.ipc import RemoteCallError, deployment, handler, owner_route
+from api.models import OutletControl, OutletBatchControl, OutletScene
+from api.outlet_cache import OutletStateCache
+from api.outlet_registry import (
+    OutletRegistry, OutletUnavailableError, load_outlet_configs, gather_limited,
+    CONNECT_CONCURRENCY, CONNECT_TIMEOUT_SECONDS,
+)
+from api.scenes import SceneStore
+from api import simulation
+from api.startup import tapo_client
+from api.stream import stream_hub
+from api.tapo_sessions import TapoSessionManager
+from typing import Dict, Optional, Set
+import asyncio
 import logging
 import os
-from dotenv import load_dotenv
-from tapo import ApiClient
-
-
-load_dotenv()
-TAPO_USERNAME = os.getenv("TAPO_USERNAME")
-TAPO_PASSWORD = os.getenv("TAPO_PASSWORD")
+import time
 
 
 logging.basicConfig(level=logging.INFO)
@@ -17,68 +26,290 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/outlets", tags=["outlets"])
 
-TAPO_DEVICES = {
-    "main_outlet": os.getenv("TAPO_IP"),
-}
+SIMULATED = HARDWARE_BACKEND == "simulated"
+
+if SIMULATED:
+    # Keep simulated session and energy files away from the real ones.
+    sessions = TapoSessionManager(os.path.join(simulation.SIMULATION_DATA_DIR, "tapo_sessions.json"))
+    registry = OutletRegistry(simulation.simulated_outlet_configs(), sessions=sessions)
+else:
+    sessions = TapoSessionManager()
+    registry = OutletRegistry(load_outlet_configs(), sessions=sessions)
+
+OUTLET_POLL_INTERVAL = float(os.getenv("OUTLET_POLL_INTERVAL", "10"))
+outlet_poll_task: Optional[asyncio.Task] = None
 
-tapo_device_objects: Dict[str, ApiClient] = {}
+outlet_cache = OutletStateCache()
+OUTLET_CONFIRM_DELAY = float(os.getenv("OUTLET_CONFIRM_DELAY", "1.0"))
+confirm_tasks: Set[asyncio.Task] = set()
+
+scene_store = SceneStore()
+energy_collector = EnergyCollector(
+    registry, directory=os.path.join(simulation.SIMULATION_DATA_DIR, "energy") if SIMULATED else ENERGY_DIR
+)
+BATCH_CONCURRENCY = int(os.getenv("OUTLET_BATCH_CONCURRENCY", "8"))
 
 
 async def initialize_tapo_devices():
     logger.info("Initializing Tapo outlet connections...")
-    if not all([TAPO_USERNAME, TAPO_PASSWORD]):
-        logger.error("Tapo username or password not set in .env file.")
+    if SIMULATED:
+        logger.info(f"Using {len(registry.configs)} simulated Tapo outlets (HARDWARE_BACKEND=simulated).")
+        client = simulation.SimulatedTapoClient()
+    elif not registry.configs:
+        logger.warning("No Tapo outlets configured.")
         return
-    
-    client = ApiClient(TAPO_USERNAME, TAPO_PASSWORD)
-    for outlet_id, ip_address in TAPO_DEVICES.items():
-        if ip_address:
-            try:
-                device = await client.p110(ip_address)
-                tapo_device_objects[outlet_id] = device
-                logger.info(f"✅ Successfully connected to outlet '{outlet_id}' at {ip_address}")
-            except Exception as e:
-                logger.error(f"❌ FAILED to connect to outlet '{outlet_id}' at {ip_address}: {e}")
+    else:
+        # .env and the tapo library are only loaded once there is something to connect.
+        client = await asyncio.to_thread(tapo_client, CONNECT_TIMEOUT_SECONDS)
+        if client is None:
+            logger.error("Tapo username or password not set in .env file.")
+            return
+
+    await registry.connect_all(client)
+    await asyncio.to_thread(sessions.save)
+    sessions.start()
+
+
+def device_status():
+    """Whether each outlet has a live session, for the readiness endpoint."""
+    return {outlet_id: status["connected"] for outlet_id, status in registry.status().items()}
+
+
+async def fetch_outlet_state(outlet_id: str) -> Dict:
+    if deployment.is_worker:
+        # Workers have no Tapo sessions; the owner answers from its own cache.
+        return await deployment.call("outlets.read", outlet_id=outlet_id)
+    device_info = await registry.call(outlet_id, lambda device: device.get_device_info())
+    # tapo's result objects expose device_on directly; to_dict() converts the whole struct.
+    on = getattr(device_info, "device_on", None)
+    if on is None:
+        on = device_info.to_dict().get("device_on", False)
+    return {"on": on}
+
+
+@handler("outlets.read")
+async def read_outlet_state(outlet_id: str) -> Dict:
+    """Cached outlet state; concurrent readers share a single device query."""
+    return await outlet_cache.get(outlet_id, lambda: fetch_outlet_state(outlet_id))
+
+
+async def confirm_outlet_state(outlet_id: str):
+    """Re-read the plug after a command to confirm the optimistic cache entry."""
+    await asyncio.sleep(OUTLET_CONFIRM_DELAY)
+    try:
+        state = await outlet_cache.refresh(outlet_id, lambda: fetch_outlet_state(outlet_id))
+        stream_hub.publish("outlets", {outlet_id: state})
+    except Exception as e:
+        logger.warning(f"Could not confirm state of {outlet_id}: {e}")
+        outlet_cache.invalidate(outlet_id)
+
+
+def schedule_confirmation(outlet_id: str):
+    task = asyncio.create_task(confirm_outlet_state(outlet_id))
+    confirm_tasks.add(task)
+    task.add_done_callback(confirm_tasks.discard)
+
+
+async def poll_outlet_states():
+    """Single producer for the outlet stream: one plug query per interval, shared by all clients."""
+    while True:
+        if stream_hub.subscriber_count and registry.handlers:
+            outlet_ids = registry.outlet_ids()
+            results = await gather_limited(
+                (read_outlet_state(outlet_id) for outlet_id in outlet_ids), CONNECT_CONCURRENCY
+            )
+            states = {
+                outlet_id: result
+                for outlet_id, result in zip(outlet_ids, results)
+                if not isinstance(result, Exception)
+            }
+            if states:
+                stream_hub.publish("outlets", states)
+        await asyncio.sleep(OUTLET_POLL_INTERVAL)
+
+
+def start_outlet_poller():
+    global outlet_poll_task
+    if outlet_poll_task is None or outlet_poll_task.done():
+        outlet_poll_task = asyncio.create_task(poll_outlet_states())
+
+
+async def stop_outlet_poller():
+    global outlet_poll_task
+    if outlet_poll_task is None:
+        return
+    outlet_poll_task.cancel()
+    try:
+        await outlet_poll_task
+    except asyncio.CancelledError:
+        pass
+    outlet_poll_task = None
 
 
 
+@router.get("/")
+async def get_all_outlets():
+    """Get the current status of every configured outlet, queried in parallel."""
+    outlet_ids = registry.outlet_ids()
+    results = await gather_limited((read_outlet_state(outlet_id) for outlet_id in outlet_ids), CONNECT_CONCURRENCY)
+
+    outlets = {}
+    for outlet_id, result in zip(outlet_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to get status for {outlet_id}: {result}")
+            outlets[outlet_id] = {"on": None, "error": str(result) or "Failed to communicate with the plug."}
+        else:
+            outlets[outlet_id] = dict(result)
+    return outlets
+
+
+@router.get("/scenes")
+@owner_route("outlets.scenes")
+def get_scenes():
+    """List the stored scenes."""
+    return scene_store.all()
+
+
 @router.get("/{outlet_id}")
-async def get_outlet(outlet_id: str):
+async def get_outlet(outlet_id: str, request: Request):
     """Get the current status (on/off) of a specific outlet."""
-    if outlet_id not in tapo_device_objects:
-        raise HTTPException(status_code=404, detail=f"Outlet '{outlet_id}' not configured or connection failed.")
+    if outlet_id not in registry:
+        raise HTTPException(status_code=404, detail=f"Outlet '{outlet_id}' not configured.")
     
     try:
-        device_info = await tapo_device_objects[outlet_id].get_device_info()
-        is_on = device_info.to_dict().get("device_on", False)
-        return {"on": is_on}
+        state = await read_outlet_state(outlet_id)
+        stream_hub.publish("outlets", {outlet_id: state})
+        revision = outlet_cache.revision(outlet_id, state)
+        if revision is None:
+            # A read that lost a race with a command: not the cached state, no ETag.
+            return dict(state)
+        return response_cache.respond(request, f"outlet-{outlet_id}", revision, lambda: dict(state))
+    except OutletUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RemoteCallError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"Failed to get status for {outlet_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to communicate with the plug.")
 
 
+async def set_outlet_state(outlet_id: str, status_to_set: bool):
+    """Switch one outlet, keeping the cache and the stream in step."""
+    # Write-through: readers see the requested state right away, and a
+    # background read confirms it once the plug has applied the command.
+    outlet_cache.set(outlet_id, {"on": status_to_set})
+    try:
+        await registry.call(outlet_id, lambda device: device.on() if status_to_set else device.off())
+    except Exception:
+        outlet_cache.invalidate(outlet_id)
+        raise
+
+    logger.info(f"Outlet '{outlet_id}' turned {'ON' if status_to_set else 'OFF'}")
+    stream_hub.publish("outlets", {outlet_id: {"on": status_to_set}})
+    schedule_confirmation(outlet_id)
+
+
+async def run_batch(commands: Dict[str, bool]):
+    """Dispatch all commands concurrently (capped) and report each outcome with its latency."""
+
+    async def run_one(outlet_id: str, status_to_set: bool):
+        start = time.perf_counter()
+        result = {"outlet_id": outlet_id, "on": status_to_set, "ok": False}
+        if outlet_id not in registry:
+            result["error"] = f"Outlet '{outlet_id}' not configured."
+            result["latency_ms"] = 0.0
+            return result
+        try:
+            await set_outlet_state(outlet_id, status_to_set)
+            result["ok"] = True
+        except Exception as e:
+            logger.error(f"Failed to control {outlet_id}: {e}")
+            result["error"] = str(e) or "Failed to send command to the plug."
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    start = time.perf_counter()
+    results = await gather_limited(
+        (run_one(outlet_id, status) for outlet_id, status in commands.items()), BATCH_CONCURRENCY
+    )
+    succeeded = sum(1 for result in results if result["ok"])
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+@router.get("/{outlet_id}/energy")
+@owner_route("outlets.energy")
+async def get_outlet_energy(outlet_id: str, samples_since: Optional[float] = None):
+    """Power and kWh totals collected in the background; never queries the plug."""
+    if outlet_id not in registry:
+        raise HTTPException(status_code=404, detail=f"Outlet '{outlet_id}' not configured.")
+    if registry.configs[outlet_id].model not in ENERGY_MODELS:
+        raise HTTPException(status_code=400, detail=f"Outlet '{outlet_id}' does not report energy usage.")
+
+    series = await asyncio.to_thread(energy_collector.get_series, outlet_id)
+    return {"outlet_id": outlet_id, **series.summary(samples_since)}
+
+
 @router.post("/control")
+@owner_route("outlets.control")
 async def control_outlet(outlet_control: OutletControl):
     """Control an outlet (turn it on or off)."""
     outlet_id = outlet_control.outlet_id
     status_to_set = outlet_control.status
 
-    if outlet_id not in tapo_device_objects:
-        raise HTTPException(status_code=404, detail=f"Outlet '{outlet_id}' not configured or connection failed.")
+    if outlet_id not in registry:
+        raise HTTPException(status_code=404, detail=f"Outlet '{outlet_id}' not configured.")
     
     try:
-        device = tapo_device_objects[outlet_id]
-        if status_to_set:
-            await device.on()
-        else:
-            await device.off()
-        
-        logger.info(f"Outlet '{outlet_id}' turned {'ON' if status_to_set else 'OFF'}")
+        await set_outlet_state(outlet_id, status_to_set)
         
         return {
             "message": f"Outlet {outlet_id} turned {'on' if status_to_set else 'off'}",
             "data": {"on": status_to_set}
         }
+    except OutletUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to control {outlet_id}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to send command to the plug.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to send command to the plug.")
+
+
+@router.post("/batch")
+@owner_route("outlets.batch")
+async def control_outlets_batch(batch: OutletBatchControl):
+    """Switch several outlets at once. Commands run in parallel."""
+    # The last command for an outlet wins, like sending them one after another.
+    return await run_batch({command.outlet_id: command.status for command in batch.commands})
+
+
+@router.put("/scenes/{scene_name}")
+@owner_route("outlets.save_scene")
+def save_scene(scene_name: str, scene: OutletScene):
+    """Create or replace a scene."""
+    unknown = [outlet_id for outlet_id in scene.outlets if outlet_id not in registry]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown outlets: {', '.join(unknown)}")
+    scene_store.put(scene_name, scene.outlets)
+    return {"message": f"Scene '{scene_name}' saved", "data": scene.outlets}
+
+
+@router.delete("/scenes/{scene_name}")
+@owner_route("outlets.delete_scene")
+def delete_scene(scene_name: str):
+    if not scene_store.delete(scene_name):
+        raise HTTPException(status_code=404, detail=f"Scene '{scene_name}' not found")
+    return {"message": f"Scene '{scene_name}' deleted"}
+
+
+@router.post("/scenes/{scene_name}/activate")
+@owner_route("outlets.activate_scene")
+async def activate_scene(scene_name: str):
+    """Apply a scene to all of its outlets in parallel."""
+    outlets = scene_store.get(scene_name)
+    if outlets is None:
+        raise HTTPException(status_code=404, detail=f"Scene '{scene_name}' not found")
+    return {"scene": scene_name, **await run_batch(outlets)}
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Header, HTTPException
+from api.ipc import owner_route
+from api.models import EdgeBatch
+from api.rooms import IngestRejected, RoomAggregator, RoomState, NODE_ROOM
+from api.stream import stream_hub
+from typing import Optional
+import math
+import logging
+import os
+import secrets
+import socket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/rooms", tags=["rooms"])
+
+# Shared secret edge agents must send; ingest is open when unset.
+EDGE_TOKEN = os.getenv("EDGE_TOKEN")
+NODE_ID = os.getenv("EDGE_NODE_ID", socket.gethostname())
+
+aggregator = RoomAggregator()
+
+
+def publish_room(room: str, state: RoomState):
+    stream_hub.publish("rooms", {room: {**state.readings, "timestamp": state.timestamp}})
+
+
+aggregator.listeners.append(publish_room)
+
+
+async def record_local(snapshot):
+    """Sampler listener: this node's own sensors are one more room."""
+    aggregator.record(NODE_ROOM, NODE_ID, snapshot.timestamp, snapshot.readings)
+
+
+@router.get("/")
+@owner_route("rooms.list")
+def get_rooms():
+    """Latest readings of every room, from this node and all edge agents."""
+    return aggregator.status()
+
+
+@router.get("/{room}")
+@owner_route("rooms.get")
+def get_room(room: str, recent: int = 0):
+    """One room's latest readings, optionally with its most recent rows."""
+    if room not in aggregator.rooms:
+        raise HTTPException(status_code=404, detail=f"Room '{room}' not found")
+    state = aggregator.rooms[room]
+    result = state.status(aggregator.stale_after)
+    if recent > 0:
+        result["recent"] = list(state.recent)[-recent:]
+    return result
+
+
+@router.post("/ingest")
+@owner_route("rooms.ingest")
+async def ingest_batch(batch: EdgeBatch, x_edge_token: Optional[str] = Header(None)):
+    """Accept a batch of readings pushed by an edge agent."""
+    if EDGE_TOKEN and not secrets.compare_digest(x_edge_token or "", EDGE_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid edge token")
+    try:
+        return aggregator.ingest(batch.node, batch.room, batch.boot, batch.first_sequence, batch.fields, batch.rows)
+    except IngestRejected as e:
+        # Retry-After takes whole seconds; round up so agents never come back early.
+        headers = {"Retry-After": str(max(math.ceil(e.retry_after), 1))} if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
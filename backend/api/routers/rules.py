@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException
+from api.ipc import owner_route
+from api.routers import outlets
+from api.rules import RulesEngine, load_rules
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/rules", tags=["rules"])
+
+engine = RulesEngine(outlets.set_outlet_state, load_rules())
+
+
+@router.get("/")
+@owner_route("rules.list")
+def get_rules():
+    """Automation rules with their state and evaluation latency."""
+    return engine.status()
+
+
+@router.get("/{rule_name}")
+@owner_route("rules.get")
+def get_rule(rule_name: str):
+    if rule_name not in engine.rules:
+        raise HTTPException(status_code=404, detail=f"Rule '{rule_name}' not found")
+    return engine.rules[rule_name].status()
@@ -1,17 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from api.conditional import BOOT_ID, response_cache
+from api import encoding
+from api.ipc import RemoteCallError, deployment, handler, owner_route
+from api.hardware import hardware, HARDWARE_BACKEND
+from api import bme280
+from api.history import HistoryStore, METRICS, RESOLUTIONS, DEFAULT_MAX_POINTS
+from api.sample_log import HistoryFlusher, SampleRing, SAMPLE_RING_PATH
+from api.motion import MotionDetector
+from api.sampler import SensorSampler
+from api.startup import import_optional
+from api.supervisor import CircuitBreaker
+from api import sensor_profiles
+from api import simulation
+from api.stream import stream_hub
+from typing import Optional
+import asyncio
 import logging
+import os
 import random 
+import time
 
 # --- Sensor Libraries ---
-try:
-    import lgpio
-    import board
-    import busio
-    from adafruit_bme280 import basic as adafruit_bme280
-    import adafruit_bh1750
-    IS_HARDWARE_AVAILABLE = True
-except ImportError:
-    IS_HARDWARE_AVAILABLE = False
+# Imported by import_sensor_drivers() on the I2C bus thread during startup,
+# not when this module is imported: `board` alone probes the whole platform.
+lgpio = board = busio = adafruit_bme280 = adafruit_bh1750 = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,25 +37,160 @@ bme280_sensor = None
 bh1750_sensor = None
 gpio_handle = None
 PIR_PIN = 4
+motion_detector = MotionDetector()
+# Where readings come from: "real", "simulated", or "mock" until a backend opens.
+sensor_backend = "mock"
 
-def initialize_sensors():
-    global bme280_sensor, bh1750_sensor, gpio_handle
+# Bus names for the hardware layer; each bus gets its own I/O thread.
+I2C_BUS = "i2c-1"
+GPIO_CHIP = "gpiochip0"
+SENSOR_INIT_TIMEOUT = 10.0
 
-    if not IS_HARDWARE_AVAILABLE:
-        logger.warning("Hardware libraries not found. Running in mock data mode.")
+bme280_profile = sensor_profiles.select(sensor_profiles.BME280_PROFILES, sensor_profiles.BME280_PROFILE, "BME280")
+bh1750_profile = sensor_profiles.select(sensor_profiles.BH1750_PROFILES, sensor_profiles.BH1750_PROFILE, "BH1750")
+read_schedule = sensor_profiles.ReadSchedule({**bme280_profile.intervals(), **bh1750_profile.intervals()})
+# Last value of every reading, served until its group is due again; None until first read.
+last_readings = dict.fromkeys(("temperature", "humidity", "pressure", "light"))
+
+
+def import_sensor_drivers() -> bool:
+    """Blocking import of the sensor libraries; False when any of them is missing."""
+    global lgpio, board, busio, adafruit_bme280, adafruit_bh1750
+    lgpio = import_optional("lgpio")
+    board = import_optional("board")
+    busio = import_optional("busio")
+    # The advanced driver exposes mode, standby, oversampling and IIR settings.
+    adafruit_bme280 = import_optional("adafruit_bme280.advanced")
+    adafruit_bh1750 = import_optional("adafruit_bh1750")
+    return all(module is not None for module in (lgpio, board, busio, adafruit_bme280, adafruit_bh1750))
+
+
+i2c_bus = None
+# One breaker per device: a sensor that keeps failing is skipped by the
+# sampler (its readings go to None) until the supervisor has reopened it.
+breakers = {name: CircuitBreaker(f"sensor {name}") for name in ("bme280", "bh1750", "pir")}
+CLIMATE_KEYS = ("temperature", "humidity", "pressure")
+
+
+def get_i2c_bus():
+    global i2c_bus
+    if i2c_bus is None:
+        i2c_bus = busio.I2C(board.SCL, board.SDA)
+    return i2c_bus
+
+
+def open_bme280():
+    """Blocking driver setup, run on the I2C bus thread; also reopens a device that stopped answering."""
+    global bme280_sensor
+    sensor = adafruit_bme280.Adafruit_BME280_I2C(get_i2c_bus(), address=0x77)
+    bme280_profile.apply(sensor)
+    bme280_sensor = sensor
+
+
+def open_bh1750():
+    global bh1750_sensor
+    sensor = adafruit_bh1750.BH1750(get_i2c_bus(), address=0x23)
+    bh1750_profile.apply(sensor)
+    bh1750_sensor = sensor
+
+
+def open_gpio(loop):
+    """Blocking GPIO setup, run on the GPIO chip thread."""
+    global gpio_handle
+    handle = lgpio.gpiochip_open(0)
+    try:
+        motion_detector.start(lgpio, handle, PIR_PIN, loop)
+    except Exception:
+        lgpio.gpiochip_close(handle)
+        raise
+    gpio_handle = handle
+
+
+def open_simulated_sensors(loop):
+    """Simulated BME280, BH1750 and PIR behind the same driver interfaces."""
+    global bme280_sensor, bh1750_sensor, gpio_handle, sensor_backend
+    bme280_sensor = simulation.SimulatedBME280()
+    bh1750_sensor = simulation.SimulatedBH1750()
+    bme280_profile.apply(bme280_sensor)
+    bh1750_profile.apply(bh1750_sensor)
+    gpio = simulation.SimulatedGPIO()
+    gpio_handle = gpio.gpiochip_open(0)
+    motion_detector.start(gpio, gpio_handle, PIR_PIN, loop)
+    sensor_backend = "simulated"
+
+
+async def open_device(name: str):
+    """Open one real sensor through the hardware layer."""
+    global sensor_backend
+    if name == "pir":
+        await hardware.run(GPIO_CHIP, "init", open_gpio, asyncio.get_running_loop(), timeout=SENSOR_INIT_TIMEOUT)
+    else:
+        await hardware.run(I2C_BUS, "init", open_bme280 if name == "bme280" else open_bh1750,
+                           timeout=SENSOR_INIT_TIMEOUT)
+    sensor_backend = "real"
+
+
+async def probe_device(name: str):
+    """Supervisor probe: reopen a failed sensor and check that it reads."""
+    if name == "pir":
+        if gpio_handle is None:
+            await open_device("pir")
+        return
+    if HARDWARE_BACKEND != "simulated":
+        await open_device(name)
+    await hardware.run(I2C_BUS, name, read_bme280 if name == "bme280" else read_bh1750)
+    # Read the recovered device on the next tick.
+    read_schedule.last_read.pop("climate" if name == "bme280" else "light", None)
+
+
+async def initialize_sensors():
+    if HARDWARE_BACKEND == "simulated":
+        open_simulated_sensors(asyncio.get_running_loop())
+        logger.info("Using simulated sensors (HARDWARE_BACKEND=simulated).")
         return
 
     try:
-        i2c = busio.I2C(board.SCL, board.SDA)
-        bme280 = adafruit_bme280.Adafruit_BME280_I2C(i2c, address=0x77)
-        bh1750_sensor = adafruit_bh1750.BH1750(i2c, address=0x23)
-        gpio_handle = lgpio.gpiochip_open(0)
-        lgpio.gpio_claim_input(gpio_handle, PIR_PIN)
-        logger.info("✅ All sensors initialized successfully.")
+        drivers_available = await hardware.run(I2C_BUS, "import", import_sensor_drivers, timeout=SENSOR_INIT_TIMEOUT)
     except Exception as e:
-        logger.error(f"WARNING: Could not initialize hardware sensors: {e}. Running in mock data mode.")
-        bme280_sensor, bh1750_sensor, gpio_handle = None, None, None
+        logger.error(f"Importing the sensor libraries failed: {e}")
+        drivers_available = False
+    if not drivers_available:
+        if HARDWARE_BACKEND == "real":
+            logger.error("HARDWARE_BACKEND=real but the hardware libraries are not installed. Serving mock data.")
+        else:
+            logger.warning("Hardware libraries not found. Running in mock data mode.")
+        return
+
+    # Each device on its own: one missing sensor does not take the others down.
+    failed = []
+    for name in breakers:
+        try:
+            await open_device(name)
+        except Exception as e:
+            logger.error(f"WARNING: Could not initialize {name}: {e}. The supervisor will retry it.")
+            breakers[name].trip(e)
+            failed.append(name)
+    if not failed:
+        logger.info(f"✅ All sensors initialized successfully "
+                    f"(BME280 '{bme280_profile.name}', BH1750 '{bh1750_profile.name}').")
+    elif len(failed) == len(breakers):
+        logger.error("No sensor could be opened. Serving mock data until one comes back.")
+
 
+def supervise_sensors(supervisor):
+    """Let `supervisor` reopen every sensor whose breaker opens."""
+    for name, breaker in breakers.items():
+        supervisor.watch(f"sensor:{name}", breaker, lambda name=name: probe_device(name))
+
+
+def device_status():
+    """Which sensor devices initialization opened, for the readiness endpoint."""
+    return {
+        "backend": sensor_backend,
+        "bme280": bme280_sensor is not None,
+        "bh1750": bh1750_sensor is not None,
+        "pir": gpio_handle is not None,
+    }
 
 
 def get_mock_sensor_data():
@@ -53,46 +200,243 @@ def get_mock_sensor_data():
         "humidity": round(random.uniform(40.0, 60.0), 2),
         "pressure": round(random.uniform(1010.0, 1015.0), 2),
         "light": round(random.uniform(100.0, 800.0), 2),
-        "motion_detected": random.choice([True, False])
+        "motion_detected": random.choice([True, False]),
+        "source": "mock"
     }
 
-@router.get("/all")
-async def get_all_sensors():
-    if not all([bme280_sensor, bh1750_sensor, gpio_handle]):
-        return get_mock_sensor_data()
+def read_bme280():
+    return bme280.burst_read(bme280_sensor)
+
+
+def read_bh1750():
+    return bh1750_sensor.lux
 
+
+# Reads served from mock data because no sensor could be opened.
+mock_fallbacks = {"unavailable": 0}
+
+
+def device_up(name: str, device) -> bool:
+    return device is not None and breakers[name].state == "closed"
+
+
+async def read_device(name: str, fn):
+    """One breaker-guarded read on the I2C bus; None while the device is down or when the read failed."""
+    breaker = breakers[name]
+    if not breaker.allow():
+        return None
     try:
-        return {
-            "temperature": round(bme280_sensor.temperature, 2),
-            "humidity": round(bme280_sensor.humidity, 2),
-            "pressure": round(bme280_sensor.pressure, 2),
-            "light": round(bh1750_sensor.lux, 2),
-            "motion_detected": bool(lgpio.gpio_read(gpio_handle, PIR_PIN))
-        }
+        value = await hardware.run(I2C_BUS, name, fn)
     except Exception as e:
-        logger.error(f"Error reading real sensors: {e}. Falling back to mock data.")
+        logger.warning(f"Reading {name} failed: {e}")
+        breaker.record_failure(e)
+        return None
+    breaker.record_success()
+    return value
+
+
+async def read_sensors():
+    """Read the sensors that are due through the hardware layer, never on the event loop."""
+    # lgpio handles start at 0, so test for None rather than truthiness.
+    if all(device is None for device in (bme280_sensor, bh1750_sensor, gpio_handle)):
+        mock_fallbacks["unavailable"] += 1
         return get_mock_sensor_data()
 
+    # Only the readings whose profile interval has elapsed touch the bus;
+    # motion comes from the PIR interrupt, never from polling. A failed
+    # group stays due and is retried on the next tick.
+    now = time.monotonic()
+    if bme280_sensor is not None and read_schedule.due("climate", now):
+        # One burst read returns all three from the same conversion, so
+        # pressure follows the climate cadence.
+        climate = await read_device("bme280", read_bme280)
+        if climate is not None:
+            last_readings.update(
+                temperature=round(climate.temperature, 2),
+                humidity=round(climate.humidity, 2),
+                pressure=round(climate.pressure, 2),
+            )
+            read_schedule.mark("climate", now)
+    if bh1750_sensor is not None and read_schedule.due("light", now):
+        lux = await read_device("bh1750", read_bh1750)
+        if lux is not None:
+            last_readings["light"] = round(lux, 2)
+            read_schedule.mark("light", now)
+
+    # A device that is down reports None, never its last (stale) value.
+    readings = dict(last_readings)
+    if not device_up("bme280", bme280_sensor):
+        readings.update(dict.fromkeys(CLIMATE_KEYS))
+    if not device_up("bh1750", bh1750_sensor):
+        readings["light"] = None
+    return {
+        **readings,
+        "motion_detected": motion_detector.motion_active if gpio_handle is not None else None,
+        "source": sensor_backend
+    }
+
+
+sampler = SensorSampler(read_sensors, interval=sensor_profiles.tick_interval(bme280_profile, bh1750_profile))
+history = HistoryStore()
+# Simulated samples stay out of the production ring, like the other simulated files.
+sample_log = SampleRing(
+    os.path.join(simulation.SIMULATION_DATA_DIR, "sample_ring.bin") if HARDWARE_BACKEND == "simulated"
+    else SAMPLE_RING_PATH
+)
+history_flusher = HistoryFlusher(sample_log, history)
+
+
+async def record_sample(snapshot):
+    """Log every sample, flagged real/mock/simulated; the flusher moves them into history in batches."""
+    sample_log.append(snapshot.timestamp, snapshot.readings)
+
+
+async def publish_stream(snapshot):
+    stream_hub.publish("sensors", snapshot.readings)
+
+
+def publish_motion(event):
+    # PIR edges are already debounced by the GPIO chip; push each one as it happens.
+    stream_hub.publish("sensors", {"motion_detected": event["type"] == "motion_start"}, debounce=0)
+
+
+def export_snapshot(snapshot=None):
+    snapshot = snapshot or sampler.latest
+    if snapshot is None:
+        return None
+    return {"readings": dict(snapshot.readings), "sequence": snapshot.sequence, "timestamp": snapshot.timestamp,
+            "monotonic": snapshot.monotonic, "origin": snapshot.origin or BOOT_ID}
+
+
+async def share_snapshot(snapshot):
+    """Hardware owner: hand every snapshot to the worker processes."""
+    deployment.publish("snapshot", export_snapshot(snapshot))
+
+
+def apply_owner_snapshot(data):
+    sampler.ingest(data["readings"], data["sequence"], data["timestamp"], data["monotonic"], data["origin"])
+
+
+deployment.share("snapshot", export_snapshot, apply_owner_snapshot)
+
+
+@handler("sensors.flush_history")
+async def flush_history():
+    await history_flusher.flush_once()
+
+
+@handler("sensors.motion_status")
+async def motion_status():
+    """The PIR detector's live state, or None while it is not armed."""
+    return motion_detector.status() if motion_detector.running else None
+
+
+SENSOR_KEYS = {
+    "temperature": "temperature",
+    "humidity": "humidity",
+    "pressure": "pressure",
+    "light": "light",
+    "motion": "motion_detected"
+}
+
+
+def snapshot_metadata(snapshot):
+    return {"sequence": snapshot.sequence, "age": round(snapshot.age, 3)}
+
+
+@router.get("/all")
+async def get_all_sensors(request: Request):
+    """Latest snapshot; its sequence number is the ETag version."""
+    snapshot = await sampler.get_snapshot()
+    # Snapshots from the hardware owner carry its boot id, so every worker
+    # hands out the same ETag for them.
+    return response_cache.respond(
+        request, "sensors", f"{snapshot.origin}-{snapshot.sequence}" if snapshot.origin else snapshot.sequence,
+        lambda: {**snapshot.readings, "sequence": snapshot.sequence},
+        volatile={"age": round(snapshot.age, 3)},
+        persistent=snapshot.origin is not None,
+    )
+
+@router.get("/history")
+async def get_sensor_history(
+    request: Request,
+    sensor: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Optional[str] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+):
+    """Sensor history for a time range (epoch seconds), served at the finest resolution that fits max_points.
+
+    JSON by default; MessagePack or CBOR with `Accept: application/msgpack` or `application/cbor`.
+    """
+    end = time.time() if end is None else end
+    start = end - 3600 if start is None else start
+    if start > end:
+        raise HTTPException(status_code=400, detail="'start' must be before 'end'")
+
+    if sensor is None:
+        metrics = METRICS
+    elif sensor in SENSOR_KEYS:
+        metrics = (SENSOR_KEYS[sensor],)
+    else:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+
+    if resolution is None:
+        resolution = history.pick_resolution(start, end, max(max_points, 1), sampler.interval)
+    elif resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution '{resolution}'")
+
+    # Include samples still waiting in the log, which only the hardware owner writes.
+    if deployment.is_worker:
+        try:
+            await deployment.call("sensors.flush_history")
+        except RemoteCallError as e:
+            logger.warning(f"Serving history without the latest samples: {e.detail}")
+    else:
+        await history_flusher.flush_once()
+    points = await asyncio.to_thread(history.query, start, end, resolution, metrics)
+    return encoding.respond(request, {"start": start, "end": end, "resolution": resolution, "points": points})
+
+@router.get("/hardware")
+@owner_route("sensors.hardware")
+async def get_hardware_stats():
+    """Per-bus, per-device latency histograms, error and timeout counts."""
+    return hardware.stats()
+
+@router.get("/profiles")
+@owner_route("sensors.profiles")
+async def get_sensor_profiles():
+    """Active acquisition profile per sensor, and when each reading was last taken."""
+    return {
+        "bme280": sensor_profiles.describe(bme280_profile),
+        "bh1750": sensor_profiles.describe(bh1750_profile),
+        "sample_interval": sampler.interval,
+        "readings": read_schedule.status(time.monotonic()),
+    }
+
+@router.get("/motion/events")
+@owner_route("sensors.motion_events")
+async def get_motion_events(limit: int = 50):
+    """Most recent motion events recorded by the edge-triggered detector."""
+    return {**motion_detector.status(), "events": motion_detector.recent_events(max(limit, 0))}
+
 @router.get("/{sensor_name}")
 async def get_single_sensor(sensor_name: str):
-    all_data = await get_all_sensors()
-    
-    key_map = {
-        "temperature": "temperature",
-        "humidity": "humidity",
-        "pressure": "pressure",
-        "light": "light",
-        "motion": "motion_detected"
-    }
-    
-    if sensor_name not in key_map:
+    if sensor_name not in SENSOR_KEYS:
         raise HTTPException(status_code=404, detail="Sensor not found")
-        
-    data_key = key_map[sensor_name]
+
+    snapshot = await sampler.get_snapshot()
+    all_data = snapshot.readings
+    data_key = SENSOR_KEYS[sensor_name]
     
     if sensor_name == "light":
-        return {"light_level": all_data[data_key]}
+        result = {"light_level": all_data.get(data_key)}
     elif sensor_name == "motion":
-        return {"motion_detected": all_data[data_key]}
+        # Only the hardware owner's detector is armed; workers ask it.
+        result = await deployment.call("sensors.motion_status") if deployment.is_worker else await motion_status()
+        if result is None:
+            result = {**motion_detector.status(), "motion_detected": all_data.get(data_key)}
     else:
-        return {sensor_name: all_data[data_key]}
\ No newline at end of file
+        result = {sensor_name: all_data.get(data_key)}
+    return {**result, **snapshot_metadata(snapshot)}
\ No newline at end of file
@@ -0,0 +1,127 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from api import encoding
+from api.ipc import deployment
+from api.stream import stream_hub
+from typing import Optional
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["stream"])
+
+HEARTBEAT_SECONDS = 15
+HEARTBEAT = object()
+forward_task: Optional[asyncio.Task] = None
+
+
+async def forward_to_workers():
+    """Hardware owner: pass the hub's debounced changes on to the worker processes.
+
+    The forwarder is one more subscriber, so producers such as the outlet
+    poller run while clients are connected to any worker.
+    """
+    while True:
+        subscriber = stream_hub.subscribe()
+        try:
+            while True:
+                event = await subscriber.queue.get()
+                if event is None:
+                    # Dropped for falling behind: resubscribe from the full state.
+                    break
+                deployment.publish("stream", {event["topic"]: event["data"]})
+        finally:
+            stream_hub.unsubscribe(subscriber)
+
+
+def start_forwarding():
+    global forward_task
+    if forward_task is None or forward_task.done():
+        forward_task = asyncio.create_task(forward_to_workers())
+
+
+async def stop_forwarding():
+    global forward_task
+    if forward_task is None:
+        return
+    forward_task.cancel()
+    try:
+        await forward_task
+    except asyncio.CancelledError:
+        pass
+    forward_task = None
+
+
+def apply_owner_stream(changes):
+    # Already debounced by the owner's hub.
+    for topic, fields in changes.items():
+        stream_hub.publish(topic, fields, debounce=0)
+
+
+deployment.share("stream", lambda: stream_hub.current, apply_owner_stream)
+
+
+async def next_event(request: Request, subscriber):
+    """The next event for `subscriber`, HEARTBEAT after a quiet period, or None once it is gone."""
+    try:
+        # None from the queue: dropped by the hub for falling behind.
+        return await asyncio.wait_for(subscriber.queue.get(), timeout=HEARTBEAT_SECONDS)
+    except asyncio.TimeoutError:
+        return None if await request.is_disconnected() else HEARTBEAT
+
+
+async def event_stream(request: Request, subscriber):
+    try:
+        while True:
+            event = await next_event(request, subscriber)
+            if event is HEARTBEAT:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                # EventSource reconnects and receives a fresh full-state event.
+                break
+            yield f"event: {event['topic']}\ndata: {encoding.dumps(event['data']).decode()}\n\n"
+    finally:
+        stream_hub.unsubscribe(subscriber)
+
+
+async def binary_stream(request: Request, subscriber, media_type: str):
+    """MessagePack or CBOR items back to back, one {"topic", "data"} map per event.
+
+    Both formats are self-delimiting, so no framing is needed; a nil item
+    is the keep-alive.
+    """
+    try:
+        while True:
+            event = await next_event(request, subscriber)
+            if event is None:
+                break
+            yield encoding.encode(None if event is HEARTBEAT else event, media_type)
+    finally:
+        stream_hub.unsubscribe(subscriber)
+
+
+@router.get("/stream")
+async def stream_state(request: Request, topics: Optional[str] = None):
+    """Server-Sent Events stream of sensor and outlet changes.
+
+    `topics` is an optional comma-separated filter, e.g. `?topics=outlets`.
+    With `Accept: application/msgpack` or `application/cbor` the events come
+    as a binary stream instead of SSE.
+    """
+    topic_filter = [topic.strip() for topic in topics.split(",") if topic.strip()] if topics else None
+    subscriber = stream_hub.subscribe(topic_filter)
+    media_type = encoding.negotiate(request)
+    if media_type != encoding.JSON_MEDIA_TYPE:
+        return StreamingResponse(
+            binary_stream(request, subscriber, media_type),
+            media_type=encoding.STREAM_MEDIA_TYPES[media_type],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept"},
+        )
+    return StreamingResponse(
+        event_stream(request, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
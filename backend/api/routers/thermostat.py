@@ -1,7 +1,9 @@
-# THESE Light endpoint COULD BE USED IN FUTURE FOR IMPLEMENTATION CHANGE. Now using api/sensors/lights,motion etc.
-# Backend still shows the endpoint be aware.When we comment out this file backend can give errors.
 from fastapi import APIRouter, HTTPException
+from api.ipc import owner_route
 from api.models import ThermostatStatus, ThermostatControl
+from api.routers import outlets, sensors
+from api.stream import stream_hub
+from api.thermostat import Thermostat, load_thermostat_config
 import logging
 
 # Configure logging
@@ -10,38 +12,57 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/thermostat", tags=["thermostat"])
 
-# Global variables for thermostat hardware
-thermostat_hardware_initialized = False
+# None when there is no thermostat.json.
+config = load_thermostat_config()
+thermostat = Thermostat(config, lambda: sensors.sampler.latest, outlets.set_outlet_state) if config else None
 
-def initialize_thermostat():
-    """Initialize thermostat hardware"""
-    global thermostat_hardware_initialized
 
-    try:
-        # TODO: Initialize actual thermostat hardware (temperature sensors, relays, etc.)
-        # For now, this will always fail since no hardware is connected
-        logger.warning("Thermostat hardware not available")
-        return False
-    except Exception as e:
-        logger.warning(f"Failed to initialize thermostat: {e}")
+def publish_thermostat(summary):
+    stream_hub.publish("thermostat", summary)
+
+
+def initialize_thermostat():
+    """Start the control loop, in the process that owns the hardware."""
+    if thermostat is None:
+        logger.warning("No thermostat configured.")
         return False
+    if thermostat.config.outlet not in outlets.registry:
+        logger.error(f"Thermostat outlet '{thermostat.config.outlet}' is not in the outlet registry.")
+    thermostat.add_listener(publish_thermostat)
+    thermostat.start()
+    return True
+
+
+async def stop_thermostat():
+    if thermostat is not None:
+        await thermostat.stop()
+
+
+def require_thermostat() -> Thermostat:
+    if thermostat is None:
+        raise HTTPException(status_code=503, detail="Thermostat not configured")
+    return thermostat
+
 
 @router.get("/", response_model=ThermostatStatus)
+@owner_route("thermostat.get")
 def get_thermostat():
     """Get thermostat status"""
-    if not thermostat_hardware_initialized:
-        if not initialize_thermostat():
-            raise HTTPException(status_code=503, detail="Thermostat hardware not available")
+    return require_thermostat().summary()
 
-    # TODO: Read actual thermostat state from hardware
-    raise HTTPException(status_code=501, detail="Thermostat reading not implemented")
+@router.get("/status")
+@owner_route("thermostat.status")
+def get_thermostat_status():
+    """Controller state, schedule, relay and control-loop timing."""
+    return require_thermostat().status()
 
-@router.post("/")
-def control_thermostat(thermostat_control: ThermostatControl):
+@router.post("/", response_model=ThermostatStatus)
+@owner_route("thermostat.control")
+async def control_thermostat(thermostat_control: ThermostatControl):
     """Control thermostat"""
-    if not thermostat_hardware_initialized:
-        if not initialize_thermostat():
-            raise HTTPException(status_code=503, detail="Thermostat hardware not available")
-
-    # TODO: Control actual thermostat via hardware
-    raise HTTPException(status_code=501, detail="Thermostat control not implemented")
\ No newline at end of file
+    device = require_thermostat()
+    try:
+        await device.set_mode(thermostat_control.mode, thermostat_control.temperature)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return device.summary()
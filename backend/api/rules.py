@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import operator
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Set
+
+from api.metrics import LatencyHistogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RULES_FILE = os.getenv(
+    "AUTOMATION_RULES_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules.json"),
+)
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+class Condition:
+    """`sensor op value`, with optional hysteresis for numeric thresholds.
+
+    Once a `<` condition is true it stays true until the value rises to
+    `value + hysteresis`; a `>` condition likewise until it falls to
+    `value - hysteresis`. This keeps a reading hovering around the
+    threshold from toggling the outlet.
+    """
+
+    def __init__(self, sensor: str, op: str, value: Any, hysteresis: float = 0.0):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}'")
+        self.sensor = sensor
+        self.op = op
+        self.value = value
+        self.hysteresis = hysteresis
+        self.active = False
+
+    def evaluate(self, reading: Any) -> bool:
+        if reading is None:
+            self.active = False
+            return False
+        threshold = self.value
+        if self.active and self.hysteresis:
+            if self.op in ("<", "<="):
+                threshold = self.value + self.hysteresis
+            elif self.op in (">", ">="):
+                threshold = self.value - self.hysteresis
+        self.active = bool(OPERATORS[self.op](reading, threshold))
+        return self.active
+
+
+class Rule:
+    """All conditions true -> switch an outlet; revert `for_seconds` after they stop being true."""
+
+    def __init__(self, name: str, conditions: List[Condition], outlet: str, on: bool = True,
+                 for_seconds: float = 0.0):
+        self.name = name
+        self.conditions = conditions
+        self.outlet = outlet
+        self.on = on
+        self.for_seconds = for_seconds
+        self.active = False
+        self.fired = 0
+        self.last_fired_at: Optional[float] = None
+        self.latency = LatencyHistogram()
+        self.revert_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def sensors(self) -> Set[str]:
+        return {condition.sensor for condition in self.conditions}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Rule":
+        conditions = [
+            Condition(c["sensor"], c.get("op", "=="), c["value"], float(c.get("hysteresis", 0)))
+            for c in data["when"]
+        ]
+        action = data["then"]
+        return cls(data["name"], conditions, action["outlet"], bool(action.get("on", True)),
+                   float(action.get("for_seconds", 0)))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "outlet": self.outlet,
+            "on": self.on,
+            "for_seconds": self.for_seconds,
+            "sensors": sorted(self.sensors),
+            "fired": self.fired,
+            "last_fired_at": self.last_fired_at,
+            "revert_pending": self.revert_handle is not None,
+            "evaluation_latency": self.latency.to_dict(),
+        }
+
+
+def load_rules(path: str = RULES_FILE) -> List[Rule]:
+    """Read rules from JSON, e.g.
+
+        {"rules": [{
+            "name": "hallway_night_light",
+            "when": [{"sensor": "light", "op": "<", "value": 50, "hysteresis": 10},
+                     {"sensor": "motion_detected", "op": "==", "value": true}],
+            "then": {"outlet": "main_outlet", "on": true, "for_seconds": 300}
+        }]}
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        entries = json.load(f).get("rules", [])
+    rules = []
+    for entry in entries:
+        try:
+            rules.append(Rule.from_dict(entry))
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f"Skipping invalid rule {entry.get('name', entry)}: {e}")
+    return rules
+
+
+class RulesEngine:
+    """Evaluates automation rules as sensor and motion events arrive.
+
+    Rules are indexed by the sensor keys they read, so an event only
+    re-evaluates the rules that depend on a value that actually changed.
+    """
+
+    def __init__(self, actuator: Callable[[str, bool], Awaitable[None]], rules: Optional[List[Rule]] = None):
+        self.actuator = actuator
+        self.rules: Dict[str, Rule] = {}
+        self.index: Dict[str, List[Rule]] = {}
+        self.values: Dict[str, Any] = {}
+        self.evaluations = 0
+        self._actions: Set[asyncio.Task] = set()
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    def add_rule(self, rule: Rule):
+        self.rules[rule.name] = rule
+        for sensor in rule.sensors:
+            self.index.setdefault(sensor, []).append(rule)
+
+    def on_readings(self, readings: Mapping[str, Any]):
+        changed = [key for key, value in readings.items() if self.values.get(key) != value or key not in self.values]
+        self.values.update(readings)
+
+        affected: Dict[str, Rule] = {}
+        for key in changed:
+            for rule in self.index.get(key, ()):
+                affected[rule.name] = rule
+        for rule in affected.values():
+            self._evaluate(rule)
+
+    async def on_snapshot(self, snapshot):
+        # Never drive real outlets from fabricated readings.
+        if snapshot.readings.get("source") == "mock":
+            return
+        self.on_readings(snapshot.readings)
+
+    def on_motion(self, event: Mapping[str, Any]):
+        self.on_readings({"motion_detected": event["type"] == "motion_start"})
+
+    def _evaluate(self, rule: Rule):
+        start = time.perf_counter()
+        # Evaluate every condition so each one keeps its hysteresis state.
+        results = [condition.evaluate(self.values.get(condition.sensor)) for condition in rule.conditions]
+        matched = all(results)
+        self.evaluations += 1
+
+        if matched:
+            if rule.revert_handle is not None:
+                rule.revert_handle.cancel()
+                rule.revert_handle = None
+            if not rule.active:
+                rule.active = True
+                rule.fired += 1
+                rule.last_fired_at = time.time()
+                logger.info(f"Rule '{rule.name}' fired -> {rule.outlet} {'ON' if rule.on else 'OFF'}")
+                self._act(rule.outlet, rule.on)
+        elif rule.active and rule.revert_handle is None:
+            loop = asyncio.get_running_loop()
+            rule.revert_handle = loop.call_later(rule.for_seconds, self._revert, rule)
+        rule.latency.observe(time.perf_counter() - start)
+
+    def _revert(self, rule: Rule):
+        rule.revert_handle = None
+        rule.active = False
+        logger.info(f"Rule '{rule.name}' expired -> {rule.outlet} {'OFF' if rule.on else 'ON'}")
+        self._act(rule.outlet, not rule.on)
+
+    def _act(self, outlet_id: str, on: bool):
+        task = asyncio.get_running_loop().create_task(self._run_action(outlet_id, on))
+        self._actions.add(task)
+        task.add_done_callback(self._actions.discard)
+
+    async def _run_action(self, outlet_id: str, on: bool):
+        try:
+            await self.actuator(outlet_id, on)
+        except Exception as e:
+            logger.error(f"Rule action on {outlet_id} failed: {e}")
+
+    async def stop(self):
+        """Cancel pending reverts and in-flight actions, before the outlets' sessions close."""
+        for rule in self.rules.values():
+            if rule.revert_handle is not None:
+                rule.revert_handle.cancel()
+                rule.revert_handle = None
+        for task in list(self._actions):
+            task.cancel()
+        if self._actions:
+            await asyncio.gather(*self._actions, return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "evaluations": self.evaluations,
+            "index": {sensor: [rule.name for rule in rules] for sensor, rules in self.index.items()},
+            "rules": {name: rule.status() for name, rule in self.rules.items()},
+        }
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_RING_PATH = os.getenv(
+    "SAMPLE_RING_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sample_ring.bin"),
+)
+# One day of samples at the default 2 s interval.
+SAMPLE_RING_CAPACITY = int(os.getenv("SAMPLE_RING_CAPACITY", "43200"))
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("HISTORY_FLUSH_INTERVAL", "30"))
+HISTORY_FLUSH_BATCH = 1000
+
+MAGIC = b"SHRING01"
+# magic, capacity, record size, next sequence
+HEADER = struct.Struct("<8sIIQ")
+CURSOR = struct.Struct("<16sq")
+MAX_CURSORS = 8
+HEADER_SIZE = mmap.PAGESIZE
+# sequence, timestamp, source, motion, temperature, humidity, pressure, light, crc32
+RECORD = struct.Struct("<QdBB2xffffI")
+RECORD_BODY = struct.Struct("<QdBB2xffff")
+
+SOURCES = ("real", "mock", "simulated")
+SOURCE_CODES = {source: code for code, source in enumerate(SOURCES)}
+MOTION_UNKNOWN = 255
+VALUE_FIELDS = ("temperature", "humidity", "pressure", "light")
+
+
+def encode(sequence: int, timestamp: float, readings: Mapping[str, Any]) -> bytes:
+    motion = readings.get("motion_detected")
+    values = []
+    for field in VALUE_FIELDS:
+        value = readings.get(field)
+        values.append(float(value) if isinstance(value, (int, float)) else math.nan)
+    body = RECORD_BODY.pack(
+        sequence, timestamp, SOURCE_CODES.get(readings.get("source"), SOURCE_CODES["mock"]),
+        MOTION_UNKNOWN if motion is None else int(bool(motion)), *values,
+    )
+    return body + struct.pack("<I", zlib.crc32(body))
+
+
+def decode(data: bytes) -> Optional[Tuple[int, float, Dict[str, Any]]]:
+    """(sequence, timestamp, readings), or None for an empty or torn slot."""
+    *fields, crc = RECORD.unpack(data)
+    if crc != zlib.crc32(data[:RECORD_BODY.size]):
+        return None
+    sequence, timestamp, source, motion, *values = fields
+    readings: Dict[str, Any] = {
+        field: round(value, 2) for field, value in zip(VALUE_FIELDS, values) if not math.isnan(value)
+    }
+    if motion != MOTION_UNKNOWN:
+        readings["motion_detected"] = bool(motion)
+    readings["source"] = SOURCES[source] if source < len(SOURCES) else "mock"
+    return sequence, timestamp, readings
+
+
+class SampleRing:
+    """Fixed-size, memory-mapped ring of sensor samples on local disk.
+
+    Appends are plain memory writes into the mapping: no syscall and no
+    fsync per sample. `sync()` pushes dirty pages to disk and is called
+    in batches by the consumers, which bounds both SD-card wear and what
+    a power cut can lose. Every record carries a sequence number, a
+    source flag and a CRC, so a torn write is detected and skipped on
+    replay. Consumers track their progress with named cursors stored in
+    the header, and resume from them after a restart.
+    """
+
+    def __init__(self, path: str = SAMPLE_RING_PATH, capacity: int = SAMPLE_RING_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.next_sequence = 0
+        self.syncs = 0
+        self.torn = 0
+        self._map: Optional[mmap.mmap] = None
+        self._file = None
+        self._cursors: Dict[str, int] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return HEADER_SIZE + self.capacity * RECORD.size
+
+    def _open(self) -> mmap.mmap:
+        if self._map is not None:
+            return self._map
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fresh = not os.path.exists(self.path) or os.path.getsize(self.path) != self.size
+        if not fresh:
+            with open(self.path, "rb") as f:
+                magic, capacity, record_size, _ = HEADER.unpack(f.read(HEADER.size))
+            if (magic, capacity, record_size) != (MAGIC, self.capacity, RECORD.size):
+                fresh = True
+        if fresh and os.path.exists(self.path):
+            logger.warning(f"Sample ring {self.path} has a different layout; starting a new one.")
+            os.replace(self.path, f"{self.path}.old")
+
+        self._file = open(self.path, "a+b")
+        if fresh:
+            self._file.truncate(self.size)
+        self._map = mmap.mmap(self._file.fileno(), self.size)
+        if fresh:
+            self._map[:HEADER.size] = HEADER.pack(MAGIC, self.capacity, RECORD.size, 0)
+            self._map.flush()
+        self._load_header()
+        return self._map
+
+    def _load_header(self):
+        _, _, _, self.next_sequence = HEADER.unpack_from(self._map, 0)
+        for index in range(MAX_CURSORS):
+            name, sequence = CURSOR.unpack_from(self._map, HEADER.size + index * CURSOR.size)
+            name = name.rstrip(b"\0").decode()
+            if name:
+                self._cursors[name] = sequence
+        # The header write of the last append may not have reached the disk.
+        while True:
+            record = decode(self._slot(self.next_sequence))
+            if record is None or record[0] != self.next_sequence:
+                break
+            self.next_sequence += 1
+
+    def _slot(self, sequence: int) -> bytes:
+        offset = HEADER_SIZE + (sequence % self.capacity) * RECORD.size
+        return self._map[offset:offset + RECORD.size]
+
+    def append(self, timestamp: float, readings: Mapping[str, Any]) -> int:
+        with self._lock:
+            buffer = self._open()
+            sequence = self.next_sequence
+            offset = HEADER_SIZE + (sequence % self.capacity) * RECORD.size
+            buffer[offset:offset + RECORD.size] = encode(sequence, timestamp, readings)
+            self.next_sequence = sequence + 1
+            struct.pack_into("<Q", buffer, HEADER.size - 8, self.next_sequence)
+            self._dirty = True
+            return sequence
+
+    def read_since(self, after: int, limit: int = HISTORY_FLUSH_BATCH
+                   ) -> Tuple[List[Tuple[int, float, Dict[str, Any]]], int]:
+        """Records with a sequence above `after`, oldest first, and the last sequence examined.
+
+        Records already overwritten by the ring are gone; torn ones are skipped.
+        """
+        with self._lock:
+            self._open()
+            start = max(after + 1, self.next_sequence - self.capacity, 0)
+            end = min(self.next_sequence, start + limit)
+            records = []
+            for sequence in range(start, end):
+                record = decode(self._slot(sequence))
+                if record is None or record[0] != sequence:
+                    self.torn += 1
+                    continue
+                records.append(record)
+            return records, end - 1 if end > start else after
+
+    def cursor(self, name: str) -> int:
+        """Last sequence the named consumer has processed, -1 if none."""
+        with self._lock:
+            self._open()
+            return self._cursors.get(name, -1)
+
+    def commit(self, name: str, sequence: int):
+        with self._lock:
+            buffer = self._open()
+            if name not in self._cursors and len(self._cursors) >= MAX_CURSORS:
+                raise ValueError(f"Sample ring supports at most {MAX_CURSORS} cursors")
+            self._cursors[name] = sequence
+            index = list(self._cursors).index(name)
+            CURSOR.pack_into(buffer, HEADER.size + index * CURSOR.size, name.encode()[:16], sequence)
+            self._dirty = True
+
+    def sync(self):
+        """Write dirty pages to disk (msync)."""
+        with self._lock:
+            if self._map is not None and self._dirty:
+                self._map.flush()
+                self._dirty = False
+                self.syncs += 1
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+                self._map = None
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "next_sequence": self.next_sequence,
+            "capacity": self.capacity,
+            "cursors": dict(self._cursors),
+            "syncs": self.syncs,
+            "torn_records": self.torn,
+        }
+
+
+class HistoryFlusher:
+    """Moves samples from the ring into the history store in batches.
+
+    One transaction per batch instead of one per sample. The cursor only
+    advances after the batch is committed, so a crash in between replays
+    the batch on the next start instead of losing it. Mock samples are
+    never written to history; the ring keeps them, flagged, for diagnosis.
+    """
+
+    CURSOR = "history"
+
+    def __init__(self, ring: SampleRing, history, interval: float = HISTORY_FLUSH_INTERVAL_SECONDS):
+        self.ring = ring
+        self.history = history
+        self.interval = interval
+        self.flushed = 0
+        self.skipped_mock = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def flush_once(self) -> int:
+        async with self._lock:
+            total = 0
+            while True:
+                cursor = self.ring.cursor(self.CURSOR)
+                records, last = await asyncio.to_thread(self.ring.read_since, cursor)
+                if last == cursor:
+                    break
+                samples = [(timestamp, readings) for _, timestamp, readings in records
+                           if readings["source"] != "mock"]
+                await asyncio.to_thread(self.history.append_many, samples)
+                self.ring.commit(self.CURSOR, last)
+                self.skipped_mock += len(records) - len(samples)
+                self.flushed += len(samples)
+                total += len(samples)
+            await asyncio.to_thread(self.ring.sync)
+            return total
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_once()
+            except Exception as e:
+                logger.error(f"History flush failed: {e}")
+
+    async def start(self):
+        """Replay whatever the last run left unflushed, then flush periodically."""
+        replayed = await self.flush_once()
+        if replayed:
+            logger.info(f"Replayed {replayed} buffered samples into history.")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_once()
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+
+from api.metrics import LatencyHistogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("SENSOR_SAMPLE_INTERVAL", "2.0"))
+
+
+@dataclass(frozen=True)
+class SensorSnapshot:
+    """One immutable set of sensor readings published by the sampler."""
+    readings: Mapping[str, Any]
+    sequence: int
+    timestamp: float
+    monotonic: float
+    # Boot id of the process that took the snapshot, when it was not this one.
+    origin: Optional[str] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.monotonic
+
+
+class SensorSampler:
+    """Reads the hardware on a fixed cadence and publishes snapshots.
+
+    `read_fn` is a coroutine function that does its blocking I/O through the
+    hardware layer, so request handlers only ever see the finished snapshot
+    and never wait on the I2C bus or the GPIO chip.
+    """
+
+    def __init__(self, read_fn: Callable[[], Awaitable[Dict[str, Any]]], interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.read_fn = read_fn
+        self.interval = interval
+        self.latest: Optional[SensorSnapshot] = None
+        self._sequence = 0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[SensorSnapshot], Awaitable[None]]] = []
+        # How late each tick started compared to its schedule.
+        self.lag = LatencyHistogram()
+        self.last_lag = 0.0
+        self.skipped_ticks = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add_listener(self, callback: Callable[[SensorSnapshot], Awaitable[None]]):
+        """Register a coroutine function called with every new snapshot."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[SensorSnapshot], Awaitable[None]]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    async def sample_once(self) -> SensorSnapshot:
+        """Take one reading and publish it."""
+        async with self._lock:
+            return await self._sample()
+
+    async def get_snapshot(self) -> SensorSnapshot:
+        """Return the latest snapshot, sampling once if none exists yet."""
+        if self.latest is not None:
+            return self.latest
+        async with self._lock:
+            if self.latest is None:
+                return await self._sample()
+            return self.latest
+
+    def ingest(self, readings: Mapping[str, Any], sequence: int, timestamp: float, monotonic: float,
+               origin: str) -> SensorSnapshot:
+        """Publish a snapshot taken by another process (the hardware owner), keeping its sequence.
+
+        The monotonic clock is system-wide, so its age stays correct here.
+        """
+        self._sequence = sequence
+        self.latest = SensorSnapshot(MappingProxyType(dict(readings)), sequence, timestamp, monotonic, origin)
+        return self.latest
+
+    async def _sample(self) -> SensorSnapshot:
+        readings = await self.read_fn()
+        self._sequence += 1
+        snapshot = SensorSnapshot(
+            readings=MappingProxyType(dict(readings)),
+            sequence=self._sequence,
+            timestamp=time.time(),
+            monotonic=time.monotonic(),
+        )
+        self.latest = snapshot
+        for callback in list(self._listeners):
+            try:
+                await callback(snapshot)
+            except Exception as e:
+                logger.error(f"Snapshot listener {getattr(callback, '__name__', callback)} failed: {e}")
+        return snapshot
+
+    def start(self):
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Sensor sampler started (interval {self.interval}s).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Sensor sampler stopped.")
+
+    async def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            self.last_lag = max(time.monotonic() - next_tick, 0.0)
+            self.lag.observe(self.last_lag)
+            try:
+                await self.sample_once()
+            except Exception as e:
+                logger.error(f"Sensor sampling failed: {e}")
+
+            # Fixed cadence: schedule from the previous tick, not from "now",
+            # and skip missed ticks instead of bursting to catch up.
+            next_tick += self.interval
+            now = time.monotonic()
+            if next_tick < now:
+                self.skipped_ticks += int((now - next_tick) // self.interval) + 1
+                next_tick = now
+            await asyncio.sleep(next_tick - now)
@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCENES_FILE = os.getenv(
+    "OUTLET_SCENES_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "scenes.json"),
+)
+
+
+class SceneStore:
+    """Named outlet scenes (outlet id -> on/off), persisted as a JSON file."""
+
+    def __init__(self, path: str = SCENES_FILE):
+        self.path = path
+        self._scenes: Optional[Dict[str, Dict[str, bool]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, bool]]:
+        if self._scenes is None:
+            try:
+                with open(self.path) as f:
+                    self._scenes = json.load(f)
+            except FileNotFoundError:
+                self._scenes = {}
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read scenes from {self.path}: {e}")
+                self._scenes = {}
+        return self._scenes
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._scenes, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def all(self) -> Dict[str, Dict[str, bool]]:
+        with self._lock:
+            return {name: dict(outlets) for name, outlets in self._load().items()}
+
+    def get(self, name: str) -> Optional[Dict[str, bool]]:
+        with self._lock:
+            outlets = self._load().get(name)
+            return dict(outlets) if outlets is not None else None
+
+    def put(self, name: str, outlets: Dict[str, bool]):
+        with self._lock:
+            self._load()[name] = dict(outlets)
+            self._save()
+
+    def delete(self, name: str) -> bool:
+        with self._lock:
+            if self._load().pop(name, None) is None:
+                return False
+            self._save()
+            return True
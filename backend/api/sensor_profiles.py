@@ -0,0 +1,145 @@
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Mapping, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = os.getenv("SENSOR_PROFILE", "balanced").lower()
+BME280_PROFILE = os.getenv("SENSOR_PROFILE_BME280", DEFAULT_PROFILE).lower()
+BH1750_PROFILE = os.getenv("SENSOR_PROFILE_BH1750", DEFAULT_PROFILE).lower()
+# When set, the sampler ticks at this fixed interval instead of the
+# shortest interval of the active profiles.
+SENSOR_SAMPLE_INTERVAL = os.getenv("SENSOR_SAMPLE_INTERVAL")
+
+# Register codes, as accepted by the adafruit drivers' setters (see the
+# MODE_*, STANDBY_TC_*, OVERSCAN_* and IIR_FILTER_* constants of
+# adafruit_bme280.advanced, and Mode / Resolution of adafruit_bh1750).
+BME280_MODE_FORCE = 0x01
+BME280_MODE_NORMAL = 0x03
+BME280_STANDBY_MS = {0.5: 0x00, 10: 0x06, 20: 0x07, 62.5: 0x01, 125: 0x02, 250: 0x03, 500: 0x04, 1000: 0x05}
+BME280_OVERSAMPLING = {0: 0x00, 1: 0x01, 2: 0x02, 4: 0x03, 8: 0x04, 16: 0x05}
+BME280_IIR = {0: 0x00, 2: 0x01, 4: 0x02, 8: 0x03, 16: 0x04}
+BH1750_MODE_CONTINUOUS = 1
+BH1750_RESOLUTION = {"low": 3, "mid": 0, "high": 1}
+
+
+@dataclass(frozen=True)
+class BME280Profile:
+    """Acquisition settings of the BME280 and how often each of its readings is taken.
+
+    In normal mode the sensor measures on its own every standby period and
+    a read only fetches the latest result; in forced mode every read
+    triggers a conversion and the sensor sleeps in between. All three values
+    come from one burst read, so pressure follows the climate interval.
+    """
+    name: str
+    mode: str
+    standby_ms: float
+    oversampling_temperature: int
+    oversampling_humidity: int
+    oversampling_pressure: int
+    iir_filter: int
+    climate_interval: float
+
+    def apply(self, sensor):
+        """Write the settings to a driver object; blocking, run it on the bus thread."""
+        # Oversampling first, mode last: the driver rewrites ctrl_meas on every setter.
+        sensor.overscan_temperature = BME280_OVERSAMPLING[self.oversampling_temperature]
+        sensor.overscan_humidity = BME280_OVERSAMPLING[self.oversampling_humidity]
+        sensor.overscan_pressure = BME280_OVERSAMPLING[self.oversampling_pressure]
+        sensor.iir_filter = BME280_IIR[self.iir_filter]
+        sensor.standby_period = BME280_STANDBY_MS[self.standby_ms]
+        sensor.mode = BME280_MODE_NORMAL if self.mode == "normal" else BME280_MODE_FORCE
+
+    def intervals(self) -> Dict[str, float]:
+        return {"climate": self.climate_interval}
+
+
+@dataclass(frozen=True)
+class BH1750Profile:
+    """Continuous-mode resolution of the BH1750 and how often lux is read.
+
+    low: 4 lx steps, 16 ms conversions. mid: 1 lx, 120 ms. high: 0.5 lx, 120 ms.
+    """
+    name: str
+    resolution: str
+    light_interval: float
+
+    def apply(self, sensor):
+        sensor.mode = BH1750_MODE_CONTINUOUS
+        sensor.resolution = BH1750_RESOLUTION[self.resolution]
+
+    def intervals(self) -> Dict[str, float]:
+        return {"light": self.light_interval}
+
+
+# Motion is not polled in any profile: the PIR reports edges by interrupt.
+BME280_PROFILES = {
+    # Bosch's "weather monitoring" setup: forced mode, x1 oversampling, no filter.
+    "low-power": BME280Profile("low-power", "forced", 1000, 1, 1, 1, 0,
+                               climate_interval=30.0),
+    "balanced": BME280Profile("balanced", "normal", 1000, 2, 1, 4, 4,
+                              climate_interval=4.0),
+    "high-precision": BME280Profile("high-precision", "normal", 125, 2, 4, 16, 16,
+                                    climate_interval=2.0),
+}
+BH1750_PROFILES = {
+    "low-power": BH1750Profile("low-power", "low", light_interval=10.0),
+    "balanced": BH1750Profile("balanced", "mid", light_interval=2.0),
+    "high-precision": BH1750Profile("high-precision", "high", light_interval=1.0),
+}
+
+
+def select(profiles: Mapping[str, Any], name: str, sensor: str):
+    if name not in profiles:
+        logger.warning(f"Unknown {sensor} profile '{name}'; using 'balanced'. Known: {', '.join(profiles)}")
+        name = "balanced"
+    return profiles[name]
+
+
+def tick_interval(*profiles) -> float:
+    """Sampler cadence: the shortest interval any active profile asks for."""
+    if SENSOR_SAMPLE_INTERVAL:
+        return float(SENSOR_SAMPLE_INTERVAL)
+    return min(interval for profile in profiles for interval in profile.intervals().values())
+
+
+class ReadSchedule:
+    """Tracks when each group of readings is next due.
+
+    The sampler ticks at the shortest interval; on each tick only the groups
+    whose interval has elapsed touch the bus, the others keep their last
+    value. A group whose read failed stays due, so it is retried next tick.
+    """
+
+    # Tick jitter must not push a read to the next tick.
+    SLACK = 0.1
+
+    def __init__(self, intervals: Mapping[str, float]):
+        self.intervals = dict(intervals)
+        self.last_read: Dict[str, float] = {}
+
+    def due(self, group: str, now: float) -> bool:
+        last = self.last_read.get(group)
+        return last is None or now - last >= self.intervals[group] * (1 - self.SLACK)
+
+    def mark(self, group: str, now: float):
+        self.last_read[group] = now
+
+    def reset(self):
+        self.last_read.clear()
+
+    def status(self, now: float) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            group: {
+                "interval": interval,
+                "age": round(now - self.last_read[group], 3) if group in self.last_read else None,
+            }
+            for group, interval in self.intervals.items()
+        }
+
+
+def describe(profile) -> Dict[str, Any]:
+    return asdict(profile)
@@ -0,0 +1,471 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from api.bme280 import ClimateReading
+from api.outlet_registry import OutletConfig
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIMULATION_DATA_DIR = os.getenv(
+    "SIMULATION_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "simulated"),
+)
+SIMULATED_OUTLETS = int(os.getenv("SIM_OUTLETS", "8"))
+SIM_SEED = os.getenv("SIM_SEED")
+
+# Median latencies; each operation draws from a log-normal around them.
+SIM_I2C_LATENCY_MS = float(os.getenv("SIM_I2C_LATENCY_MS", "1.5"))
+SIM_TAPO_LATENCY_MS = float(os.getenv("SIM_TAPO_LATENCY_MS", "40"))
+SIM_TAPO_HANDSHAKE_MS = float(os.getenv("SIM_TAPO_HANDSHAKE_MS", "300"))
+SIM_LATENCY_SPREAD = 0.35
+
+# Failure injection: chance that one operation fails, and share of plugs
+# that never answer at all.
+SIM_I2C_FAILURE_RATE = float(os.getenv("SIM_I2C_FAILURE_RATE", "0.0"))
+SIM_TAPO_FAILURE_RATE = float(os.getenv("SIM_TAPO_FAILURE_RATE", "0.0"))
+SIM_TAPO_OFFLINE_RATE = float(os.getenv("SIM_TAPO_OFFLINE_RATE", "0.0"))
+
+# PIR: mean seconds between people walking past, and how long they stay.
+SIM_MOTION_INTERVAL = float(os.getenv("SIM_MOTION_INTERVAL", "60"))
+SIM_MOTION_DURATION = float(os.getenv("SIM_MOTION_DURATION", "8"))
+
+
+def make_rng(name: str) -> random.Random:
+    """Per-device generator; with SIM_SEED set, every run replays the same values."""
+    return random.Random(f"{SIM_SEED}:{name}") if SIM_SEED is not None else random.Random()
+
+
+def draw_latency(rng: random.Random, median_ms: float) -> float:
+    """Seconds for one operation: log-normal, so there is a realistic slow tail."""
+    if median_ms <= 0:
+        return 0.0
+    return median_ms * rng.lognormvariate(0.0, SIM_LATENCY_SPREAD) / 1000
+
+
+def diurnal(period_hours: float = 24.0, peak_hour: float = 15.0, now: Optional[float] = None) -> float:
+    """-1..1 over the day, peaking at `peak_hour` local time."""
+    moment = datetime.fromtimestamp(time.time() if now is None else now)
+    hours = moment.hour + moment.minute / 60 + moment.second / 3600
+    return math.cos(2 * math.pi * (hours - peak_hour) / period_hours)
+
+
+class DriftingValue:
+    """A reading that wanders around a moving target (Ornstein-Uhlenbeck process).
+
+    The value is advanced by the time elapsed since the last read, so it
+    drifts at the same rate whether it is read every 10 ms or every minute.
+    """
+
+    def __init__(self, rng: random.Random, target: Callable[[], float], volatility: float,
+                 reversion: float = 1 / 300, noise: float = 0.0):
+        self.rng = rng
+        self.target = target
+        self.volatility = volatility
+        self.reversion = reversion
+        self.noise = noise
+        self.value = target()
+        self._last = time.monotonic()
+
+    def read(self) -> float:
+        now = time.monotonic()
+        dt = min(now - self._last, 3600.0)
+        self._last = now
+        if dt > 0:
+            pull = 1 - math.exp(-self.reversion * dt)
+            self.value += (self.target() - self.value) * pull
+            self.value += self.volatility * math.sqrt(dt) * self.rng.gauss(0.0, 1.0)
+        return self.value + (self.rng.gauss(0.0, self.noise) if self.noise else 0.0)
+
+
+class SimulatedI2CError(OSError):
+    """What a NACK or bus glitch looks like from the Linux I2C driver."""
+
+    def __init__(self, device: str):
+        super().__init__(121, f"Remote I/O error ({device}, simulated)")
+
+
+class SimulatedI2CDevice:
+    """Blocks its caller for an I2C-like transfer time and fails on demand.
+
+    It sleeps on the calling thread on purpose: the hardware layer runs it
+    on the bus thread, so queueing behind a slow read is reproduced too.
+    """
+
+    def __init__(self, name: str, latency_ms: float = SIM_I2C_LATENCY_MS,
+                 failure_rate: float = SIM_I2C_FAILURE_RATE):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.rng = make_rng(name)
+        self.reads = 0
+        self.failures = 0
+
+    def _transfer(self):
+        time.sleep(draw_latency(self.rng, self.latency_ms))
+        self.reads += 1
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise SimulatedI2CError(self.name)
+
+
+class SimulatedBME280(SimulatedI2CDevice):
+    """Same attributes as the adafruit BME280 driver: temperature, humidity, pressure,
+    plus the mode, standby, oversampling and IIR settings of its advanced variant.
+
+    In forced mode every read also waits out a conversion, whose length
+    grows with the oversampling; oversampling and the IIR filter reduce
+    the noise the way they do on the real sensor.
+    """
+
+    OVERSAMPLING = {0x00: 0, 0x01: 1, 0x02: 2, 0x03: 4, 0x04: 8, 0x05: 16}
+    IIR = {0x00: 1, 0x01: 2, 0x02: 4, 0x03: 8, 0x04: 16}
+
+    def __init__(self, name: str = "bme280", **kwargs):
+        super().__init__(name, **kwargs)
+        # The driver's power-on defaults.
+        self.mode = 0x00
+        self.standby_period = 0x02
+        self.overscan_temperature = 0x01
+        self.overscan_humidity = 0x01
+        self.overscan_pressure = 0x05
+        self.iir_filter = 0x00
+        self.conversions = 0
+        self._temperature = DriftingValue(self.rng, lambda: 22.5 + 2.0 * diurnal(), 0.01, noise=0.02)
+        self._humidity = DriftingValue(self.rng, lambda: 48.0 - 6.0 * diurnal(), 0.05, noise=0.1)
+        self._pressure = DriftingValue(self.rng, lambda: 1013.25, 0.02, reversion=1 / 3600, noise=0.01)
+
+    @property
+    def measurement_time_typical(self) -> float:
+        """Milliseconds per conversion, from the datasheet formula the driver uses too."""
+        time_ms = 1.0
+        for code, extra in ((self.overscan_temperature, 0.0), (self.overscan_pressure, 0.5),
+                            (self.overscan_humidity, 0.5)):
+            if self.OVERSAMPLING[code]:
+                time_ms += 2 * self.OVERSAMPLING[code] + extra
+        return time_ms
+
+    def _convert(self):
+        self._transfer()
+        if self.mode != 0x03:
+            self.conversions += 1
+            time.sleep(self.measurement_time_typical / 1000)
+
+    def _sample(self, value: DriftingValue, oversampling: int, filtered: bool = True) -> float:
+        samples = max(self.OVERSAMPLING[oversampling], 1) * (self.IIR[self.iir_filter] if filtered else 1)
+        noise, value.noise = value.noise, value.noise / math.sqrt(samples)
+        try:
+            return value.read()
+        finally:
+            value.noise = noise
+
+    def _humidity_value(self) -> float:
+        # The IIR filter does not apply to humidity on the BME280.
+        return min(max(self._sample(self._humidity, self.overscan_humidity, filtered=False), 0.0), 100.0)
+
+    @property
+    def temperature(self) -> float:
+        self._convert()
+        return self._sample(self._temperature, self.overscan_temperature)
+
+    @property
+    def humidity(self) -> float:
+        self._convert()
+        return self._humidity_value()
+
+    @property
+    def pressure(self) -> float:
+        self._convert()
+        return self._sample(self._pressure, self.overscan_pressure)
+
+    def read_burst(self) -> ClimateReading:
+        """All three values from one transfer and at most one conversion, like api.bme280.burst_read."""
+        self._convert()
+        return ClimateReading(
+            self._sample(self._temperature, self.overscan_temperature),
+            self._humidity_value(),
+            self._sample(self._pressure, self.overscan_pressure),
+            time.time(),
+        )
+
+
+class SimulatedBH1750(SimulatedI2CDevice):
+    """Same attributes as the adafruit BH1750 driver: lux, mode and resolution."""
+
+    # Resolution code -> lux per step.
+    STEPS = {3: 4.0, 0: 1.0, 1: 0.5}
+
+    def __init__(self, name: str = "bh1750", **kwargs):
+        super().__init__(name, **kwargs)
+        self.mode = 1
+        self.resolution = 1
+        self._lux = DriftingValue(self.rng, lambda: max(40.0, 400.0 + 350.0 * diurnal(peak_hour=13.0)),
+                                  2.0, reversion=1 / 120, noise=3.0)
+
+    @property
+    def lux(self) -> float:
+        self._transfer()
+        step = self.STEPS.get(self.resolution, 0.5)
+        return round(max(self._lux.read(), 0.0) / step) * step
+
+
+class SimulatedAlert:
+    """Returned by SimulatedGPIO.callback; generates PIR edges until cancelled."""
+
+    def __init__(self, gpio: "SimulatedGPIO", pin: int, func):
+        self.gpio = gpio
+        self.pin = pin
+        self.func = func
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sim-pir-{pin}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        rng = self.gpio.rng
+        while not self._stop.wait(rng.expovariate(1 / self.gpio.motion_interval)):
+            self.gpio.set_level(self.pin, 1, self.func)
+            if self._stop.wait(rng.expovariate(1 / self.gpio.motion_duration)):
+                break
+            self.gpio.set_level(self.pin, 0, self.func)
+
+    def cancel(self):
+        self._stop.set()
+
+
+class SimulatedGPIO:
+    """The slice of the lgpio module MotionDetector uses, driven by a simulated PIR.
+
+    People arrive as a Poisson process and stay for an exponential time,
+    so motion starts, retriggers and clears like a real hallway.
+    """
+
+    BOTH_EDGES = 3
+    SET_PULL_DOWN = 64
+
+    def __init__(self, motion_interval: float = SIM_MOTION_INTERVAL,
+                 motion_duration: float = SIM_MOTION_DURATION, name: str = "pir"):
+        self.motion_interval = motion_interval
+        self.motion_duration = motion_duration
+        self.rng = make_rng(name)
+        self.levels: Dict[int, int] = {}
+        # pin -> (frequency, duty cycle %) of the PWM output driven on it.
+        self.pwm: Dict[int, tuple] = {}
+        self._start = time.monotonic_ns()
+
+    def gpiochip_open(self, chip: int) -> int:
+        return chip
+
+    def gpiochip_close(self, handle: int):
+        pass
+
+    def gpio_claim_alert(self, handle: int, pin: int, edge: int, flags: int = 0):
+        self.levels.setdefault(pin, 0)
+
+    def gpio_set_debounce_micros(self, handle: int, pin: int, micros: int):
+        pass
+
+    def gpio_read(self, handle: int, pin: int) -> int:
+        return self.levels.get(pin, 0)
+
+    def gpio_claim_output(self, handle: int, pin: int, level: int = 0, flags: int = 0):
+        self.levels[pin] = level
+
+    def tx_pwm(self, handle: int, pin: int, frequency: float, duty: float, offset: int = 0, cycles: int = 0) -> int:
+        if not 0 <= duty <= 100:
+            raise ValueError(f"Bad PWM duty cycle {duty}")
+        self.pwm[pin] = (frequency, duty)
+        return 0
+
+    def set_level(self, pin: int, level: int, func=None):
+        if self.levels.get(pin) == level:
+            return
+        self.levels[pin] = level
+        if func is not None:
+            func(0, pin, level, time.monotonic_ns() - self._start)
+
+    def callback(self, handle: int, pin: int, edge: int, func) -> SimulatedAlert:
+        return SimulatedAlert(self, pin, func)
+
+
+class SimulatedDeviceInfo:
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+        self.device_on = data.get("device_on")
+        self.device_id = data.get("device_id")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+
+class SimulatedPower:
+    def __init__(self, current_power: float):
+        self.current_power = current_power
+
+
+class SimulatedTapoError(Exception):
+    """Stands in for the tapo library's transport and session errors."""
+
+
+class SimulatedPlug:
+    """A P100/P110-style handler: on/off, device info, power, session refresh."""
+
+    def __init__(self, device: "SimulatedTapoDevice", device_id: str):
+        self.device = device
+        self.device_id = device_id
+
+    async def on(self):
+        await self.device.round_trip()
+        self.device.state[self.device_id] = True
+
+    async def off(self):
+        await self.device.round_trip()
+        self.device.state[self.device_id] = False
+
+    async def get_device_info(self) -> SimulatedDeviceInfo:
+        await self.device.round_trip()
+        return SimulatedDeviceInfo({
+            "device_id": self.device_id,
+            "device_on": self.device.state[self.device_id],
+            "model": self.device.model.upper(),
+            "ip": self.device.ip,
+        })
+
+    async def get_current_power(self) -> SimulatedPower:
+        await self.device.round_trip()
+        return SimulatedPower(self.device.power(self.device_id))
+
+    async def refresh_session(self):
+        await self.device.handshake()
+
+
+class SimulatedBulb(SimulatedPlug):
+    """An L510/L530-style bulb: a plug with a brightness."""
+
+    async def set_brightness(self, brightness: int):
+        if not 1 <= brightness <= 100:
+            raise SimulatedTapoError(f"Brightness {brightness} out of range (simulated)")
+        await self.device.round_trip()
+        self.device.brightness[self.device_id] = brightness
+
+    async def get_device_info(self) -> SimulatedDeviceInfo:
+        info = await super().get_device_info()
+        return SimulatedDeviceInfo({**info.to_dict(), "brightness": self.device.brightness.get(self.device_id, 100)})
+
+
+class SimulatedStrip:
+    """A P300-style strip: one session, child sockets by position or device id."""
+
+    def __init__(self, device: "SimulatedTapoDevice"):
+        self.device = device
+
+    async def plug(self, position: int) -> SimulatedPlug:
+        await self.device.round_trip()
+        return SimulatedPlug(self.device, self.device.child_id(position))
+
+    async def plug_unchecked(self, device_id: str) -> SimulatedPlug:
+        self.device.state.setdefault(device_id, False)
+        return SimulatedPlug(self.device, device_id)
+
+    async def refresh_session(self):
+        await self.device.handshake()
+
+
+class SimulatedTapoDevice:
+    """Network behaviour of one plug or strip: latency, failures, switch state, load."""
+
+    def __init__(self, ip: str, model: str, offline: bool = False):
+        self.ip = ip
+        self.model = model
+        self.offline = offline
+        self.rng = make_rng(f"tapo:{ip}")
+        self.state: Dict[str, bool] = {}
+        self.brightness: Dict[str, int] = {}
+        self.loads: Dict[str, DriftingValue] = {}
+        self.calls = 0
+
+    def child_id(self, position: int) -> str:
+        device_id = f"SIM{self.ip.replace('.', '')}{position:02d}"
+        self.state.setdefault(device_id, False)
+        return device_id
+
+    async def handshake(self):
+        await asyncio.sleep(draw_latency(self.rng, SIM_TAPO_HANDSHAKE_MS))
+        if self.offline:
+            raise SimulatedTapoError(f"{self.ip} did not respond (simulated)")
+
+    async def round_trip(self):
+        self.calls += 1
+        await asyncio.sleep(draw_latency(self.rng, SIM_TAPO_LATENCY_MS))
+        if self.offline or (SIM_TAPO_FAILURE_RATE and self.rng.random() < SIM_TAPO_FAILURE_RATE):
+            raise SimulatedTapoError(f"Request to {self.ip} failed (simulated)")
+
+    def power(self, device_id: str) -> float:
+        if not self.state.get(device_id):
+            return round(self.rng.uniform(0.0, 0.4), 1)
+        load = self.loads.get(device_id)
+        if load is None:
+            base = self.rng.choice([8.0, 40.0, 60.0, 120.0, 900.0])
+            load = self.loads[device_id] = DriftingValue(self.rng, lambda: base, base * 0.002, noise=base * 0.02)
+        return round(max(load.read(), 0.0), 1)
+
+
+class SimulatedTapoClient:
+    """Stands in for `tapo.ApiClient`: `await client.p110(ip)` returns a handler.
+
+    Devices persist per IP for the life of the client, so reconnecting
+    returns to the same switch state, as with a real plug.
+    """
+
+    def __init__(self, username: str = "", password: str = "", timeout_s: int = 0,
+                 offline_rate: float = SIM_TAPO_OFFLINE_RATE):
+        self.offline_rate = offline_rate
+        self.devices: Dict[str, SimulatedTapoDevice] = {}
+        self._rng = make_rng("tapo-client")
+
+    def device(self, ip: str, model: str) -> SimulatedTapoDevice:
+        if ip not in self.devices:
+            offline = bool(self.offline_rate) and self._rng.random() < self.offline_rate
+            self.devices[ip] = SimulatedTapoDevice(ip, model, offline)
+        return self.devices[ip]
+
+    async def _connect(self, model: str, ip: str):
+        device = self.device(ip, model)
+        await device.handshake()
+        if model.startswith("p3"):
+            return SimulatedStrip(device)
+        device.state.setdefault(ip, False)
+        return SimulatedBulb(device, ip) if model.startswith("l") else SimulatedPlug(device, ip)
+
+    def __getattr__(self, model: str):
+        if not model.startswith(("p", "l")):
+            raise AttributeError(model)
+
+        async def connect(ip: str):
+            return await self._connect(model, ip)
+
+        return connect
+
+
+def simulated_outlet_configs(count: int = SIMULATED_OUTLETS) -> Dict[str, OutletConfig]:
+    """`count` outlets: mostly P110 plugs, every fifth group of three on a P300 strip."""
+    configs: Dict[str, OutletConfig] = {}
+    index = 0
+    while len(configs) < count:
+        subnet, host = divmod(index, 250)
+        ip = f"10.99.{subnet}.{host + 1}"
+        if index % 5 == 4 and count - len(configs) >= 3:
+            for position in (1, 2, 3):
+                outlet_id = f"sim_strip_{index:03d}_{position}"
+                configs[outlet_id] = OutletConfig(outlet_id, ip, "p300", position=position)
+        else:
+            outlet_id = f"sim_outlet_{index:03d}"
+            configs[outlet_id] = OutletConfig(outlet_id, ip, "p110")
+        index += 1
+    return configs
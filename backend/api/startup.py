@@ -0,0 +1,159 @@
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STARTED_AT = time.monotonic()
+
+_modules: Dict[str, Any] = {}
+_import_lock = threading.Lock()
+_env_loaded = False
+
+
+def import_optional(name: str):
+    """Import a driver library on first use; None when it is not installed.
+
+    `board` probes the platform and the Adafruit drivers pull in Blinka, so
+    these imports are kept off the import of `main` and run on the thread
+    that first needs them (usually a bus thread).
+    """
+    with _import_lock:
+        if name not in _modules:
+            try:
+                _modules[name] = importlib.import_module(name)
+            except ImportError as e:
+                logger.info(f"Optional driver '{name}' is not available: {e}")
+                _modules[name] = None
+        return _modules[name]
+
+
+class LazyModule:
+    """Stands in for a driver module and imports it on the first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        module = import_optional(self._name)
+        if module is None:
+            raise ImportError(f"{self._name} is not installed")
+        return getattr(module, attr)
+
+
+def load_env():
+    """Read `.env` once, the first time credentials are needed."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    dotenv = import_optional("dotenv")
+    if dotenv is not None:
+        dotenv.load_dotenv()
+    _env_loaded = True
+
+
+def tapo_client(timeout: float):
+    """A `tapo.ApiClient` for the credentials in the environment, or None without them."""
+    load_env()
+    username, password = os.getenv("TAPO_USERNAME"), os.getenv("TAPO_PASSWORD")
+    if not (username and password):
+        return None
+    tapo = import_optional("tapo")
+    if tapo is None:
+        raise RuntimeError("The tapo library is not installed.")
+    return tapo.ApiClient(username, password, timeout_s=int(timeout))
+
+
+class InitStep:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "pending"
+        self.started = time.monotonic()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.detail: Any = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "duration": round(self.duration, 3) if self.duration is not None else None,
+            "elapsed": round(time.monotonic() - self.started, 3),
+            "error": self.error,
+            "detail": self.detail,
+        }
+
+
+class DeviceStartup:
+    """Initializes devices in the background so the API serves right away.
+
+    Each step is one coroutine (open the sensors, connect the plugs, ...)
+    and runs as its own task; `detail` callables describe the per-device
+    outcome once a step has finished. Until every step has left "pending"
+    the process is live but not ready.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, InitStep] = {}
+        self._details: Dict[str, Callable[[], Any]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def launch(self, name: str, fn: Callable[[], Awaitable[Any]], detail: Optional[Callable[[], Any]] = None):
+        step = InitStep(name)
+        self.steps[name] = step
+        if detail is not None:
+            self._details[name] = detail
+        task = asyncio.create_task(self._run(step, fn))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, step: InitStep, fn: Callable[[], Awaitable[Any]]):
+        try:
+            await fn()
+            step.state = "ready"
+        except asyncio.CancelledError:
+            step.state = "cancelled"
+            raise
+        except Exception as e:
+            step.state = "failed"
+            step.error = str(e) or type(e).__name__
+            logger.error(f"Initializing {step.name} failed: {step.error}")
+        finally:
+            step.duration = time.monotonic() - step.started
+        logger.info(f"{step.name} initialized in {step.duration:.2f}s ({step.state}).")
+
+    @property
+    def ready(self) -> bool:
+        return all(step.state != "pending" for step in self.steps.values())
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for every step to finish; False if `timeout` ran out first."""
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        return not pending
+
+    async def cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        steps = {}
+        for name, step in self.steps.items():
+            status = step.status()
+            if name in self._details and step.state != "pending":
+                try:
+                    status["detail"] = self._details[name]()
+                except Exception as e:
+                    status["detail"] = f"unavailable: {e}"
+            steps[name] = status
+        return {"ready": self.ready, "steps": steps}
+
+
+startup = DeviceStartup()
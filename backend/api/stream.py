@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STREAM_DEBOUNCE_SECONDS = float(os.getenv("STREAM_DEBOUNCE", "1.0"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "32"))
+
+_MISSING = object()
+
+
+class Subscriber:
+    """One connected stream client with its own bounded queue."""
+
+    def __init__(self, topics: Optional[Iterable[str]], queue_size: int):
+        self.topics = set(topics) if topics else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+
+class StreamHub:
+    """Fans state changes from a single producer out to every subscriber.
+
+    Producers call `publish(topic, fields)` with the full current state of a
+    topic; only fields whose value changed are sent, and each field is sent
+    at most once per debounce window (the latest value wins). A subscriber
+    whose queue fills up is dropped instead of slowing everyone else down.
+    """
+
+    def __init__(self, debounce: float = STREAM_DEBOUNCE_SECONDS, queue_size: int = STREAM_QUEUE_SIZE):
+        self.debounce = debounce
+        self.queue_size = queue_size
+        self.current: Dict[str, Dict[str, Any]] = {}
+        self._sent: Dict[Tuple[str, str], Any] = {}
+        self._sent_at: Dict[Tuple[str, str], float] = {}
+        self._pending: Dict[Tuple[str, str], Any] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._subscribers: Set[Subscriber] = set()
+        self.dropped_subscribers = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscriber:
+        subscriber = Subscriber(topics, self.queue_size)
+        # Every new client starts from the full current state.
+        for topic, fields in self.current.items():
+            if subscriber.wants(topic) and fields:
+                subscriber.queue.put_nowait({"topic": topic, "data": dict(fields)})
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, topic: str, fields: Mapping[str, Any], debounce: Optional[float] = None):
+        """`debounce` overrides the window, e.g. 0 for changes that were already debounced upstream."""
+        window = self.debounce if debounce is None else debounce
+        now = time.monotonic()
+        changes: Dict[Tuple[str, str], Any] = {}
+        self.current.setdefault(topic, {}).update(fields)
+
+        for field, value in fields.items():
+            key = (topic, field)
+            if self._sent.get(key, _MISSING) == value:
+                self._pending.pop(key, None)
+                continue
+            if now - self._sent_at.get(key, float("-inf")) >= window:
+                changes[key] = value
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = value
+
+        if changes:
+            self._broadcast(changes, now)
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.debounce, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        now = time.monotonic()
+        due = {
+            key: value for key, value in self._pending.items()
+            if now - self._sent_at.get(key, float("-inf")) >= self.debounce
+        }
+        for key in due:
+            del self._pending[key]
+        if due:
+            self._broadcast(due, now)
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.debounce, self._flush)
+
+    def _broadcast(self, changes: Dict[Tuple[str, str], Any], now: float):
+        by_topic: Dict[str, Dict[str, Any]] = {}
+        for (topic, field), value in changes.items():
+            by_topic.setdefault(topic, {})[field] = value
+            self._sent[(topic, field)] = value
+            self._sent_at[(topic, field)] = now
+
+        for subscriber in list(self._subscribers):
+            for topic, data in by_topic.items():
+                if not subscriber.wants(topic):
+                    continue
+                try:
+                    subscriber.queue.put_nowait({"topic": topic, "data": data})
+                except asyncio.QueueFull:
+                    self._drop(subscriber)
+                    break
+
+    def _drop(self, subscriber: Subscriber):
+        logger.warning("Dropping slow stream subscriber (queue full).")
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        self.dropped_subscribers += 1
+        # Make room for the sentinel that wakes the client's generator up.
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+
+stream_hub = StreamHub()
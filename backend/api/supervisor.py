@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_INITIAL = float(os.getenv("BREAKER_RESET_INITIAL", "5"))
+BREAKER_RESET_MAX = 300.0
+# A trial whose caller was cancelled never reports back; after this long another one may start.
+BREAKER_TRIAL_TIMEOUT = 60.0
+SUPERVISOR_INTERVAL = float(os.getenv("SUPERVISOR_INTERVAL", "1.0"))
+
+
+class CircuitBreaker:
+    """Fails calls to a device fast while it is down.
+
+    Closed: calls go through. After `threshold` consecutive failures it
+    opens and `allow()` refuses calls without touching the device. Once
+    the reset delay has passed it is half-open: exactly one trial call is
+    let through, and its outcome closes or reopens the breaker. Every
+    reopen without a success in between doubles the delay.
+
+    A breaker watched by the supervisor is `supervised`: then only the
+    supervisor's probe takes the trial (`try_trial`), and `allow()`
+    refuses every call until the probe has closed it again.
+    """
+
+    def __init__(self, name: str, threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_initial: float = BREAKER_RESET_INITIAL, reset_max: float = BREAKER_RESET_MAX):
+        self.name = name
+        self.threshold = threshold
+        self.reset_initial = reset_initial
+        self.reset_max = reset_max
+        self.supervised = False
+        self.state = "closed"
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.trips = 0
+        self.rejected = 0
+        self._opens = 0
+        self._trial = False
+        self._trial_at = 0.0
+
+    @property
+    def retry_in(self) -> float:
+        return max(self.retry_at - time.monotonic(), 0.0)
+
+    @property
+    def due(self) -> bool:
+        """Open, and the reset delay has passed: the next trial may start."""
+        return self.state == "open" and time.monotonic() >= self.retry_at
+
+    def allow(self) -> bool:
+        """Request path: may this call go to the device?"""
+        if self.state == "closed":
+            return True
+        if not self.supervised and self.try_trial():
+            return True
+        self.rejected += 1
+        return False
+
+    def try_trial(self) -> bool:
+        """Take the single half-open trial, if the reset delay has passed and nobody holds it."""
+        if self.due:
+            self.state = "half_open"
+            self._trial = False
+        now = time.monotonic()
+        if self.state == "half_open" and (not self._trial or now - self._trial_at > BREAKER_TRIAL_TIMEOUT):
+            self._trial = True
+            self._trial_at = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"{self.name} recovered.")
+        self.state = "closed"
+        self.failures = 0
+        self._opens = 0
+        self._trial = False
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        self.failures += 1
+        if error is not None:
+            self.last_error = str(error) or type(error).__name__
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.trip()
+
+    def trip(self, error: Optional[BaseException] = None):
+        """Open right away, e.g. for a device that could not be opened at all."""
+        if error is not None:
+            self.last_error = str(error) or type(error).__name__
+        self._opens += 1
+        delay = min(self.reset_initial * 2 ** (self._opens - 1), self.reset_max)
+        self.retry_at = time.monotonic() + delay
+        self.state = "open"
+        self._trial = False
+        self.trips += 1
+        logger.warning(f"{self.name} is down ({self.last_error}); next attempt in {delay:.0f}s.")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "error": self.last_error,
+            "retry_in": round(self.retry_in, 1) if self.state == "open" else None,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class HealthSupervisor:
+    """Re-probes every device whose breaker is open, on the breaker's backoff.
+
+    A probe re-initializes the device (reopen the sensor, reconnect the
+    plug) and checks that it answers. Watched breakers give their
+    half-open trial to the probe alone, so requests and the sampler keep
+    failing fast while it runs and only resume once the device is known
+    to be back.
+    """
+
+    def __init__(self, interval: float = SUPERVISOR_INTERVAL):
+        self.interval = interval
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.probes: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self.probes_run = 0
+        self.recoveries = 0
+        self._probing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, name: str, breaker: CircuitBreaker, probe: Callable[[], Awaitable[Any]]):
+        breaker.supervised = True
+        self.breakers[name] = breaker
+        self.probes[name] = probe
+
+    async def check(self):
+        """Start a probe for every breaker that is due; probes run concurrently."""
+        for name, breaker in list(self.breakers.items()):
+            if name in self._probing or not breaker.due:
+                continue
+            self._probing.add(name)
+            task = asyncio.create_task(self._probe(name, breaker))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _probe(self, name: str, breaker: CircuitBreaker):
+        try:
+            if not breaker.try_trial():
+                return
+            self.probes_run += 1
+            try:
+                await self.probes[name]()
+            except Exception as e:
+                breaker.record_failure(e)
+                return
+            breaker.record_success()
+            self.recoveries += 1
+        finally:
+            self._probing.discard(name)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Health supervisor check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "probes": self.probes_run,
+            "recoveries": self.recoveries,
+            "devices": {name: breaker.status() for name, breaker in self.breakers.items()},
+        }
+
+
+supervisor = HealthSupervisor()
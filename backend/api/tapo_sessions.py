@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_FILE = os.getenv(
+    "TAPO_SESSION_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "tapo_sessions.json"),
+)
+# Device sessions expire on the plug side; refresh well before that, off the request path.
+SESSION_LIFETIME_SECONDS = float(os.getenv("TAPO_SESSION_LIFETIME", str(12 * 3600)))
+SESSION_REFRESH_FRACTION = 0.8
+SESSION_CHECK_INTERVAL = 60.0
+
+
+class TapoSessionManager:
+    """Keeps Tapo device sessions warm and remembers what each handshake learned.
+
+    The tapo library keeps the negotiated session keys to itself, so they
+    cannot be saved across restarts. What can be saved is the bookkeeping
+    around them: the child device id of every power-strip socket (so
+    reconnecting a socket skips listing the strip's children) and handshake
+    timings. Live sessions are refreshed in the background before they
+    expire, so a command after a long idle period does not pay for a new
+    handshake.
+    """
+
+    def __init__(self, path: str = SESSION_CACHE_FILE, lifetime: float = SESSION_LIFETIME_SECONDS):
+        self.path = path
+        self.lifetime = lifetime
+        # Keyed by device IP: sockets of one power strip share its session.
+        self.sessions: Dict[str, Any] = {}
+        self.established_at: Dict[str, float] = {}
+        self.on_expired: Optional[Callable[[str], None]] = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._metadata: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._metadata is None:
+            try:
+                with open(self.path) as f:
+                    self._metadata = json.load(f)
+            except FileNotFoundError:
+                self._metadata = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable Tapo session cache {self.path}: {e}")
+                self._metadata = {}
+        return self._metadata
+
+    def save(self):
+        with self._lock:
+            metadata = self._load()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(metadata, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def child_device_id(self, outlet_id: str, ip: str) -> Optional[str]:
+        with self._lock:
+            entry = self._load().get(outlet_id, {})
+        # A socket moved to another strip keeps its id but not its address.
+        return entry.get("device_id") if entry.get("ip") == ip else None
+
+    def register(self, ip: str, session_handler):
+        """Track a freshly handshaken device session (plug or strip handler)."""
+        self.sessions[ip] = session_handler
+        self.established_at[ip] = time.monotonic()
+
+    def forget(self, ip: str):
+        self.sessions.pop(ip, None)
+        self.established_at.pop(ip, None)
+
+    def record_handshake(self, outlet_id: str, ip: str, seconds: float, device_id: Optional[str] = None):
+        with self._lock:
+            entry = self._load().setdefault(outlet_id, {})
+            entry["ip"] = ip
+            entry["last_handshake_ms"] = round(seconds * 1000, 1)
+            entry["last_handshake_at"] = time.time()
+            entry["handshakes"] = entry.get("handshakes", 0) + 1
+            if device_id:
+                entry["device_id"] = device_id
+
+    def due_for_refresh(self, now: Optional[float] = None) -> List[str]:
+        now = time.monotonic() if now is None else now
+        threshold = self.lifetime * SESSION_REFRESH_FRACTION
+        return [ip for ip, at in self.established_at.items() if now - at >= threshold]
+
+    async def refresh_due(self):
+        for ip in self.due_for_refresh():
+            start = time.perf_counter()
+            try:
+                await self.sessions[ip].refresh_session()
+                self.established_at[ip] = time.monotonic()
+                self.refreshes += 1
+                logger.info(f"Refreshed Tapo session for {ip} in {(time.perf_counter() - start) * 1000:.0f} ms")
+            except Exception as e:
+                # Drop it and let the registry reconnect lazily on next use.
+                self.refresh_failures += 1
+                self.forget(ip)
+                if self.on_expired is not None:
+                    self.on_expired(ip)
+                logger.warning(f"Could not refresh Tapo session for {ip}: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SESSION_CHECK_INTERVAL)
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                logger.error(f"Tapo session refresh loop failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.save()
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "session_age": {ip: round(now - at, 1) for ip, at in self.established_at.items()},
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
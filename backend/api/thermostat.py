@@ -0,0 +1,464 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from api.metrics import LatencyHistogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THERMOSTAT_FILE = os.getenv("THERMOSTAT_CONFIG_FILE", os.path.join(BACKEND_DIR, "thermostat.json"))
+THERMOSTAT_STATE_FILE = os.getenv(
+    "THERMOSTAT_STATE_FILE", os.path.join(BACKEND_DIR, "data", "thermostat_state.json")
+)
+
+MODES = ("off", "heat", "auto")
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DAY_GROUPS = {"daily": DAYS, "weekdays": DAYS[:5], "weekend": DAYS[5:]}
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+class HysteresisController:
+    """Bang-bang control: heat below `setpoint - band`, stop above `setpoint + band`.
+
+    Inside the band the previous decision holds, so a reading hovering
+    around the setpoint does not chatter the relay.
+    """
+
+    kind = "hysteresis"
+
+    def __init__(self, band: float = 0.5):
+        self.band = band
+        self.heating = False
+
+    def update(self, temperature: float, setpoint: float, dt: float) -> float:
+        if temperature <= setpoint - self.band:
+            self.heating = True
+        elif temperature >= setpoint + self.band:
+            self.heating = False
+        return 1.0 if self.heating else 0.0
+
+    def reset(self):
+        self.heating = False
+
+    def status(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "band": self.band, "heating": self.heating}
+
+
+class PIDController:
+    """PID on the temperature error, giving a heating duty cycle between 0 and 1.
+
+    The derivative acts on the measurement, so a setpoint change does not
+    kick the output, and the integral stops growing while the output is
+    saturated (no windup through a long warm-up).
+    """
+
+    kind = "pid"
+
+    def __init__(self, kp: float = 0.5, ki: float = 0.002, kd: float = 0.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral = 0.0
+        self.output = 0.0
+        self._last_temperature: Optional[float] = None
+
+    def update(self, temperature: float, setpoint: float, dt: float) -> float:
+        error = setpoint - temperature
+        derivative = 0.0
+        if self._last_temperature is not None and dt > 0:
+            derivative = -(temperature - self._last_temperature) / dt
+        self._last_temperature = temperature
+
+        integral = self.integral + error * dt
+        output = self.kp * error + self.ki * integral + self.kd * derivative
+        clamped = min(max(output, 0.0), 1.0)
+        # Only integrate while unsaturated, or when the error pulls back out of saturation.
+        if output == clamped or (output > 1.0 and error < 0) or (output < 0.0 and error > 0):
+            self.integral = integral
+        self.output = clamped
+        return clamped
+
+    def reset(self):
+        self.integral = 0.0
+        self.output = 0.0
+        self._last_temperature = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "kp": self.kp, "ki": self.ki, "kd": self.kd,
+                "integral": round(self.integral, 4), "output": round(self.output, 4)}
+
+
+class WeeklySchedule:
+    """Setpoints that take effect at a day and time and hold until the next entry.
+
+    Entries wrap around the week, so early Monday follows Sunday's last one.
+    """
+
+    def __init__(self, entries: Optional[List[Tuple[int, float]]] = None):
+        # (minute of the week, temperature), sorted.
+        self.entries = sorted(entries or [])
+
+    @classmethod
+    def from_list(cls, data: List[Mapping[str, Any]]) -> "WeeklySchedule":
+        """`[{"days": ["mon", "tue"] or "weekdays", "time": "06:30", "temperature": 21.0}, ...]`"""
+        entries = []
+        for item in data:
+            days = item.get("days", "daily")
+            if isinstance(days, str):
+                days = DAY_GROUPS.get(days, (days,))
+            hours, minutes = (int(part) for part in item["time"].split(":"))
+            if not (0 <= hours < 24 and 0 <= minutes < 60):
+                raise ValueError(f"Invalid time '{item['time']}'")
+            for day in days:
+                if day not in DAYS:
+                    raise ValueError(f"Unknown day '{day}'")
+                entries.append((DAYS.index(day) * 1440 + hours * 60 + minutes, float(item["temperature"])))
+        return cls(entries)
+
+    @staticmethod
+    def minute_of_week(when: datetime) -> int:
+        return when.weekday() * 1440 + when.hour * 60 + when.minute
+
+    def _position(self, when: datetime) -> int:
+        """Index of the entry in effect at `when`; -1 wraps to the last one."""
+        minute = self.minute_of_week(when)
+        index = -1
+        for i, (start, _) in enumerate(self.entries):
+            if start > minute:
+                break
+            index = i
+        return index
+
+    def setpoint_at(self, when: datetime) -> Optional[float]:
+        if not self.entries:
+            return None
+        return self.entries[self._position(when)][1]
+
+    def next_change(self, when: datetime) -> Optional[Dict[str, Any]]:
+        if not self.entries:
+            return None
+        start, temperature = self.entries[(self._position(when) + 1) % len(self.entries)]
+        return {"day": DAYS[start // 1440], "time": f"{start % 1440 // 60:02d}:{start % 60:02d}",
+                "temperature": temperature}
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [{"day": DAYS[start // 1440], "time": f"{start % 1440 // 60:02d}:{start % 60:02d}",
+                 "temperature": temperature} for start, temperature in self.entries]
+
+
+class ThermostatConfig:
+    def __init__(self, outlet: str, controller: str = "hysteresis", band: float = 0.5,
+                 pid: Optional[Mapping[str, float]] = None, cycle_seconds: float = 600.0,
+                 interval: float = 10.0, min_switch_seconds: float = 120.0, max_reading_age: float = 60.0,
+                 limits: Tuple[float, float] = (5.0, 30.0), default_temperature: float = 20.0,
+                 schedule: Optional[WeeklySchedule] = None):
+        if controller not in ("hysteresis", "pid"):
+            raise ValueError(f"Unknown controller '{controller}'")
+        self.outlet = outlet
+        self.controller = controller
+        self.band = band
+        self.pid = dict(pid or {})
+        self.cycle_seconds = cycle_seconds
+        self.interval = interval
+        self.min_switch_seconds = min_switch_seconds
+        self.max_reading_age = max_reading_age
+        self.limits = limits
+        self.default_temperature = default_temperature
+        self.schedule = schedule or WeeklySchedule()
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ThermostatConfig":
+        pid = data.get("pid", {})
+        return cls(
+            outlet=data["outlet"],
+            controller=data.get("controller", "hysteresis"),
+            band=float(data.get("hysteresis", 0.5)),
+            pid={key: float(pid[key]) for key in ("kp", "ki", "kd") if key in pid},
+            cycle_seconds=float(pid.get("cycle_seconds", 600)),
+            interval=float(data.get("interval", 10)),
+            min_switch_seconds=float(data.get("min_switch_seconds", 120)),
+            max_reading_age=float(data.get("max_reading_age", 60)),
+            limits=tuple(float(limit) for limit in data.get("limits", (5, 30))),
+            default_temperature=float(data.get("default_temperature", 20)),
+            schedule=WeeklySchedule.from_list(data.get("schedule", [])),
+        )
+
+    def build_controller(self):
+        if self.controller == "pid":
+            return PIDController(**self.pid)
+        return HysteresisController(self.band)
+
+
+def load_thermostat_config(path: str = THERMOSTAT_FILE) -> Optional[ThermostatConfig]:
+    """Read the thermostat from JSON, e.g.
+
+        {"outlet": "heater", "controller": "pid", "pid": {"kp": 0.5, "ki": 0.002, "cycle_seconds": 600},
+         "schedule": [{"days": "weekdays", "time": "06:30", "temperature": 21},
+                      {"days": "daily", "time": "22:30", "temperature": 17}]}
+
+    Without the file there is no thermostat.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return ThermostatConfig.from_dict(json.load(f))
+    except (OSError, KeyError, ValueError, TypeError) as e:
+        logger.error(f"Invalid thermostat configuration in {path}: {e}")
+        return None
+
+
+class Thermostat:
+    """Drives a heater outlet from the sampler's cached temperature on a fixed cadence.
+
+    Ticks are scheduled on the monotonic clock like the sensor sampler:
+    from the previous tick rather than from "now", skipping missed ticks.
+    A PID duty cycle becomes relay time through time-proportioning over
+    `cycle_seconds`; `min_switch_seconds` protects the relay from short
+    cycling. Without a fresh, real temperature the heater is switched off.
+
+    The mode and the held setpoint survive restarts in a small JSON file.
+    """
+
+    def __init__(self, config: ThermostatConfig, snapshot_fn: Callable[[], Any],
+                 actuator: Callable[[str, bool], Awaitable[None]],
+                 state_path: Optional[str] = THERMOSTAT_STATE_FILE,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.config = config
+        self.snapshot_fn = snapshot_fn
+        self.actuator = actuator
+        self.state_path = state_path
+        self.clock = clock
+        self.controller = config.build_controller()
+        self.mode = "auto"
+        self.hold_temperature = config.default_temperature
+        self.temperature: Optional[float] = None
+        self.target_temperature: Optional[float] = None
+        self.duty = 0.0
+        self.status_text = "idle"
+        # None until the relay is in a known state; the first tick always actuates.
+        self.relay_on: Optional[bool] = None
+        self.last_switch = float("-inf")
+        self.cycle_start = time.monotonic()
+        self.ticks = 0
+        self.actuations = 0
+        self.failures = 0
+        self.lag = LatencyHistogram()
+        self.last_lag = 0.0
+        self.skipped_ticks = 0
+        self._last_tick: Optional[float] = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = asyncio.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._load_state()
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get("mode") in MODES:
+                self.mode = state["mode"]
+            if state.get("hold_temperature") is not None:
+                self.hold_temperature = self._clamp(float(state["hold_temperature"]))
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Could not read thermostat state from {self.state_path}: {e}")
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"mode": self.mode, "hold_temperature": self.hold_temperature}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _clamp(self, temperature: float) -> float:
+        low, high = self.config.limits
+        return min(max(temperature, low), high)
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """Register a function called with the summary after every tick."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def current_target(self) -> Optional[float]:
+        if self.mode == "off":
+            return None
+        if self.mode == "auto":
+            scheduled = self.config.schedule.setpoint_at(self.clock())
+            if scheduled is not None:
+                return self._clamp(scheduled)
+        return self.hold_temperature
+
+    def read_temperature(self) -> Optional[float]:
+        snapshot = self.snapshot_fn()
+        if snapshot is None or snapshot.age > self.config.max_reading_age:
+            return None
+        # Never heat on fabricated readings.
+        if snapshot.readings.get("source") == "mock":
+            return None
+        temperature = snapshot.readings.get("temperature")
+        return float(temperature) if temperature is not None else None
+
+    async def set_mode(self, mode: str, temperature: Optional[float] = None):
+        """Change the mode; `temperature` becomes the held setpoint.
+
+        "heat" holds it, "auto" follows the schedule and falls back to it
+        when the schedule is empty, "off" keeps the heater off.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {', '.join(MODES)}")
+        if temperature is not None:
+            low, high = self.config.limits
+            if not low <= temperature <= high:
+                raise ValueError(f"Temperature must be between {low} and {high}")
+            self.hold_temperature = float(temperature)
+        if mode != self.mode:
+            self.controller.reset()
+        self.mode = mode
+        await asyncio.to_thread(self._save_state)
+        if self._wake is not None:
+            self._wake.set()
+        else:
+            await self.tick()
+
+    async def tick(self):
+        """Take one control decision and switch the relay if it has to change."""
+        async with self._lock:
+            now = time.monotonic()
+            dt = now - self._last_tick if self._last_tick is not None else 0.0
+            self._last_tick = now
+            self.ticks += 1
+
+            self.temperature = self.read_temperature()
+            self.target_temperature = self.current_target()
+            if self.target_temperature is None:
+                self.controller.reset()
+                self.duty, self.status_text, want, forced = 0.0, "off", False, True
+            elif self.temperature is None:
+                self.controller.reset()
+                self.duty, self.status_text, want, forced = 0.0, "no_reading", False, True
+            else:
+                self.duty = self.controller.update(self.temperature, self.target_temperature, dt)
+                # Time-proportioning: on for the first `duty` share of each cycle.
+                cycle = self.config.cycle_seconds
+                if now - self.cycle_start >= cycle:
+                    self.cycle_start += (now - self.cycle_start) // cycle * cycle
+                want = self.duty >= 1.0 or (self.duty > 0.0 and now - self.cycle_start < self.duty * cycle)
+                forced = False
+                self.status_text = "heating" if want else "idle"
+
+            if want != self.relay_on:
+                # Switching off for safety is never delayed; normal decisions wait out the relay guard.
+                if forced or self.relay_on is None or now - self.last_switch >= self.config.min_switch_seconds:
+                    await self._switch(want, now)
+            if self.relay_on and self.status_text == "idle":
+                self.status_text = "heating"
+
+        summary = self.summary()
+        for callback in list(self._listeners):
+            try:
+                callback(summary)
+            except Exception as e:
+                logger.error(f"Thermostat listener {getattr(callback, '__name__', callback)} failed: {e}")
+
+    async def _switch(self, on: bool, now: float):
+        try:
+            await self.actuator(self.config.outlet, on)
+        except Exception as e:
+            self.failures += 1
+            # Unknown state: the next tick tries again.
+            self.relay_on = None
+            logger.error(f"Thermostat could not switch {self.config.outlet} {'ON' if on else 'OFF'}: {e}")
+            return
+        self.relay_on = on
+        self.last_switch = now
+        self.actuations += 1
+        logger.info(f"Thermostat switched {self.config.outlet} {'ON' if on else 'OFF'} "
+                    f"({self.temperature} -> {self.target_temperature})")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Thermostat started ({self.config.controller}, every {self.config.interval}s).")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wake = None
+        # Leave the heater off while nothing is watching it.
+        if self.relay_on is not False:
+            await self._switch(False, time.monotonic())
+
+    async def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            self.last_lag = max(time.monotonic() - next_tick, 0.0)
+            self.lag.observe(self.last_lag)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Thermostat tick failed: {e}")
+
+            next_tick += self.config.interval
+            now = time.monotonic()
+            if next_tick < now:
+                self.skipped_ticks += int((now - next_tick) // self.config.interval) + 1
+                next_tick = now
+            # A control change wakes the loop early; that extra tick leaves the cadence alone.
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), max(next_tick - time.monotonic(), 0.0))
+                except asyncio.TimeoutError:
+                    break
+                self._wake.clear()
+                try:
+                    await self.tick()
+                except Exception as e:
+                    logger.error(f"Thermostat tick failed: {e}")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "temperature": self.temperature,
+            "target_temperature": self.target_temperature,
+            "mode": self.mode,
+            "status": self.status_text,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            **self.summary(),
+            "outlet": self.config.outlet,
+            "relay_on": self.relay_on,
+            "duty": round(self.duty, 4),
+            "hold_temperature": self.hold_temperature,
+            "controller": self.controller.status(),
+            "schedule": self.config.schedule.to_list(),
+            "next_change": self.config.schedule.next_change(now) if self.mode == "auto" else None,
+            "ticks": self.ticks,
+            "actuations": self.actuations,
+            "failures": self.failures,
+            "skipped_ticks": self.skipped_ticks,
+            "loop_lag": self.lag.to_dict(),
+        }
@@ -0,0 +1,272 @@
+"""Load test for the backend API against simulated sensors and outlets.
+
+Run from backend/:
+
+    python -m benchmarks.load_test                     # in-process and over uvicorn
+    python -m benchmarks.load_test --mode inprocess --concurrency 32 --requests 2000
+    python -m benchmarks.load_test --save-baseline     # record benchmarks/baseline.json
+
+Every scenario is driven by `--concurrency` clients until `--requests`
+responses have been collected. The p50/p99 latency and the throughput are
+compared with the stored baseline. Runs that regress past `--tolerance`
+make the command exit non-zero. Baselines only mean something on the
+machine that recorded them, so record one per machine.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_REQUESTS = 1000
+DEFAULT_OUTLETS = 50
+DEFAULT_TOLERANCE = 0.25
+# Latency changes smaller than this are scheduler noise, whatever the ratio.
+MIN_REGRESSION_MS = 1.0
+SERVER_START_TIMEOUT = 60.0
+
+
+def simulation_env(data_dir: str, outlets: int) -> Dict[str, str]:
+    """Settings for a simulated backend whose files all live in `data_dir`."""
+    return {
+        "HARDWARE_BACKEND": "simulated",
+        "SIM_OUTLETS": str(outlets),
+        "SIM_SEED": "benchmark",
+        "SIMULATION_DATA_DIR": data_dir,
+        "SENSOR_HISTORY_DB": os.path.join(data_dir, "sensor_history.db"),
+        "SAMPLE_RING_FILE": os.path.join(data_dir, "sample_ring.bin"),
+        "OUTLET_SCENES_FILE": os.path.join(data_dir, "scenes.json"),
+        "AUTOMATION_RULES_FILE": os.path.join(data_dir, "rules.json"),
+        "TAPO_CONNECT_CONCURRENCY": "32",
+    }
+
+
+Request = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def scenarios(outlet_ids: List[str]) -> Dict[str, Callable[[int], Request]]:
+    """Scenario name -> function building the i-th request (method, path, json body)."""
+    sensor_names = ["temperature", "humidity", "pressure", "light", "motion"]
+    return {
+        "sensors_all": lambda i: ("GET", "/api/sensors/all", None),
+        "sensor_single": lambda i: ("GET", f"/api/sensors/{sensor_names[i % len(sensor_names)]}", None),
+        "outlets_all": lambda i: ("GET", "/api/outlets/", None),
+        "outlet_single": lambda i: ("GET", f"/api/outlets/{outlet_ids[i % len(outlet_ids)]}", None),
+        "outlet_control": lambda i: (
+            "POST", "/api/outlets/control",
+            {"outlet_id": outlet_ids[i % len(outlet_ids)], "status": bool(i // len(outlet_ids) % 2)},
+        ),
+        "lights": lambda i: ("GET", "/api/lights/", None),
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_scenario(client, build: Callable[[int], Request], concurrency: int, total: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, body = build(i)
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    # Warm caches and connections so the first requests do not skew p99.
+    for i in range(min(concurrency, total)):
+        method, path, body = build(i)
+        await client.request(method, path, json=body)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+async def run_all(client, outlet_ids: List[str], concurrency: int, total: int,
+                  only: Optional[List[str]]) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, build in scenarios(outlet_ids).items():
+        if only and name not in only:
+            continue
+        results[name] = await run_scenario(client, build, concurrency, total)
+        print_result(name, results[name])
+    return results
+
+
+async def bench_inprocess(args, data_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Drive `main.app` through an ASGI transport: measures the app, not the network stack."""
+    os.environ.update(simulation_env(data_dir, args.outlets))
+    sys.path.insert(0, BACKEND_DIR)
+    import httpx
+    from main import app
+    from api.routers import outlets
+    from api.startup import startup
+
+    async with app.router.lifespan_context(app):
+        # Devices connect in the background; measure once they are up.
+        await startup.wait()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_all(client, outlets.registry.outlet_ids(), args.concurrency, args.requests, args.scenario)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(client, process: subprocess.Popen):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            if (await client.get("/api/health/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+async def bench_uvicorn(args, data_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Run uvicorn in its own process and drive it over loopback HTTP."""
+    import httpx
+
+    port = free_port()
+    env = {**os.environ, **simulation_env(data_dir, args.outlets)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            await wait_for_server(client, process)
+            outlet_ids = sorted((await client.get("/api/outlets/")).json())
+            return await run_all(client, outlet_ids, args.concurrency, args.requests, args.scenario)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_result(name: str, result: Dict[str, Any]):
+    print(f"  {name:<16} p50 {result['p50_ms']:>9.2f} ms   p99 {result['p99_ms']:>9.2f} ms   "
+          f"{result['throughput_rps']:>9.1f} req/s   errors {result['errors']}")
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, Any]]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return one line per metric that is worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for mode, scenario_results in results.items():
+        for name, result in scenario_results.items():
+            reference = baseline.get("results", {}).get(mode, {}).get(name)
+            if reference is None:
+                continue
+            # The tail is noisier than the median, so p99 gets twice the slack.
+            for metric, slack in (("p50_ms", tolerance), ("p99_ms", 2 * tolerance)):
+                limit = max(reference[metric] * (1 + slack), reference[metric] + MIN_REGRESSION_MS)
+                if result[metric] > limit:
+                    regressions.append(f"{mode}/{name}: {metric} {result[metric]} vs baseline {reference[metric]}")
+            if result["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{mode}/{name}: throughput {result['throughput_rps']} vs baseline {reference['throughput_rps']}"
+                )
+            if result["errors"] > reference["errors"]:
+                regressions.append(f"{mode}/{name}: {result['errors']} errors vs baseline {reference['errors']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="requests per scenario")
+    parser.add_argument("--outlets", type=int, default=DEFAULT_OUTLETS, help="simulated outlets")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    # httpx logs every request at INFO; at benchmark rates that is what gets measured.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    with tempfile.TemporaryDirectory(prefix="smarthome-bench-") as data_dir:
+        # uvicorn first: in-process mode imports the app into this process.
+        if args.mode in ("uvicorn", "both"):
+            print(f"uvicorn ({args.concurrency} clients, {args.outlets} simulated outlets)")
+            results["uvicorn"] = asyncio.run(bench_uvicorn(args, os.path.join(data_dir, "uvicorn")))
+        if args.mode in ("inprocess", "both"):
+            print(f"in-process ({args.concurrency} clients, {args.outlets} simulated outlets)")
+            results["inprocess"] = asyncio.run(bench_inprocess(args, os.path.join(data_dir, "inprocess")))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "machine": platform.platform(),
+                "python": platform.python_version(),
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "outlets": args.outlets,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    settings = (baseline.get("concurrency"), baseline.get("requests"), baseline.get("outlets"))
+    if settings != (args.concurrency, args.requests, args.outlets):
+        print("Baseline was recorded with different settings; comparison skipped.")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""Edge agent for an extra Raspberry Pi in another room.
+
+Reads this Pi's sensors with the same code as the main backend and pushes
+batched readings to the central node, which serves them under /api/rooms.
+
+    EDGE_CENTRAL_URL=http://raspberrypi.local:8000 NODE_ROOM=bedroom python edge_agent.py
+"""
+from api.edge import EdgeAgent, EDGE_CENTRAL_URL
+from api.hardware import hardware
+from api.routers import sensors
+import asyncio
+import logging
+import signal
+import sys
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_agent():
+    agent = EdgeAgent(EDGE_CENTRAL_URL, log=sensors.sample_log)
+    await sensors.initialize_sensors()
+    sensors.sampler.add_listener(agent.on_snapshot)
+    sensors.motion_detector.add_listener(agent.on_motion)
+    sensors.sampler.start()
+    agent.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Edge agent is shutting down...")
+    await sensors.sampler.stop()
+    sensors.motion_detector.stop()
+    await agent.stop()
+    hardware.shutdown()
+    sensors.sample_log.close()
+    sensors.history.close()
+
+
+if __name__ == "__main__":
+    if not EDGE_CENTRAL_URL:
+        sys.exit("Set EDGE_CENTRAL_URL to the central node, e.g. http://raspberrypi.local:8000")
+    asyncio.run(run_agent())
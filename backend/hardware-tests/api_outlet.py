@@ -0,0 +1,58 @@
+# =============================================================================
+# Description:
+# Small helper shared by the Tapo test scripts. When the Smart Home API is
+# running it already holds a live, refreshed session with every plug, so
+# the scripts send their commands through it instead of performing their
+# own handshake with the plug. If the API is not reachable the scripts
+# fall back to connecting to the plug directly.
+#
+# The API address is read from SMART_HOME_API (default http://localhost:8000).
+# =============================================================================
+
+import asyncio
+import json
+import os
+import urllib.error
+import urllib.request
+
+API_URL = os.getenv("SMART_HOME_API", "http://localhost:8000")
+
+
+class ApiOutlet:
+    """Controls an outlet through the running API, reusing its Tapo session."""
+
+    def __init__(self, outlet_id="main_outlet", base_url=API_URL, timeout=5):
+        self.outlet_id = outlet_id
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    async def available(self):
+        try:
+            await self.get_state()
+            return True
+        except (urllib.error.URLError, OSError, ValueError):
+            return False
+
+    async def get_state(self):
+        return await asyncio.to_thread(self._request, "GET", f"/api/outlets/{self.outlet_id}")
+
+    async def on(self):
+        await self._control(True)
+
+    async def off(self):
+        await self._control(False)
+
+    async def _control(self, status):
+        await asyncio.to_thread(
+            self._request, "POST", "/api/outlets/control",
+            {"outlet_id": self.outlet_id, "status": status},
+        )
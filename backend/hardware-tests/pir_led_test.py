@@ -6,8 +6,9 @@
 #
 # The logic is stateful, meaning the LED is only turned on or off when
 # a *change* in the motion state is detected (i.e., when motion starts
-# or when it stops). This prevents constant re-triggering and provides
-# a clean, real-time response.
+# or when it stops). Instead of polling the pin, lgpio calls us back on
+# every debounced edge, so the LED reacts within milliseconds and the
+# script sleeps the rest of the time.
 #
 # Hardware Setup:
 # - An LED is connected to GPIO 17 via a 330 Ohm current-limiting resistor.
@@ -22,44 +23,48 @@ import time
 
 led_pin = 17
 pir_pin = 4
+debounce_us = 5000
 
 h = None
+motion_callback = None
+
+
+def on_motion_edge(chip, gpio, level, timestamp):
+    # Called by lgpio's alert thread. Level 2 means a watchdog timeout.
+    if level == 1:
+        print("Motion Started! -> LED ON")
+        lgpio.gpio_write(h, led_pin, 1)
+    elif level == 0:
+        print("Motion Stopped! -> LED OFF")
+        lgpio.gpio_write(h, led_pin, 0)
+
 
 try:
     h = lgpio.gpiochip_open(0)
     
-    lgpio.gpio_claim_input(h, pir_pin, lgpio.SET_PULL_DOWN)
+    lgpio.gpio_claim_alert(h, pir_pin, lgpio.BOTH_EDGES, lgpio.SET_PULL_DOWN)
+    lgpio.gpio_set_debounce_micros(h, pir_pin, debounce_us)
     lgpio.gpio_claim_output(h, led_pin)
 
     print("Real-time motion sensor activated... (Press CTRL+C to exit)")
     print("----------------------------------------------------------")
 
-    led_is_on = False  
     lgpio.gpio_write(h, led_pin, 0) 
 
     print("Sensor is stabilizing, please wait 10 seconds...")
     time.sleep(10)
+    motion_callback = lgpio.callback(h, pir_pin, lgpio.BOTH_EDGES, on_motion_edge)
     print("Sensor ready. Awaiting motion.")
 
     while True:
-        motion_detected = lgpio.gpio_read(h, pir_pin)
-
-        if motion_detected and not led_is_on:
-            print("Motion Started! -> LED ON")
-            lgpio.gpio_write(h, led_pin, 1) 
-            led_is_on = True 
-
-        elif not motion_detected and led_is_on:
-            print("Motion Stopped! -> LED OFF")
-            lgpio.gpio_write(h, led_pin, 0) 
-            led_is_on = False 
-        
-        time.sleep(0.1)
+        time.sleep(1)
 
 except KeyboardInterrupt:
     print("\nProgram terminated by user.")
 
 finally:
+    if motion_callback is not None:
+        motion_callback.cancel()
     if h is not None:
         print("Exiting program... Turning LED off and cleaning up pins.")
         lgpio.gpio_write(h, led_pin, 0)
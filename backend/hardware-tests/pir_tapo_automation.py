@@ -3,7 +3,13 @@
 # It monitors an HC-SR501 PIR motion sensor and controls a TP-Link Tapo
 # P110 smart plug in response to motion events. When motion is detected,
 # the plug is turned on; when motion stops, the plug is turned off.
-# This script uses the 'tapo' library for plug control.
+# This script uses the 'tapo' library for plug control. Motion edges are
+# delivered by lgpio callbacks and handed to the asyncio loop through a
+# queue, so there is no polling delay between motion and the plug command.
+#
+# In the running API the same behaviour is an automation rule (see
+# rules.example.json), evaluated in-process without a second GPIO claim.
+# Stop the API before running this script: both cannot claim GPIO 4.
 #
 # Hardware Setup:
 # - PIR Sensor OUT pin is connected to GPIO 4.
@@ -16,11 +22,13 @@ import asyncio
 import os
 from dotenv import load_dotenv
 from tapo import ApiClient
-import time
+
+from api_outlet import ApiOutlet
 
 load_dotenv()
 
 PIR_PIN = 4
+DEBOUNCE_US = 5000
 
 TAPO_USERNAME = os.getenv("TAPO_USERNAME")
 TAPO_PASSWORD = os.getenv("TAPO_PASSWORD")
@@ -29,14 +37,28 @@ IP_ADDRESS = os.getenv("TAPO_IP")
 
 async def main():
    
+    loop = asyncio.get_running_loop()
+    motion_events = asyncio.Queue()
+
+    def on_motion_edge(chip, gpio, level, timestamp):
+        # Runs on lgpio's alert thread; level 2 is a watchdog timeout.
+        if level in (0, 1):
+            loop.call_soon_threadsafe(motion_events.put_nowait, bool(level))
+
     gpio_handle = lgpio.gpiochip_open(0)
-    lgpio.gpio_claim_input(gpio_handle, PIR_PIN)
+    lgpio.gpio_claim_alert(gpio_handle, PIR_PIN, lgpio.BOTH_EDGES)
+    lgpio.gpio_set_debounce_micros(gpio_handle, PIR_PIN, DEBOUNCE_US)
     print("PIR sensor is ready to detect motion.")
 
     try:
-        client = ApiClient(TAPO_USERNAME, TAPO_PASSWORD)
-        tapo_device = await client.p110(IP_ADDRESS)
-        print(f"Successfully connected to Tapo Plug ({IP_ADDRESS}).")
+        # Prefer the API's already-established plug session over a new handshake.
+        tapo_device = ApiOutlet()
+        if await tapo_device.available():
+            print(f"Using the Smart Home API at {tapo_device.base_url} for the plug.")
+        else:
+            client = ApiClient(TAPO_USERNAME, TAPO_PASSWORD)
+            tapo_device = await client.p110(IP_ADDRESS)
+            print(f"Successfully connected to Tapo Plug ({IP_ADDRESS}).")
     except Exception as e:
         print(f"ERROR: Could not connect to Tapo Plug! -> {e}")
         lgpio.gpiochip_close(gpio_handle) 
@@ -47,10 +69,11 @@ async def main():
     print("-------------------------------------------------")
     
     plug_is_on = False 
+    motion_callback = lgpio.callback(gpio_handle, PIR_PIN, lgpio.BOTH_EDGES, on_motion_edge)
     
     try:
         while True:
-            motion_detected = lgpio.gpio_read(gpio_handle, PIR_PIN)
+            motion_detected = await motion_events.get()
 
             if motion_detected and not plug_is_on:
                 print("Motion Detected! -> Turning Plug ON...")
@@ -61,14 +84,13 @@ async def main():
                 print("...Motion Stopped. -> Turning Plug OFF...")
                 await tapo_device.off()
                 plug_is_on = False
-            
-            await asyncio.sleep(0.5) 
 
     except (KeyboardInterrupt, asyncio.CancelledError):
         print("\nProgram terminated by user.")
 
     finally:
         print("Exiting program... Cleaning up GPIO.")
+        motion_callback.cancel()
         lgpio.gpiochip_close(gpio_handle)
 
 
@@ -17,6 +17,9 @@
 # - tapo (ApiClient): A community-developed library for controlling
 #   TP-Link Tapo devices locally.
 # - asyncio: Used to handle the asynchronous communication with the device.
+#
+# If the Smart Home API is running, commands are sent through it so that its
+# existing plug session is reused instead of doing a fresh handshake.
 # =============================================================================
 
 
@@ -28,6 +31,8 @@ from datetime import datetime
 from tapo import ApiClient
 from tapo.requests import EnergyDataInterval
 
+from api_outlet import ApiOutlet
+
 load_dotenv()
 
 TAPO_USERNAME = os.getenv("TAPO_USERNAME")
@@ -40,13 +45,18 @@ async def main():
     Connects to the Tapo P110 plug and enters an interactive loop
     to control it from the command line.
     """
+    device = ApiOutlet()
+    use_api = await device.available()
+
     try:
-        
-        client = ApiClient(TAPO_USERNAME, TAPO_PASSWORD)
-        device = await client.p110(IP_ADDRESS)
-        device_info = await device.get_device_info()
-        device_name = device_info.to_dict().get("nickname", IP_ADDRESS)
-        print(f"Successfully connected to the plug named '{device_name}'.")
+        if use_api:
+            print(f"Using the Smart Home API at {device.base_url} (shared plug session).")
+        else:
+            client = ApiClient(TAPO_USERNAME, TAPO_PASSWORD)
+            device = await client.p110(IP_ADDRESS)
+            device_info = await device.get_device_info()
+            device_name = device_info.to_dict().get("nickname", IP_ADDRESS)
+            print(f"Successfully connected to the plug named '{device_name}'.")
         print("-------------------------------------------------")
 
     except Exception as e:
@@ -75,6 +85,12 @@ async def main():
             elif command == "status":
                 print("--- Plug Status ---")
 
+                if use_api:
+                    state = await device.get_state()
+                    print(f"  State: {'ON' if state.get('on') else 'OFF'}")
+                    print("---------------------")
+                    continue
+
                 info = await device.get_device_info()
                 energy = await device.get_energy_usage()
                 
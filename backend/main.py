@@ -1,6 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from api.routers import sensors, lights, outlets, thermostat
+from api.routers import sensors, lights, outlets, thermostat, stream, rules, metrics, rooms, health
+from api.hardware import hardware
+from api.metrics import RequestMetricsMiddleware, event_loop_monitor
+from api.encoding import FastJSONResponse
+from api.ipc import RemoteCallError, deployment
+from api.startup import startup
+from api.supervisor import supervisor
 from contextlib import asynccontextmanager
 import logging
 
@@ -8,16 +15,79 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def start_sensors():
+    await sensors.initialize_sensors()
+    sensors.motion_detector.add_listener(sensors.publish_motion)
+    await sensors.history_flusher.start()
+    sensors.sampler.add_listener(sensors.record_sample)
+    sensors.sampler.add_listener(sensors.publish_stream)
+    sensors.sampler.add_listener(sensors.share_snapshot)
+    sensors.sampler.add_listener(rules.engine.on_snapshot)
+    sensors.sampler.add_listener(rooms.record_local)
+    sensors.motion_detector.add_listener(rules.engine.on_motion)
+    sensors.sampler.start()
+
+
+async def start_outlets():
+    await outlets.initialize_tapo_devices()
+    outlets.start_outlet_poller()
+    outlets.energy_collector.start()
+
+
+async def start_hardware():
+    """Open the devices and start everything that talks to them, in the process that owns the hardware.
+
+    Slow devices initialize in the background: the API serves as soon as
+    this returns and /api/health/ready reports when they are done.
+    """
+    startup.launch("sensors", start_sensors, sensors.device_status)
+    startup.launch("outlets", start_outlets, outlets.device_status)
+    startup.launch("lights", lights.initialize_lights, lights.device_status)
+    # Switching the heater fails (and is retried) until its outlet connects.
+    thermostat.initialize_thermostat()
+    # Reopens sensors and reconnects plugs whose circuit breaker has opened.
+    sensors.supervise_sensors(supervisor)
+    outlets.registry.supervise(supervisor)
+    lights.bulb_registry.supervise(supervisor, "bulb")
+    supervisor.start()
+    if deployment.mode == "shared":
+        stream.start_forwarding()
+
+
+async def stop_hardware():
+    await startup.cancel()
+    await supervisor.stop()
+    await stream.stop_forwarding()
+    await rules.engine.stop()
+    # Before the outlets go away: it switches the heater off on the way out.
+    await thermostat.stop_thermostat()
+    await outlets.stop_outlet_poller()
+    await outlets.sessions.stop()
+    await outlets.energy_collector.stop()
+    await sensors.sampler.stop()
+    sensors.motion_detector.stop()
+    hardware.shutdown()
+    await sensors.history_flusher.stop()
+    sensors.sample_log.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application is starting up...")
-    sensors.initialize_sensors() 
-    await outlets.initialize_tapo_devices() 
+    event_loop_monitor.start()
+    # WORKER_MODE=shared: only one worker process opens the devices.
+    await deployment.start(start_hardware)
     yield
     logger.info("Application is shutting down...")
+    await deployment.stop(stop_hardware)
+    sensors.history.close()
+    lights.store.close()
+    await event_loop_monitor.stop()
     
 
-app = FastAPI(title="Smart Home AI API", version="1.0.0", lifespan=lifespan)
+# orjson for every JSON response when it is installed (JSON_ENCODER=std to opt out).
+app = FastAPI(title="Smart Home AI API", version="1.0.0", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,12 +95,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(RequestMetricsMiddleware)
+
+
+@app.exception_handler(RemoteCallError)
+async def remote_call_error(request: Request, exc: RemoteCallError):
+    """An error from the hardware owner, answered as if this worker had raised it."""
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
 
 app.include_router(sensors.router)
 app.include_router(lights.router)
 app.include_router(outlets.router)
 app.include_router(thermostat.router)
+app.include_router(stream.router)
+app.include_router(rules.router)
+app.include_router(rooms.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 @app.get("/")
 def read_root():
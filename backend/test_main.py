@@ -1,9 +1,61 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import MappingProxyType, SimpleNamespace
+
+import httpx
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from main import app
+from api import encoding, sensor_profiles, simulation
+from api.bme280 import DATA_REGISTER, MODE_FORCE, STATUS_REGISTER, burst_read, compensate
+from api.conditional import etag_matches, response_cache
+from api.edge import EdgeAgent
+from api.energy import EnergyCollector, EnergySeries
+from api.hardware import HardwareLayer, HardwareTimeoutError
+from api.history import HistoryStore
+from api.ipc import Deployment, OwnerUnavailableError, RemoteCallError, handler
+from api.light_drivers import GPIOPWMDriver, LightConfig, TapoBulbDriver, bulb_configs
+from api.light_store import LightStore
+from api.motion import MotionDetector
+from api.outlet_cache import OutletStateCache
+from api.outlet_registry import OutletConfig, OutletRegistry, OutletUnavailableError, load_outlet_configs
+from api.rooms import RoomAggregator
+from api.routers import lights, outlets, rooms, sensors, stream
+from api.rules import Rule, RulesEngine
+from api.sample_log import HEADER_SIZE, HistoryFlusher, RECORD, SampleRing
+from api.sampler import SensorSnapshot
+from api.scenes import SceneStore
+from api.startup import DeviceStartup, LazyModule, import_optional
+from api.stream import StreamHub
+from api.supervisor import CircuitBreaker, HealthSupervisor
+from api.tapo_sessions import TapoSessionManager
+from api.thermostat import HysteresisController, PIDController, Thermostat, ThermostatConfig, WeeklySchedule
 
 client = TestClient(app)
 
+
+@pytest.fixture
+def anyio_backend():
+    """`@pytest.mark.anyio` tests run on asyncio, like the app."""
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def light_store(tmp_path, monkeypatch):
+    """Every test switches lights in its own store, never in data/lights.db."""
+    store = LightStore(str(tmp_path / "lights.db"), rooms=lights.light_configs)
+    monkeypatch.setattr(lights, "store", store)
+    response_cache.forget("lights")
+    yield store
+    response_cache.forget("lights")
+    store.close()
+
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -21,16 +73,29 @@ def test_get_sensors():
 
     for endpoint in endpoints:
         response = client.get(endpoint)
-        # Since no hardware is connected, this should return 503 error
-        assert response.status_code == 503
-        assert "detail" in response.json()
+        # Without hardware the sampler serves mock readings instead of failing
+        assert response.status_code == 200
+        assert "sequence" in response.json()
+
+    response = client.get("/api/sensors/unknown")
+    assert response.status_code == 404
+
+def test_single_sensor_before_first_read(sampler, monkeypatch):
+    # A reading that has never succeeded is null, not a KeyError.
+    sampler.readings = {"source": "real"}
+    monkeypatch.setattr(sensors.sampler, "get_snapshot", sampler.get_snapshot)
+    assert client.get("/api/sensors/temperature").json()["temperature"] is None
+    assert client.get("/api/sensors/light").json()["light_level"] is None
 
 def test_get_sensors_all():
     # Test the combined endpoint (deprecated - system now uses individual endpoints)
     response = client.get("/api/sensors/all")
-    # Since no hardware is connected, this should return 500 error
-    assert response.status_code == 500
-    assert "detail" in response.json()
+    # Since no hardware is connected, this should return mock data
+    assert response.status_code == 200
+    data = response.json()
+    assert data["source"] == "mock"
+    for key in ("temperature", "humidity", "pressure", "light", "motion_detected"):
+        assert key in data
 
 def test_get_lights():
     response = client.get("/api/lights/")
@@ -43,34 +108,1585 @@ def test_get_lights():
 
 def test_get_thermostat():
     response = client.get("/api/thermostat/")
-    # Since thermostat functionality was removed, this should return 404 error
-    assert response.status_code == 404
+    # Without a thermostat.json there is no thermostat, so this should return 503 error
+    assert response.status_code == 503
 
 def test_control_lights():
     # Test turning on living room light
     response = client.post("/api/lights/", json={
         "room": "living_room",
-        "status": True,
-        "brightness": 80
+        "status": True
     })
     assert response.status_code == 200
     data = response.json()
     assert "message" in data
-    assert data["data"]["status"] == True
-    assert data["data"]["brightness"] == 80
+    assert data["data"]["on"] == True
+    assert client.get("/api/lights/").json()["living_room"]["on"] == True
 
-    # Test turning off living room light (should set brightness to 0)
+    # Test turning off living room light
     response = client.post("/api/lights/", json={
         "room": "living_room",
-        "status": False,
-        "brightness": 0  # Explicitly set brightness to 0 when turning off
+        "status": False
     })
     assert response.status_code == 200
     data = response.json()
-    assert data["data"]["status"] == False
-    assert data["data"]["brightness"] == 0
+    assert data["data"]["on"] == False
+
+    # Unknown rooms are rejected
+    response = client.post("/api/lights/", json={"room": "garage", "status": True})
+    assert response.status_code == 404
 
 def test_get_devices():
     response = client.get("/api/devices/")
     # Since no hardware is connected, this should return 404 (route doesn't exist)
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_sensors_served_from_snapshot():
+    first = client.get("/api/sensors/all").json()
+    assert "sequence" in first
+    assert "age" in first
+
+    # Without the background sampler running, repeated reads must reuse the
+    # published snapshot instead of touching the hardware again.
+    second = client.get("/api/sensors/temperature").json()
+    assert second["sequence"] == first["sequence"]
+    assert second["temperature"] == first["temperature"]
+
+
+BASE_HOUR = 1_700_000_000 - (1_700_000_000 % 3600)
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def sensor_history(history, tmp_path, monkeypatch):
+    """The sensors router's history, sample ring and flusher, all on tmp_path."""
+    ring = SampleRing(str(tmp_path / "sample_ring.bin"))
+    monkeypatch.setattr(sensors, "history", history)
+    monkeypatch.setattr(sensors, "sample_log", ring)
+    monkeypatch.setattr(sensors, "history_flusher", HistoryFlusher(ring, history))
+    yield history
+    ring.close()
+
+
+def test_history_rollups(history):
+    for i, temperature in enumerate([20.0, 22.0, 24.0]):
+        history.append(BASE_HOUR + i * 10, {"temperature": temperature, "motion_detected": i == 0})
+
+    minute = history.query(BASE_HOUR, BASE_HOUR + 60, "1m")
+    assert minute["temperature"] == [{"t": BASE_HOUR, "min": 20.0, "mean": 22.0, "max": 24.0}]
+    assert round(minute["motion_detected"][0]["mean"], 2) == 0.33
+    assert len(history.query(BASE_HOUR, BASE_HOUR + 60, "raw")["temperature"]) == 3
+
+
+def test_history_resolution_follows_the_range(history):
+    # A 30-day range must be answered from the hourly rollup, not raw rows.
+    assert history.pick_resolution(BASE_HOUR - 30 * 86400, BASE_HOUR, now=BASE_HOUR) == "1h"
+    assert history.pick_resolution(BASE_HOUR - 600, BASE_HOUR, now=BASE_HOUR) == "raw"
+
+
+def test_get_sensor_history(sensor_history):
+    response = client.get("/api/sensors/history", params={"sensor": "temperature"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["resolution"] == "1m"
+    assert data["points"] == {"temperature": []}
+
+
+def test_get_sensor_history_unknown_sensor(sensor_history):
+    assert client.get("/api/sensors/history", params={"sensor": "nope"}).status_code == 404
+
+
+@pytest.fixture
+def hub():
+    """A stream hub with a short debounce window and room for two events per subscriber."""
+    return StreamHub(debounce=0.05, queue_size=2)
+
+
+def test_stream_hub_sends_changes(hub):
+    subscriber = hub.subscribe()
+    hub.publish("sensors", {"temperature": 21.0, "humidity": 40})
+    assert subscriber.queue.get_nowait() == {"topic": "sensors", "data": {"temperature": 21.0, "humidity": 40}}
+
+
+@pytest.mark.anyio
+async def test_stream_hub_coalesces_changes_in_the_debounce_window(hub):
+    subscriber = hub.subscribe()
+    hub.publish("sensors", {"temperature": 21.0, "humidity": 40})
+    subscriber.queue.get_nowait()
+
+    # Unchanged fields are not resent; changes inside the window are
+    # flushed once with the latest value.
+    hub.publish("sensors", {"temperature": 21.5, "humidity": 40})
+    hub.publish("sensors", {"temperature": 22.0, "humidity": 40})
+    assert subscriber.queue.empty()
+    await asyncio.sleep(0.1)
+    assert subscriber.queue.get_nowait() == {"topic": "sensors", "data": {"temperature": 22.0}}
+
+
+def test_stream_hub_sends_current_state_on_subscribe(hub):
+    hub.publish("sensors", {"temperature": 22.0, "humidity": 40})
+    late = hub.subscribe(["sensors"])
+    assert late.queue.get_nowait()["data"] == {"temperature": 22.0, "humidity": 40}
+    assert late.queue.empty()
+
+
+@pytest.mark.anyio
+async def test_stream_hub_drops_slow_clients(hub):
+    slow = hub.subscribe()
+    other_topic = hub.subscribe(["sensors"])
+    for value in range(3):
+        hub.publish("outlets", {"main_outlet": {"on": bool(value % 2)}})
+        await asyncio.sleep(0.06)
+    assert slow.dropped and hub.subscriber_count == 1
+    assert other_topic.queue.empty()
+
+
+def test_motion_edges_skip_the_stream_debounce(hub, monkeypatch):
+    monkeypatch.setattr(sensors, "stream_hub", hub)
+    subscriber = hub.subscribe()
+    sensors.publish_motion({"type": "motion_start"})
+    sensors.publish_motion({"type": "motion_end"})
+    assert [subscriber.queue.get_nowait()["data"] for _ in range(2)] == [
+        {"motion_detected": True}, {"motion_detected": False},
+    ]
+
+
+SECOND_NS = 1_000_000_000
+
+
+@pytest.fixture
+def detector():
+    return MotionDetector(holdoff=2.0, history_size=3)
+
+
+def test_motion_detector_records_edges(detector):
+    assert detector.record(True, tick=0)["type"] == "motion_start"
+    assert detector.record(True, tick=1) is None
+    assert detector.record(False, tick=SECOND_NS)["type"] == "motion_end"
+    assert detector.status()["last_motion_at"] is not None
+
+
+def test_motion_retrigger_in_holdoff_is_not_an_event(detector):
+    detector.record(True, tick=0)
+    detector.record(False, tick=SECOND_NS)
+    # Neither the retrigger nor its end is recorded, so no motion_end is left unpaired.
+    assert detector.record(True, tick=SECOND_NS + 1) is None
+    assert detector.record(False, tick=3 * SECOND_NS) is None
+    assert detector.record(True, tick=5 * SECOND_NS)["type"] == "motion_start"
+
+    status = detector.status()
+    assert (status["event_count"], status["retrigger_count"]) == (2, 1)
+    assert [event["type"] for event in detector.recent_events()] == ["motion_start", "motion_end", "motion_start"]
+
+
+def test_get_motion_sensor():
+    data = client.get("/api/sensors/motion").json()
+    assert "motion_detected" in data
+    assert "last_motion_at" in data
+    assert "event_count" in data
+    assert "events" in client.get("/api/sensors/motion/events").json()
+
+
+def test_worker_motion_comes_from_the_owner(monkeypatch):
+    calls = []
+
+    async def call(name, **params):
+        calls.append(name)
+        return {"motion_detected": True, "event_count": 3}
+
+    monkeypatch.setattr(sensors, "deployment", SimpleNamespace(is_worker=True, call=call))
+    data = client.get("/api/sensors/motion").json()
+    assert calls == ["sensors.motion_status"]
+    assert data["motion_detected"] is True and data["event_count"] == 3
+
+
+@pytest.fixture
+def layer():
+    layer = HardwareLayer()
+    yield layer
+    layer.shutdown()
+
+
+@pytest.mark.anyio
+async def test_hardware_layer_serializes_a_bus(layer):
+    threads = set()
+
+    def read():
+        threads.add(threading.get_ident())
+        return 42
+
+    assert await asyncio.gather(*(layer.run("i2c-1", "bme280", read) for _ in range(5))) == [42] * 5
+    assert len(threads) == 1
+    assert layer.stats()["i2c-1"]["bme280"]["latency"]["count"] == 5
+
+
+@pytest.mark.anyio
+async def test_hardware_layer_times_out(layer):
+    with pytest.raises(HardwareTimeoutError):
+        await layer.run("i2c-1", "bh1750", time.sleep, 0.2, timeout=0.01)
+    assert layer.stats()["i2c-1"]["bh1750"]["timeouts"] == 1
+
+
+@pytest.fixture
+def cache():
+    return OutletStateCache(ttl=60)
+
+
+def fetcher(state, calls):
+    async def fetch():
+        read = dict(state)
+        calls.append(read)
+        await asyncio.sleep(0.01)
+        return read
+
+    return fetch
+
+
+@pytest.mark.anyio
+async def test_outlet_cache_single_flight(cache):
+    calls = []
+    fetch = fetcher({"on": False}, calls)
+    results = await asyncio.gather(*(cache.get("plug", fetch) for _ in range(10)))
+    assert results == [{"on": False}] * 10
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 9
+    assert await cache.get("plug", fetch) == {"on": False}
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_outlet_cache_keeps_a_write_over_an_older_query(cache):
+    fetch = fetcher({"on": False}, [])
+    pending = asyncio.create_task(cache.refresh("plug", fetch))
+    await asyncio.sleep(0)
+    cache.set("plug", {"on": True})
+    await pending
+    assert await cache.get("plug", fetch) == {"on": True}
+
+
+@pytest.mark.anyio
+async def test_outlet_confirmation_does_not_join_an_older_query(cache):
+    device, reads = {"on": False}, []
+    fetch = fetcher(device, reads)
+    stale = asyncio.create_task(cache.refresh("plug", fetch))
+    while not reads:
+        await asyncio.sleep(0)
+    device["on"] = True
+    cache.set("plug", {"on": True})
+    assert await cache.refresh("plug", fetch) == {"on": True}
+    assert await stale == {"on": False}
+    assert await cache.get("plug", fetch) == {"on": True}
+
+
+@pytest.fixture
+def outlets_file(tmp_path):
+    def write(*outlets):
+        path = tmp_path / "outlets.json"
+        path.write_text(json.dumps({"outlets": list(outlets)}))
+        return str(path)
+
+    return write
+
+
+def test_outlet_configs_skip_bad_entries(outlets_file):
+    path = outlets_file(
+        {"id": "ok", "ip": "10.0.0.1"},
+        {"id": "no_ip", "model": "p110"},
+        {"ip": "10.0.0.2", "model": "p100"},
+        {"ip": "10.0.0.3", "model": "p300", "sockets": {"desk": "first", "lamp": 2}},
+        "main_outlet",
+    )
+    assert set(load_outlet_configs(path)) == {"ok", "lamp"}
+
+
+class FakeStrip:
+    async def plug(self, position):
+        return f"socket-{position}"
+
+
+class FakeTapoClient:
+    """A P110 that answers, a P100 that never does and a P300 strip."""
+
+    def __init__(self):
+        self.strip_connects = 0
+
+    async def p110(self, ip):
+        return "plug"
+
+    async def p100(self, ip):
+        await asyncio.sleep(10)
+
+    async def p300(self, ip):
+        self.strip_connects += 1
+        return FakeStrip()
+
+
+@pytest.fixture
+def outlet_registry(outlets_file):
+    configs = load_outlet_configs(outlets_file(
+        {"id": "fast", "ip": "10.0.0.1", "model": "p110"},
+        {"id": "dead", "ip": "10.0.0.2", "model": "p100"},
+        {"ip": "10.0.0.3", "model": "p300", "sockets": {"desk": 1, "lamp": 2}},
+    ))
+    assert set(configs) == {"fast", "dead", "desk", "lamp"}
+    return OutletRegistry(configs, concurrency=2, timeout=0.05)
+
+
+@pytest.mark.anyio
+async def test_outlet_registry_connects_a_strip_once(outlet_registry):
+    tapo = FakeTapoClient()
+    await outlet_registry.connect_all(tapo)
+    assert outlet_registry.handlers == {"fast": "plug", "desk": "socket-1", "lamp": "socket-2"}
+    assert tapo.strip_connects == 1
+
+
+@pytest.mark.anyio
+async def test_unreachable_outlet_fails_fast_in_backoff(outlet_registry):
+    await outlet_registry.connect_all(FakeTapoClient())
+    with pytest.raises(OutletUnavailableError):
+        await outlet_registry.get("dead")
+    assert outlet_registry.status()["dead"]["failures"] == 1
+
+
+def test_get_all_outlets():
+    response = client.get("/api/outlets/")
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
+
+
+class FakePlug:
+    def __init__(self):
+        self.on_calls = 0
+
+    async def on(self):
+        self.on_calls += 1
+        await asyncio.sleep(0.05)
+
+    async def off(self):
+        await asyncio.sleep(0.05)
+
+
+@pytest.fixture
+def plugs(tmp_path, monkeypatch):
+    """Six connected fake plugs and an empty scene store behind the outlet endpoints."""
+    plugs = {f"plug_{i}": FakePlug() for i in range(6)}
+    registry = OutletRegistry({outlet_id: OutletConfig(outlet_id, "10.0.0.1") for outlet_id in plugs})
+    registry.client = object()
+    registry.handlers.update(plugs)
+    monkeypatch.setattr(outlets, "registry", registry)
+    monkeypatch.setattr(outlets, "scene_store", SceneStore(str(tmp_path / "scenes.json")))
+    return plugs
+
+
+def test_outlet_batch_runs_in_parallel(plugs):
+    response = client.post("/api/outlets/batch", json={"commands": [
+        {"outlet_id": outlet_id, "status": True} for outlet_id in plugs
+    ] + [{"outlet_id": "missing", "status": True}]})
+    data = response.json()
+    assert data["succeeded"] == 6 and data["failed"] == 1
+    # Dispatched in parallel: roughly one plug's latency, not six.
+    assert data["elapsed_ms"] < 250
+    assert all(plug.on_calls == 1 for plug in plugs.values())
+
+
+def test_outlet_scenes(plugs):
+    scene = {"plug_0": False, "plug_1": True}
+    assert client.put("/api/outlets/scenes/leave_home", json={"outlets": scene}).status_code == 200
+    assert client.get("/api/outlets/scenes").json() == {"leave_home": scene}
+    assert client.post("/api/outlets/scenes/leave_home/activate").json()["succeeded"] == 2
+    assert client.delete("/api/outlets/scenes/leave_home").status_code == 200
+    assert client.post("/api/outlets/scenes/leave_home/activate").status_code == 404
+
+
+def test_outlet_scene_with_unknown_outlet(plugs):
+    assert client.put("/api/outlets/scenes/bad", json={"outlets": {"nope": True}}).status_code == 400
+
+
+class FakeChildInfo:
+    def to_dict(self):
+        return {"device_id": "child-1"}
+
+
+class FakeChildSocket:
+    async def get_device_info(self):
+        return FakeChildInfo()
+
+
+class RecordingStrip:
+    """A P300 that records how each socket was opened and whether its session was refreshed."""
+
+    def __init__(self, calls, fail_refresh=False):
+        self.calls = calls
+        self.fail_refresh = fail_refresh
+
+    async def plug(self, position):
+        self.calls.append("plug")
+        return FakeChildSocket()
+
+    async def plug_unchecked(self, device_id):
+        self.calls.append(f"unchecked:{device_id}")
+        return FakeChildSocket()
+
+    async def refresh_session(self):
+        if self.fail_refresh:
+            raise RuntimeError("session expired")
+        self.calls.append("refresh")
+
+
+class StripClient:
+    def __init__(self, calls, fail_refresh=False):
+        self.calls = calls
+        self.fail_refresh = fail_refresh
+
+    async def p300(self, ip):
+        return RecordingStrip(self.calls, self.fail_refresh)
+
+
+STRIP_SOCKET = {"desk": OutletConfig("desk", "10.0.0.3", "p300", position=1)}
+
+
+@pytest.fixture
+def sessions_path(tmp_path):
+    return str(tmp_path / "sessions.json")
+
+
+async def connect_strip(sessions_path, calls, fail_refresh=False):
+    sessions = TapoSessionManager(sessions_path, lifetime=0)
+    registry = OutletRegistry(STRIP_SOCKET, sessions=sessions)
+    await registry.connect_all(StripClient(calls, fail_refresh))
+    return sessions, registry
+
+
+@pytest.mark.anyio
+async def test_tapo_session_refresh(sessions_path):
+    calls = []
+    sessions, _ = await connect_strip(sessions_path, calls)
+    await sessions.refresh_due()
+    assert calls == ["plug", "refresh"]
+
+
+@pytest.mark.anyio
+async def test_tapo_sessions_reuse_child_ids_after_a_restart(sessions_path):
+    calls = []
+    sessions, _ = await connect_strip(sessions_path, calls)
+    sessions.save()
+    await connect_strip(sessions_path, calls)
+    assert calls == ["plug", "unchecked:child-1"]
+
+
+@pytest.mark.anyio
+async def test_failed_tapo_refresh_drops_the_session(sessions_path):
+    sessions, registry = await connect_strip(sessions_path, [], fail_refresh=True)
+    await sessions.refresh_due()
+    assert registry.handlers == {}
+    assert sessions.refresh_failures == 1
+
+
+@pytest.fixture
+def energy_dir(tmp_path):
+    return str(tmp_path)
+
+
+@pytest.fixture
+def hour_of_power(energy_dir):
+    """1 kW for one hour, sampled every minute."""
+    series = EnergySeries("plug", energy_dir)
+    for minute in range(61):
+        series.add(BASE_HOUR + minute * 60, 1000.0)
+    return series
+
+
+@pytest.fixture
+def split(energy_dir):
+    """An interval across the hour, from 1 kW to 2 kW."""
+    series = EnergySeries("split", energy_dir)
+    series.add(BASE_HOUR + 3570, 1000.0)
+    series.add(BASE_HOUR + 3630, 2000.0)
+    return series
+
+
+def test_energy_hourly_kwh(hour_of_power):
+    summary = hour_of_power.summary(since=BASE_HOUR + 3540)
+    assert summary["hourly_kwh"][0] == {"t": BASE_HOUR, "kwh": 1.0}
+    assert len(summary["samples"]) == 2
+
+
+def test_energy_series_restores_from_disk(hour_of_power, energy_dir):
+    hour_of_power.flush()
+    restored = EnergySeries("plug", energy_dir)
+    restored.load(now=BASE_HOUR + 3600)
+    assert len(restored.timestamps) == 61
+    assert restored.summary()["hourly_kwh"][0]["kwh"] == 1.0
+
+
+def test_energy_interval_is_split_at_the_hour(split):
+    assert round(split.hourly[BASE_HOUR], 3) == round((1000 + 1500) / 2 * 30 / 3600, 3)
+    assert round(split.hourly[BASE_HOUR + 3600], 3) == round((1500 + 2000) / 2 * 30 / 3600, 3)
+    assert round(sum(split.daily.values()), 6) == round(sum(split.hourly.values()), 6)
+
+
+@pytest.mark.anyio
+async def test_energy_collector_saves_the_running_hour_on_stop(split, energy_dir):
+    collector = EnergyCollector(SimpleNamespace(configs={}), directory=energy_dir)
+    collector.series["split"] = split
+    split.add(BASE_HOUR + 3690, 2000.0)
+    await collector.stop()
+    stopped = EnergySeries("split", energy_dir)
+    stopped.load(now=BASE_HOUR + 3700)
+    assert stopped.hourly == split.hourly
+
+
+def test_energy_series_is_loaded_once(energy_dir):
+    collector = EnergyCollector(SimpleNamespace(configs={}), directory=energy_dir)
+    with ThreadPoolExecutor(8) as pool:
+        loaded = list(pool.map(collector.get_series, ["fresh"] * 8))
+    assert all(series is loaded[0] for series in loaded)
+
+
+class PowerRegistry:
+    """Ten P110 plugs that remember how many were read at once."""
+
+    configs = {f"plug{i}": SimpleNamespace(model="p110") for i in range(10)}
+    handlers = dict.fromkeys(configs)
+
+    def __init__(self):
+        self.active = self.peak = 0
+
+    async def call(self, outlet_id, fn):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return SimpleNamespace(current_power=5.0)
+
+
+@pytest.mark.anyio
+async def test_energy_sampling_keeps_to_the_concurrency_cap(energy_dir):
+    power = PowerRegistry()
+    collector = EnergyCollector(power, directory=energy_dir, concurrency=3)
+    await collector.sample_once()
+    assert power.peak == 3 and len(collector.series) == 10
+
+
+@pytest.fixture
+def night_light():
+    return Rule.from_dict({
+        "name": "night_light",
+        "when": [{"sensor": "light", "op": "<", "value": 50, "hysteresis": 10},
+                 {"sensor": "motion_detected", "op": "==", "value": True}],
+        "then": {"outlet": "hall", "on": True, "for_seconds": 0.05},
+    })
+
+
+@pytest.fixture
+def heater():
+    return Rule.from_dict({
+        "name": "heater",
+        "when": [{"sensor": "temperature", "op": "<", "value": 18}],
+        "then": {"outlet": "heater"},
+    })
+
+
+@pytest.fixture
+def actions():
+    return []
+
+
+@pytest.fixture
+async def engine(night_light, heater, actions):
+    async def actuator(outlet_id, on):
+        actions.append((outlet_id, on))
+
+    engine = RulesEngine(actuator, [night_light, heater])
+    engine.on_readings({"light": 40, "motion_detected": True, "temperature": 21})
+    await asyncio.sleep(0)
+    yield engine
+    await engine.stop()
+
+
+@pytest.mark.anyio
+async def test_rule_fires_when_every_condition_holds(engine, actions):
+    assert actions == [("hall", True)]
+    assert engine.status()["rules"]["night_light"]["fired"] == 1
+
+
+@pytest.mark.anyio
+async def test_rules_are_evaluated_only_for_their_sensors(engine, night_light, heater):
+    engine.on_readings({"temperature": 20})
+    assert night_light.latency.count == 1 and heater.latency.count == 2
+
+
+@pytest.mark.anyio
+async def test_rule_stays_active_inside_the_hysteresis_band(engine, night_light):
+    engine.on_readings({"light": 55})
+    assert night_light.active and night_light.revert_handle is None
+
+
+@pytest.mark.anyio
+async def test_rule_reverts_after_its_timer(engine, actions):
+    engine.on_motion({"type": "motion_end"})
+    await asyncio.sleep(0.1)
+    assert actions == [("hall", True), ("hall", False)]
+
+
+@pytest.mark.anyio
+async def test_rules_engine_stop_cancels_actions(heater):
+    switched = []
+
+    async def slow_actuator(outlet_id, on):
+        await asyncio.sleep(1)
+        switched.append(outlet_id)
+
+    engine = RulesEngine(slow_actuator, [heater])
+    engine.on_readings({"temperature": 15})
+    await asyncio.sleep(0)
+    await engine.stop()
+    # No action outlives the engine and reaches a closed outlet session.
+    assert not engine._actions and switched == []
+
+
+def test_get_rules():
+    response = client.get("/api/rules/")
+    assert response.status_code == 200
+    assert "rules" in response.json()
+    assert client.get("/api/rules/missing").status_code == 404
+
+@pytest.fixture
+def metrics():
+    client.get("/api/lights/")
+    client.get("/api/outlets/does_not_exist")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return response.text
+
+
+def test_metrics_count_requests_per_router(metrics):
+    assert 'smarthome_http_request_duration_seconds_bucket{router="lights",method="GET",le="+Inf"}' in metrics
+    assert 'smarthome_http_responses_total{router="outlets",method="GET",status="4xx"}' in metrics
+
+
+def test_metrics_include_background_work(metrics):
+    for name in ("smarthome_sampler_lag_seconds", "smarthome_event_loop_lag_seconds",
+                 "smarthome_sensor_mock_fallbacks_total", "smarthome_outlet_cache_hits_total"):
+        assert f"# TYPE {name} " in metrics
+
+
+def test_metric_families_are_declared_once(metrics):
+    families = [line.split()[2] for line in metrics.splitlines() if line.startswith("# TYPE")]
+    assert len(families) == len(set(families))
+
+
+def test_simulated_bme280():
+    bme280 = simulation.SimulatedBME280(latency_ms=0)
+    assert 15 < bme280.temperature < 30
+    assert 0 <= bme280.humidity <= 100
+
+
+def test_simulated_bh1750_fails_like_a_flaky_bus():
+    flaky = simulation.SimulatedBH1750(latency_ms=0, failure_rate=1.0)
+    with pytest.raises(OSError) as excinfo:
+        flaky.lux
+    assert excinfo.value.errno == 121
+
+
+def test_simulated_gpio_drives_the_motion_detector():
+    gpio = simulation.SimulatedGPIO(motion_interval=0.01, motion_duration=0.01)
+    detector = MotionDetector(debounce_ms=0, holdoff=0)
+    detector.start(gpio, gpio.gpiochip_open(0), 4)
+    deadline = time.monotonic() + 2
+    while detector.status()["event_count"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    detector.stop()
+    assert detector.status()["event_count"] >= 2
+
+
+@pytest.fixture
+def simulated_outlets():
+    configs = simulation.simulated_outlet_configs(200)
+    assert len(configs) == 200
+    assert any(config.model == "p300" for config in configs.values())
+    return configs
+
+
+@pytest.mark.anyio
+async def test_simulated_outlets_connect_and_switch(simulated_outlets, sessions_path):
+    registry = OutletRegistry(simulated_outlets, concurrency=50, sessions=TapoSessionManager(sessions_path))
+    await registry.connect_all(simulation.SimulatedTapoClient())
+    assert len(registry.handlers) == 200
+    await registry.call("sim_strip_004_2", lambda device: device.on())
+    info = await registry.call("sim_strip_004_2", lambda device: device.get_device_info())
+    assert info.to_dict()["device_on"] is True
+    power = await registry.call("sim_strip_004_2", lambda device: device.get_current_power())
+    assert power.current_power > 0
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    """A fresh central aggregator behind the rooms endpoints, taking up to 4 rows a push."""
+    aggregator = RoomAggregator(max_batch_rows=4, min_push_interval=0.0)
+    monkeypatch.setattr(rooms, "aggregator", aggregator)
+    return aggregator
+
+
+@pytest.fixture
+async def agent(aggregator):
+    agent = EdgeAgent("http://central", room="bedroom", node_id="pi-bedroom", token=None,
+                      batch_rows=4, transport=httpx.ASGITransport(app=app))
+    yield agent
+    await agent.stop(flush_timeout=0)
+
+
+def add_readings(agent, first, count):
+    for i in range(first, first + count):
+        agent.add(1000.0 + i, {"temperature": 20.0 + i, "source": "real"})
+
+
+@pytest.mark.anyio
+async def test_edge_agent_halves_batches_that_are_too_large(agent):
+    agent.batch_rows = 8
+    add_readings(agent, 0, 6)
+    assert not await agent.push_once()
+    assert agent.batch_rows == 4
+    assert await agent.push_once() and await agent.push_once()
+    assert agent.pushed == 6 and not agent.buffer
+
+
+@pytest.mark.anyio
+async def test_edge_agent_drains_within_the_push_interval(agent, aggregator):
+    aggregator.min_push_interval = agent.min_push_interval = 0.2
+    agent.push_interval = 0.01
+    add_readings(agent, 0, 8)
+    agent.start()
+    for _ in range(100):
+        if not agent.buffer:
+            break
+        await asyncio.sleep(0.05)
+    assert not agent.buffer and agent.batches == 2 and agent.failures == 0
+
+
+@pytest.mark.anyio
+async def test_resent_batch_is_not_applied_twice(agent):
+    add_readings(agent, 0, 4)
+    assert await agent.push_once()
+    payload = {"node": "pi-bedroom", "room": "bedroom", "boot": agent.boot, "first_sequence": 2,
+               "fields": ["t", "temperature"], "rows": [[1002.0, 22.0], [1003.0, 23.0]]}
+    assert client.post("/api/rooms/ingest", json=payload).json()["accepted"] == 0
+
+
+@pytest.mark.anyio
+async def test_pushing_too_often_is_answered_with_retry_after(agent, aggregator):
+    add_readings(agent, 0, 2)
+    assert await agent.push_once()
+    aggregator.min_push_interval = 60.0
+    add_readings(agent, 2, 1)
+    assert not await agent.push_once()
+    assert len(agent.buffer) == 1 and agent.status()["retry_in"] > 0
+
+
+@pytest.mark.anyio
+async def test_get_room(agent):
+    add_readings(agent, 0, 12)
+    for _ in range(3):
+        assert await agent.push_once()
+    room = client.get("/api/rooms/bedroom?recent=10").json()
+    assert room["temperature"] == 31.0
+    assert room["node"] == "pi-bedroom" and room["stale"] is False
+    assert len(room["recent"]) == 10
+    assert "bedroom" in client.get("/api/rooms/").json()
+
+
+def test_get_unknown_room(aggregator):
+    assert client.get("/api/rooms/attic").status_code == 404
+
+
+def test_ingest_skips_rows_without_a_usable_time(aggregator):
+    payload = {"node": "pi-garage", "room": "garage", "boot": "b1", "first_sequence": 0,
+               "fields": ["t", "temperature"], "rows": [[None, 1.0], ["soon", 2.0], [1000.0, 3.0]]}
+    response = client.post("/api/rooms/ingest", json=payload)
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 1, "last_sequence": 2}
+
+
+@pytest.fixture
+def crashed_ring(tmp_path):
+    """Five samples (the third from a mock) whose header lost its last sequence update in a crash."""
+    path = str(tmp_path / "ring.bin")
+    ring = SampleRing(path, capacity=8)
+    for i in range(5):
+        source = "mock" if i == 2 else "real"
+        ring.append(1000.0 + i, {"temperature": 20.0 + i, "motion_detected": False, "source": source})
+    ring.commit("history", 0)
+    ring.sync()
+
+    # "Crash": reopen without closing, and lose the header's sequence update.
+    crashed = SampleRing(path, capacity=8)
+    crashed._open()
+    crashed._map[16:24] = (3).to_bytes(8, "little")
+    crashed._map.close()
+    reopened = SampleRing(path, capacity=8)
+    yield reopened
+    reopened.close()
+
+
+def test_sample_ring_recovers_its_sequence_after_a_crash(crashed_ring):
+    assert crashed_ring.cursor("history") == 0
+    assert crashed_ring.next_sequence == 5
+
+
+def test_sample_ring_replays_after_crash(crashed_ring):
+    records, last = crashed_ring.read_since(0)
+    assert [sequence for sequence, _, _ in records] == [1, 2, 3, 4] and last == 4
+    assert records[1][2]["source"] == "mock"
+    assert records[0][2] == {"temperature": 21.0, "motion_detected": False, "source": "real"}
+
+
+def test_sample_ring_skips_a_torn_record(crashed_ring):
+    offset = HEADER_SIZE + 3 * RECORD.size
+    crashed_ring._open()[offset + 8:offset + 12] = b"\xff\xff\xff\xff"
+    records, _ = crashed_ring.read_since(0)
+    assert [sequence for sequence, _, _ in records] == [1, 2, 4]
+
+
+@pytest.mark.anyio
+async def test_history_flusher_resumes_from_its_cursor(crashed_ring, history):
+    flusher = HistoryFlusher(crashed_ring, history)
+    await flusher.flush_once()
+    assert crashed_ring.cursor("history") == 4
+    assert (flusher.flushed, flusher.skipped_mock) == (3, 1)
+    assert [point["mean"] for point in history.query(0, 3000, "raw", ["temperature"])["temperature"]] == [21.0, 23.0, 24.0]
+
+
+def test_sample_ring_wraps_around(crashed_ring):
+    for i in range(10):
+        crashed_ring.append(2000.0 + i, {"temperature": 30.0, "source": "real"})
+    records, _ = crashed_ring.read_since(-1)
+    assert [sequence for sequence, _, _ in records] == list(range(7, 15))
+
+
+@pytest.fixture
+def bme280():
+    return simulation.SimulatedBME280(latency_ms=0)
+
+
+def test_low_power_bme280_converts_once_per_read(bme280):
+    sensor_profiles.BME280_PROFILES["low-power"].apply(bme280)
+    bme280.temperature
+    assert bme280.conversions == 1
+
+
+def test_high_precision_bme280_runs_in_normal_mode(bme280):
+    sensor_profiles.BME280_PROFILES["high-precision"].apply(bme280)
+    assert bme280.mode == sensor_profiles.BME280_MODE_NORMAL
+    assert bme280.overscan_pressure == 0x05 and bme280.iir_filter == 0x04
+    bme280.temperature
+    assert bme280.conversions == 0
+
+
+def test_low_power_bh1750_uses_the_coarse_resolution():
+    bh1750 = simulation.SimulatedBH1750(latency_ms=0)
+    sensor_profiles.BH1750_PROFILES["low-power"].apply(bh1750)
+    assert bh1750.lux % 4 == 0
+
+
+def test_tick_interval_follows_the_profiles():
+    low_power = (sensor_profiles.BME280_PROFILES["low-power"], sensor_profiles.BH1750_PROFILES["low-power"])
+    assert sensor_profiles.tick_interval(*low_power) == 10.0
+
+
+def test_read_schedule():
+    schedule = sensor_profiles.ReadSchedule({"climate": 4.0, "light": 10.0})
+    assert schedule.due("climate", 0.0) and schedule.due("light", 0.0)
+    schedule.mark("climate", 0.0)
+    schedule.mark("light", 0.0)
+    # A tick arriving a little early still reads; light waits for its own interval.
+    assert schedule.due("climate", 3.9) and not schedule.due("light", 3.9)
+
+
+def test_get_sensor_profiles():
+    response = client.get("/api/sensors/profiles")
+    assert response.status_code == 200
+    assert set(response.json()["readings"]) == {"climate", "light"}
+
+
+# Worked example from the Bosch datasheet: 25.08 °C and 100653.27 Pa.
+TEMP_CALIB = [27504.0, 26435.0, -1000.0]
+PRESSURE_CALIB = [36477.0, -10685.0, 3024.0, 2855.0, 140.0, -7.0, 15500.0, -14600.0, 6000.0]
+HUMIDITY_CALIB = [75.0, 370.0, 0.0, 310.0, 782.0, 30.0]
+RAW_TEMPERATURE, RAW_PRESSURE, RAW_HUMIDITY = 519888, 415148, 30000
+
+
+class RegisterDriver:
+    """Register-level stand-in for the adafruit driver, in forced mode."""
+    mode = 0x00
+    _temp_calib, _pressure_calib, _humidity_calib = TEMP_CALIB, PRESSURE_CALIB, HUMIDITY_CALIB
+
+    def __init__(self):
+        self.reads = []
+
+    def _read_register(self, register, length):
+        self.reads.append(register)
+        if register == STATUS_REGISTER:
+            return bytearray([0])
+        return bytearray([RAW_PRESSURE >> 12, (RAW_PRESSURE >> 4) & 0xFF, (RAW_PRESSURE & 0xF) << 4,
+                          RAW_TEMPERATURE >> 12, (RAW_TEMPERATURE >> 4) & 0xFF, (RAW_TEMPERATURE & 0xF) << 4,
+                          RAW_HUMIDITY >> 8, RAW_HUMIDITY & 0xFF])
+
+
+def test_bme280_compensation():
+    temperature, humidity, pressure = compensate(RAW_TEMPERATURE, RAW_PRESSURE, RAW_HUMIDITY,
+                                                 TEMP_CALIB, PRESSURE_CALIB, HUMIDITY_CALIB)
+    assert round(temperature, 2) == 25.08
+    assert round(pressure, 2) == 1006.53
+    assert 0 <= humidity <= 100
+
+
+def test_bme280_burst_read():
+    driver = RegisterDriver()
+    reading = burst_read(driver)
+    assert driver.mode == MODE_FORCE
+    assert driver.reads == [STATUS_REGISTER, DATA_REGISTER]
+    assert (round(reading.temperature, 2), round(reading.pressure, 2)) == (25.08, 1006.53)
+
+
+def test_simulated_bme280_burst_read(bme280):
+    bme280.mode = MODE_FORCE
+    reading = burst_read(bme280)
+    assert bme280.conversions == 1 and bme280.reads == 1
+    assert 15 < reading.temperature < 30
+
+
+def test_lights_not_modified():
+    etag = client.get("/api/lights/").headers["etag"]
+    assert client.get("/api/lights/", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_etag_matches_a_list_and_weak_tags():
+    assert etag_matches('"other", W/"abc"', '"abc"')
+    assert not etag_matches('"other"', '"abc"')
+
+
+def test_lights_etag_changes_only_with_the_state():
+    response = client.get("/api/lights/")
+    etag, current = response.headers["etag"], response.json()["kitchen"]["on"]
+    client.post("/api/lights/", json={"room": "kitchen", "status": current})
+    assert client.get("/api/lights/", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/api/lights/", json={"room": "kitchen", "status": not current})
+    changed = client.get("/api/lights/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["kitchen"]["on"] is (not current)
+
+
+def test_sensors_not_modified():
+    response = client.get("/api/sensors/all")
+    assert "age" in response.json() and "sequence" in response.json()
+    not_modified = client.get("/api/sensors/all", headers={"If-None-Match": response.headers["etag"]})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+
+@pytest.mark.anyio
+async def test_outlet_revision_moves_only_when_the_state_changes():
+    cache = OutletStateCache(ttl=0)
+
+    async def fetch():
+        return {"on": True}
+
+    state = await cache.get("plug", fetch)
+    first = cache.revision("plug", state)
+    state = await cache.get("plug", fetch)
+    assert cache.revision("plug", state) == first
+    cache.set("plug", {"on": False})
+    assert cache.revision("plug", state) is None
+    state = await cache.get("plug", fetch)
+    assert cache.revision("plug", state) == first + 2
+
+
+needs_msgpack = pytest.mark.skipif(encoding.msgpack is None, reason="msgpack is not installed")
+needs_cbor2 = pytest.mark.skipif(encoding.cbor2 is None, reason="cbor2 is not installed")
+
+
+@pytest.fixture
+def history_params(sensor_history):
+    now = time.time()
+    sensor_history.append_many([(now - 30, {"temperature": 21.5}), (now - 20, {"temperature": 21.7})])
+    return {"sensor": "temperature", "resolution": "raw", "end": now}
+
+
+def test_history_defaults_to_json(history_params):
+    response = client.get("/api/sensors/history", params=history_params)
+    assert response.headers["content-type"] == "application/json"
+    assert len(response.json()["points"]["temperature"]) == 2
+
+
+@needs_msgpack
+def test_history_as_msgpack(history_params):
+    expected = client.get("/api/sensors/history", params=history_params).json()
+    packed = client.get("/api/sensors/history", params=history_params, headers={"Accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert encoding.msgpack.unpackb(packed.content) == expected
+
+
+@needs_cbor2
+def test_history_as_cbor(history_params):
+    expected = client.get("/api/sensors/history", params=history_params).json()
+    cbor = client.get("/api/sensors/history", params=history_params, headers={"Accept": "application/cbor, */*"})
+    assert encoding.cbor2.loads(cbor.content) == expected
+
+
+def test_json_encoding():
+    assert json.loads(encoding.dumps({"t": 1.5, "ok": True})) == {"t": 1.5, "ok": True}
+
+
+class Connected:
+    async def is_disconnected(self):
+        return False
+
+
+@needs_msgpack
+@pytest.mark.anyio
+async def test_stream_as_msgpack(hub):
+    hub.publish("sensors", {"temperature": 21.5})
+    subscriber = hub.subscribe()
+    subscriber.queue.put_nowait(None)
+    chunks = [chunk async for chunk in stream.binary_stream(Connected(), subscriber, encoding.MSGPACK_MEDIA_TYPE)]
+    unpacker = encoding.msgpack.Unpacker()
+    unpacker.feed(b"".join(chunks))
+    assert list(unpacker) == [{"topic": "sensors", "data": {"temperature": 21.5}}]
+
+
+@pytest.fixture
+def lights_db(tmp_path):
+    return str(tmp_path / "shared_lights.db")
+
+
+@pytest.fixture
+def workers(lights_db):
+    """Two workers' views of the same light store."""
+    worker_a = LightStore(lights_db, rooms=["kitchen", "bedroom"])
+    worker_b = LightStore(lights_db, rooms=["kitchen", "bedroom"])
+    yield worker_a, worker_b
+    worker_a.close()
+    worker_b.close()
+
+
+def test_light_store_starts_with_lights_off(workers):
+    _, states = workers[0].snapshot()
+    assert states["kitchen"] == {"on": False, "brightness": None}
+
+
+def test_light_store_update_is_seen_by_other_workers(workers):
+    worker_a, worker_b = workers
+    version, states = worker_a.snapshot()
+    changed, state, new_version = worker_a.update("kitchen", True, 40)
+    assert changed and state == {"on": True, "brightness": 40} and new_version > version
+    assert worker_b.snapshot() == (new_version, {**states, "kitchen": state})
+
+
+def test_light_store_reloads_only_after_a_change(workers):
+    worker_a, worker_b = workers
+    worker_a.update("kitchen", True, 40)
+    worker_b.snapshot()
+    reloads = worker_b.reloads
+    worker_b.snapshot()
+    assert worker_b.reloads == reloads
+
+
+def test_light_store_update_without_change(workers):
+    workers[0].update("kitchen", True, 40)
+    assert workers[1].update("kitchen", True)[0] is False
+
+
+def test_light_store_unknown_room(workers):
+    with pytest.raises(KeyError):
+        workers[0].update("garage", True)
+
+
+def test_light_store_command_lock_is_shared(workers):
+    worker_a, worker_b = workers
+    held = worker_a.try_lock_commands()
+    assert held is not None and worker_b.try_lock_commands() is None
+    held.close()
+    again = worker_b.try_lock_commands()
+    assert again is not None
+    again.close()
+
+
+def test_light_store_keeps_state_across_restarts(workers, lights_db):
+    workers[0].update("kitchen", True, 40)
+    reopened = LightStore(lights_db)
+    assert reopened.get("kitchen") == {"on": True, "brightness": 40}
+    reopened.close()
+
+
+@pytest.mark.anyio
+async def test_gpio_pwm_light_driver():
+    gpio = simulation.SimulatedGPIO()
+    pwm = GPIOPWMDriver("kitchen", gpio, pin=18)
+    await pwm.apply({"on": True, "brightness": 40})
+    assert gpio.pwm[18] == (800, 40.0)
+    await pwm.apply({"on": False, "brightness": 40})
+    assert gpio.pwm[18] == (800, 0.0)
+
+
+@pytest.mark.anyio
+async def test_tapo_bulb_light_driver():
+    registry = OutletRegistry(bulb_configs({"bedroom": LightConfig("bedroom", "tapo", ip="10.0.0.9")}))
+    tapo = simulation.SimulatedTapoClient(offline_rate=0)
+    await registry.connect_all(tapo)
+    await TapoBulbDriver("bedroom", registry).apply({"on": True, "brightness": 25})
+    device = tapo.devices["10.0.0.9"]
+    assert (device.state["10.0.0.9"], device.brightness["10.0.0.9"]) == (True, 25)
+
+
+@handler("test.echo")
+async def echo(value: int):
+    if value < 0:
+        raise HTTPException(status_code=400, detail="negative")
+    return {"value": value * 2}
+
+
+@pytest.fixture
+async def shared(tmp_path):
+    """An owner and a worker in shared mode, connected over the owner socket."""
+    socket_path, lock_path = str(tmp_path / "owner.sock"), str(tmp_path / "owner.lock")
+    owner = Deployment("shared", socket_path, lock_path)
+    worker = Deployment("shared", socket_path, lock_path)
+    owner.share("count", lambda: 1, lambda data: None)
+    seen = []
+    worker.share("count", lambda: None, seen.append)
+    started = []
+
+    async def start_hardware():
+        started.append("owner")
+
+    async def stop_hardware():
+        started.append("stopped")
+
+    await owner.start(start_hardware)
+    await worker.start(start_hardware)
+    assert await worker.client.wait_connected()
+    yield SimpleNamespace(owner=owner, worker=worker, seen=seen, started=started, stop_hardware=stop_hardware)
+    await worker.stop(stop_hardware)
+    await owner.stop(stop_hardware)
+
+
+@pytest.mark.anyio
+async def test_one_process_owns_the_hardware(shared):
+    assert (shared.owner.role, shared.worker.role) == ("owner", "worker")
+    assert shared.started == ["owner"]
+
+
+@pytest.mark.anyio
+async def test_worker_receives_shared_state_on_connect(shared):
+    assert shared.seen == [1]
+
+
+@pytest.mark.anyio
+async def test_worker_calls_the_owner(shared):
+    assert await shared.worker.call("test.echo", value=21) == {"value": 42}
+
+
+@pytest.mark.anyio
+async def test_owner_errors_reach_the_worker(shared):
+    with pytest.raises(RemoteCallError) as excinfo:
+        await shared.worker.call("test.echo", value=-1)
+    assert (excinfo.value.status_code, excinfo.value.detail) == (400, "negative")
+
+
+@pytest.mark.anyio
+async def test_owner_publishes_shared_state(shared):
+    shared.owner.publish("count", 2)
+    for _ in range(50):
+        if shared.seen[-1] == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert shared.seen == [1, 2]
+
+
+@pytest.mark.anyio
+async def test_worker_takes_over_when_the_owner_stops(shared):
+    await shared.owner.stop(shared.stop_hardware)
+    for _ in range(200):
+        if shared.worker.role == "owner":
+            break
+        await asyncio.sleep(0.02)
+    assert shared.worker.role == "owner" and shared.started == ["owner", "stopped", "owner"]
+    with pytest.raises(OwnerUnavailableError):
+        await shared.worker.call("test.echo", value=1)
+
+
+@pytest.fixture
+async def single(tmp_path):
+    """Two single-mode processes started on the same deployment lock."""
+    lock_path = str(tmp_path / "owner.lock")
+    first = Deployment("single", str(tmp_path / "owner.sock"), lock_path)
+    second = Deployment("single", str(tmp_path / "owner.sock"), lock_path)
+    started = []
+
+    async def start_hardware():
+        started.append(1)
+
+    async def stop_hardware():
+        pass
+
+    await first.start(start_hardware)
+    await second.start(start_hardware)
+    # Both single-mode processes start the hardware.
+    assert started == [1, 1]
+    yield first, second
+    await second.stop(stop_hardware)
+    await first.stop(stop_hardware)
+
+
+@pytest.mark.anyio
+async def test_single_mode_holds_the_deployment_lock_once(single):
+    first, second = single
+    assert first.owns_hardware and not second.owns_hardware
+
+
+@pytest.fixture
+def gpio_kitchen(monkeypatch):
+    gpio = simulation.SimulatedGPIO()
+    monkeypatch.setitem(lights.drivers, "kitchen", GPIOPWMDriver("kitchen", gpio, pin=18))
+    return gpio
+
+
+@pytest.mark.anyio
+async def test_single_mode_gpio_lights_need_the_deployment_lock(single, gpio_kitchen, monkeypatch):
+    monkeypatch.setattr(lights, "deployment", single[1])
+    response = client.post("/api/lights/", json={"room": "kitchen", "status": True})
+    assert response.status_code == 503
+    assert "WORKER_MODE=shared" in response.json()["detail"]
+    assert 18 not in gpio_kitchen.pwm
+
+
+@pytest.mark.anyio
+async def test_single_mode_lock_holder_drives_gpio_lights(single, gpio_kitchen, monkeypatch):
+    monkeypatch.setattr(lights, "deployment", single[0])
+    assert client.post("/api/lights/", json={"room": "kitchen", "status": True}).status_code == 200
+    assert gpio_kitchen.pwm[18][1] > 0
+
+
+def test_hysteresis_controller():
+    hysteresis = HysteresisController(band=0.5)
+    assert [hysteresis.update(t, 21.0, 10) for t in (20.4, 21.2, 21.5, 20.8, 20.5)] == [1.0, 1.0, 0.0, 0.0, 1.0]
+
+
+def test_pid_controller_does_not_wind_up():
+    pid = PIDController(kp=1.0, ki=0.1)
+    assert pid.update(15.0, 21.0, 10) == 1.0
+    assert pid.integral == 0.0
+    assert 0.0 < pid.update(20.8, 21.0, 10) < 1.0
+
+
+MONDAY = datetime(2026, 10, 19)
+
+
+@pytest.fixture
+def schedule():
+    return WeeklySchedule.from_list([
+        {"days": "weekdays", "time": "06:30", "temperature": 21},
+        {"days": "daily", "time": "22:00", "temperature": 17},
+    ])
+
+
+def test_weekly_schedule_setpoints(schedule):
+    assert schedule.setpoint_at(MONDAY.replace(hour=5)) == 17.0  # wraps to Sunday night
+    assert schedule.setpoint_at(MONDAY.replace(hour=7)) == 21.0
+    assert schedule.setpoint_at(datetime(2026, 10, 24, 12)) == 17.0  # Saturday
+
+
+def test_weekly_schedule_next_change(schedule):
+    assert schedule.next_change(MONDAY.replace(hour=7)) == {"day": "mon", "time": "22:00", "temperature": 17.0}
+
+
+class FakeSampler:
+    """Serves snapshots of `readings`, which a test changes between reads."""
+
+    def __init__(self, readings):
+        self.readings = readings
+
+    def latest(self):
+        return SensorSnapshot(MappingProxyType(dict(self.readings)), 1, time.time(), time.monotonic())
+
+    async def get_snapshot(self):
+        return self.latest()
+
+
+@pytest.fixture
+def sampler():
+    return FakeSampler({"temperature": 19.0, "source": "simulated"})
+
+
+@pytest.fixture
+def switched():
+    return []
+
+
+@pytest.fixture
+def thermostat_config(schedule):
+    return ThermostatConfig("heater", band=0.5, min_switch_seconds=0, schedule=schedule)
+
+
+@pytest.fixture
+def thermostat_state(tmp_path):
+    return str(tmp_path / "thermostat_state.json")
+
+
+@pytest.fixture
+async def thermostat(thermostat_config, thermostat_state, sampler, switched):
+    """A thermostat on Monday at 7:00, when the schedule asks for 21 °C."""
+    async def actuator(outlet_id, on):
+        switched.append((outlet_id, on))
+
+    device = Thermostat(thermostat_config, sampler.latest, actuator, thermostat_state,
+                        clock=lambda: MONDAY.replace(hour=7))
+    yield device
+    await device.stop()
+
+
+@pytest.mark.anyio
+async def test_thermostat_heats_below_the_setpoint(thermostat, switched):
+    await thermostat.tick()
+    assert thermostat.summary() == {"temperature": 19.0, "target_temperature": 21.0,
+                                    "mode": "auto", "status": "heating"}
+    assert switched == [("heater", True)]
+
+
+@pytest.mark.anyio
+async def test_thermostat_stops_above_the_band(thermostat, sampler, switched):
+    await thermostat.tick()
+    sampler.readings["temperature"] = 21.6
+    await thermostat.tick()
+    assert switched == [("heater", True), ("heater", False)]
+
+
+@pytest.mark.anyio
+async def test_thermostat_never_heats_on_mock_readings(thermostat, sampler, switched):
+    await thermostat.tick()
+    sampler.readings["source"] = "mock"
+    await thermostat.tick()
+    assert thermostat.status_text == "no_reading"
+    assert switched == [("heater", True), ("heater", False)]
+
+
+@pytest.mark.anyio
+async def test_thermostat_modes(thermostat, sampler, switched):
+    sampler.readings["temperature"] = 18.0
+    await thermostat.set_mode("heat", 18.5)
+    await thermostat.set_mode("off")
+    assert switched == [("heater", True), ("heater", False)]
+    with pytest.raises(ValueError):
+        await thermostat.set_mode("cool", 20)
+
+
+@pytest.mark.anyio
+async def test_thermostat_loop(thermostat):
+    thermostat.start()
+    await asyncio.sleep(0.05)
+    await thermostat.stop()
+    assert thermostat.ticks >= 1 and thermostat.lag.count >= 1
+
+
+@pytest.mark.anyio
+async def test_thermostat_mode_survives_a_restart(thermostat, thermostat_config, thermostat_state, sampler):
+    await thermostat.set_mode("off")
+    assert Thermostat(thermostat_config, sampler.latest, None, thermostat_state).mode == "off"
+
+
+def test_optional_driver_modules():
+    assert import_optional("no_such_driver_module") is None
+    with pytest.raises(ImportError):
+        LazyModule("no_such_driver_module").gpiochip_open(0)
+
+
+@pytest.fixture
+def release():
+    return asyncio.Event()
+
+
+@pytest.fixture
+async def startup(release):
+    """Device startup with a step that waits for `release` and one that fails."""
+    startup = DeviceStartup()
+
+    async def slow():
+        await release.wait()
+
+    async def broken():
+        raise RuntimeError("bus error")
+
+    startup.launch("slow", slow, lambda: {"device": True})
+    startup.launch("broken", broken)
+    await asyncio.sleep(0)
+    yield startup
+    await startup.cancel()
+
+
+@pytest.mark.anyio
+async def test_startup_is_not_ready_while_a_step_is_pending(startup):
+    status = startup.status()
+    assert not status["ready"] and status["steps"]["slow"]["state"] == "pending"
+    assert status["steps"]["slow"]["detail"] is None
+
+
+@pytest.mark.anyio
+async def test_startup_reports_each_step(startup, release):
+    release.set()
+    assert await startup.wait(timeout=1)
+    status = startup.status()
+    assert status["ready"]
+    assert status["steps"]["slow"]["state"] == "ready" and status["steps"]["slow"]["detail"] == {"device": True}
+    assert status["steps"]["broken"] == {**status["steps"]["broken"], "state": "failed", "error": "bus error"}
+
+
+@pytest.mark.anyio
+async def test_hanging_startup_step_is_cancelled():
+    hanging = DeviceStartup()
+    hanging.launch("plugs", asyncio.Event().wait)
+    assert not await hanging.wait(timeout=0.01)
+    await hanging.cancel()
+    assert hanging.steps["plugs"].state == "cancelled" and hanging.ready
+
+
+def test_health_live():
+    response = client.get("/api/health/live")
+    assert response.status_code == 200 and response.json()["status"] == "alive"
+
+
+def test_health_ready():
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200 and response.json()["ready"] is True
+
+
+@pytest.fixture
+def breaker():
+    """A plug breaker that has just tripped at its threshold of two failures."""
+    breaker = CircuitBreaker("plug", threshold=2, reset_initial=0.05)
+    breaker.record_failure(RuntimeError("timeout"))
+    assert breaker.allow()
+    breaker.record_failure(RuntimeError("timeout"))
+    return breaker
+
+
+def test_circuit_breaker_opens_at_its_threshold(breaker):
+    assert breaker.state == "open" and not breaker.allow() and breaker.rejected == 1
+
+
+def test_half_open_circuit_breaker_allows_one_trial(breaker):
+    time.sleep(0.06)
+    assert breaker.allow() and not breaker.allow()
+
+
+def test_failed_trial_doubles_the_wait(breaker):
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure(RuntimeError("timeout"))
+    assert breaker.state == "open" and 0.05 < breaker.retry_in <= 0.1
+
+
+def test_successful_trial_closes_the_breaker(breaker):
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.status()["trips"] == 1
+
+
+@pytest.mark.anyio
+async def test_supervised_breaker_leaves_the_trial_to_the_probe():
+    watched = CircuitBreaker("sensor", reset_initial=0.01)
+    probes = []
+
+    async def probe():
+        probes.append(watched.state)
+
+    supervisor = HealthSupervisor()
+    supervisor.watch("sensor", watched, probe)
+    watched.trip(RuntimeError("gone"))
+    await asyncio.sleep(0.02)
+    assert not watched.allow() and watched.state == "open"
+    await supervisor.check()
+    await asyncio.gather(*supervisor._tasks)
+    assert probes == ["half_open"] and supervisor.recoveries == 1
+    assert watched.state == "closed" and watched.allow()
+
+
+class FlakyPlug:
+    def __init__(self, tapo):
+        self.tapo = tapo
+
+    async def get_device_info(self):
+        if self.tapo.down:
+            await asyncio.sleep(10)
+        return {"on": True}
+
+
+class FlakyTapoClient:
+    """A P110 that hangs until the test brings it back up."""
+    down = True
+
+    async def p110(self, ip):
+        if self.down:
+            await asyncio.sleep(10)
+        return FlakyPlug(self)
+
+
+@pytest.fixture
+def flaky_tapo():
+    return FlakyTapoClient()
+
+
+@pytest.fixture
+async def flaky_registry(flaky_tapo):
+    registry = OutletRegistry({"flaky": OutletConfig("flaky", "10.0.0.9")}, timeout=0.05, call_timeout=0.05)
+    registry.breakers["flaky"].reset_initial = 0.05
+    await registry.connect_all(flaky_tapo)
+    assert registry.breakers["flaky"].state == "open"
+    return registry
+
+
+@pytest.mark.anyio
+async def test_open_breaker_fails_outlet_calls_at_once(flaky_registry):
+    start = time.perf_counter()
+    for _ in range(20):
+        with pytest.raises(OutletUnavailableError):
+            await flaky_registry.call("flaky", lambda plug: plug.get_device_info())
+    assert time.perf_counter() - start < 0.05
+
+
+@pytest.mark.anyio
+async def test_supervisor_recovers_an_outlet(flaky_registry, flaky_tapo):
+    supervisor = HealthSupervisor(interval=0.01)
+    flaky_registry.supervise(supervisor)
+    flaky_tapo.down = False
+    supervisor.start()
+    for _ in range(100):
+        if flaky_registry.breakers["flaky"].state == "closed":
+            break
+        await asyncio.sleep(0.01)
+    await supervisor.stop()
+    assert supervisor.recoveries == 1
+    assert await flaky_registry.call("flaky", lambda plug: plug.get_device_info()) == {"on": True}
+
+
+@pytest.mark.anyio
+async def test_failing_sensor_stops_being_read(monkeypatch):
+    failing = simulation.SimulatedBH1750(latency_ms=0, failure_rate=1.0)
+    monkeypatch.setattr(sensors, "bh1750_sensor", failing)
+    monkeypatch.setitem(sensors.breakers, "bh1750", CircuitBreaker("sensor bh1750", threshold=2, reset_initial=60))
+    for _ in range(5):
+        assert await sensors.read_device("bh1750", sensors.read_bh1750) is None
+    assert failing.failures == 2 and not sensors.device_up("bh1750", failing)
+
+
+def test_health_devices():
+    response = client.get("/api/health/devices")
+    assert response.status_code == 200 and "devices" in response.json()
+
+
@@ -39,6 +39,23 @@ export default function SmartHomeDashboard() {
 
  
   useEffect(() => {
+    // One shared server-side producer pushes only changed fields, so the
+    // dashboard keeps a running copy of the latest readings and merges
+    // every event into it instead of polling.
+    let latest: Record<string, any> = {}
+
+    const applySensorData = (data: Record<string, any>) => {
+      latest = { ...latest, ...data }
+      const transformedData: SensorData = {
+        temperature: { value: latest.temperature ?? "N/A", unit: "°C", status: "good" },
+        humidity: { value: latest.humidity ?? "N/A", unit: "%", status: "good" },
+        pressure: { value: latest.pressure ?? "N/A", unit: "hPa", status: "good" },
+        motion: { value: latest.motion_detected, unit: "", status: latest.motion_detected ? "warning" : "good" },
+        lightLevel: { value: latest.light ?? "N/A", unit: "lux", status: "good" }
+      };
+      setSensorData(transformedData);
+    };
+
     const fetchAllSensorData = async () => {
       try {
         
@@ -46,26 +63,25 @@ export default function SmartHomeDashboard() {
         if (!response.ok) {
           throw new Error('Backend API responded with an error');
         }
-        const data = await response.json();
-
-        const transformedData: SensorData = {
-          temperature: { value: data.temperature ?? "N/A", unit: "°C", status: "good" },
-          humidity: { value: data.humidity ?? "N/A", unit: "%", status: "good" },
-          pressure: { value: data.pressure ?? "N/A", unit: "hPa", status: "good" },
-          motion: { value: data.motion_detected, unit: "", status: data.motion_detected ? "warning" : "good" },
-          lightLevel: { value: data.light ?? "N/A", unit: "lux", status: "good" }
-        };
-        setSensorData(transformedData);
+        applySensorData(await response.json());
 
       } catch (error) {
         console.error("Error fetching sensor data:", error);
+        latest = {}
         setSensorData(createNullSensorData()); 
       }
     };
 
     fetchAllSensorData(); 
-    const interval = setInterval(fetchAllSensorData, 5000); 
-    return () => clearInterval(interval); 
+    const source = new EventSource(`${API_BASE_URL}/api/stream?topics=sensors`);
+    source.addEventListener("sensors", (event) => {
+      applySensorData(JSON.parse((event as MessageEvent).data));
+    });
+    source.onerror = () => {
+      // EventSource reconnects on its own and receives a full state event.
+      console.error("Sensor stream disconnected, reconnecting...");
+    };
+    return () => source.close(); 
   }, []); 
 
 
@@ -16,9 +16,18 @@ export function OutletControl() {
     ? "http://localhost:8000"
     : "http://localhost:8000"
 
-  // Fetch outlet data on component mount
+  // Fetch outlet data on component mount, then follow pushed changes
   useEffect(() => {
     fetchOutletData()
+
+    const source = new EventSource(API_BASE_URL + '/api/stream?topics=outlets')
+    source.addEventListener('outlets', (event) => {
+      const outlets = JSON.parse((event as MessageEvent).data)
+      if (outlets.main_outlet) {
+        setOutletData(outlets.main_outlet)
+      }
+    })
+    return () => source.close()
   }, [])
 
   const fetchOutletData = async () => {